@@ -1,6 +1,7 @@
-import React, { useState, useMemo } from 'react';
+import React, { useState, useMemo, useEffect } from 'react';
 import { Link, useLocation } from 'react-router-dom';
 import { chapters } from '../data/chapters';
+import { searchSections, type SearchHit } from '../utils/search';
 import './Sidebar.css';
 
 interface SidebarProps {
@@ -26,6 +27,31 @@ const Sidebar: React.FC<SidebarProps> = ({ isOpen, onClose, fontSize, onFontSize
     );
   }, [searchQuery]);
 
+  // Полнотекстовый поиск по индексу из public/content/search (грузятся только нужные шарды).
+  const [textHits, setTextHits] = useState<SearchHit[]>([]);
+  useEffect(() => {
+    if (searchQuery.trim().length < 2) {
+      setTextHits([]);
+      return;
+    }
+    let cancelled = false;
+    const timer = window.setTimeout(() => {
+      searchSections(searchQuery, 10)
+        .then((hits) => {
+          if (!cancelled) setTextHits(hits);
+        })
+        .catch(() => {
+          if (!cancelled) setTextHits([]);
+        });
+    }, 200);
+    return () => {
+      cancelled = true;
+      window.clearTimeout(timer);
+    };
+  }, [searchQuery]);
+
+  const chapterTitle = (chapterId: string) => chapters.find((c) => c.id === chapterId)?.title ?? '';
+
   const isActive = (chapterId: string, sectionId: string) => {
     return location.pathname === `/chapter/${chapterId}/section/${sectionId}`;
   };
@@ -68,6 +94,28 @@ const Sidebar: React.FC<SidebarProps> = ({ isOpen, onClose, fontSize, onFontSize
           </button>
         </div>
 
+        {textHits.length > 0 && (
+          <div className="sidebar-search-results">
+            <div className="sidebar-search-results-title">Найдено в тексте</div>
+            <ul className="sidebar-sections">
+              {textHits.map((hit) => (
+                <li key={`${hit.chapterId}/${hit.sectionId}`}>
+                  <Link
+                    to={`/chapter/${hit.chapterId}/section/${hit.sectionId}`}
+                    className={`sidebar-link ${isActive(hit.chapterId, hit.sectionId) ? 'active' : ''}`}
+                    onClick={onClose}
+                  >
+                    {hit.title}
+                    <span className="sidebar-search-hit-meta">
+                      {chapterTitle(hit.chapterId)} · совпадений: {hit.matches}
+                    </span>
+                  </Link>
+                </li>
+              ))}
+            </ul>
+          </div>
+        )}
+
         <nav className="sidebar-nav">
           {filteredChapters.map((chapter) => (
             <div key={chapter.id} className="sidebar-chapter">
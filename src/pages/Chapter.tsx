@@ -1,7 +1,8 @@
-import React, { useEffect, useRef, useState } from 'react';
-import { useParams, Link, useNavigate } from 'react-router-dom';
+import React, { useEffect, useMemo, useRef, useState } from 'react';
+import { useParams, Link, useLocation, useNavigate, useSearchParams } from 'react-router-dom';
 import { chapters } from '../data/chapters';
-import { MarkdownContent } from '../utils/markdown';
+import { MarkdownContent, MarkdownTree, type MarkdownTreeRoot } from '../utils/markdown';
+import { loadSectionContent, prefetchChapter, prefetchSectionContent } from '../utils/contentPack';
 import { storage } from '../utils/storage';
 import AchievementVideoModal from '../components/AchievementVideoModal';
 import './Chapter.css';
@@ -9,8 +10,11 @@ import './Chapter.css';
 const Chapter: React.FC = () => {
   const { chapterId, sectionId } = useParams<{ chapterId: string; sectionId: string }>();
   const navigate = useNavigate();
+  const [searchParams] = useSearchParams();
+  const location = useLocation();
   const [progress, setProgress] = useState(0);
   const [markdownContent, setMarkdownContent] = useState<string>('');
+  const [markdownTree, setMarkdownTree] = useState<MarkdownTreeRoot | undefined>(undefined);
   const [loading, setLoading] = useState(true);
   const [pendingNext, setPendingNext] = useState<{ to: string; label: string } | null>(null);
   const contentRef = useRef<HTMLDivElement>(null);
@@ -20,35 +24,70 @@ const Chapter: React.FC = () => {
   const chapter = chapters.find((c) => c.id === chapterId);
   const section = chapter?.sections.find((s) => s.id === sectionId);
 
+  // Длинный раздел конвертер делит на части (section.parts): показываем одну, ?part=N в адресе.
+  // Список частей меняется только вместе с разделом, поэтому годится в зависимости эффектов.
+  const parts = useMemo(() => (section ? section.parts ?? [section.markdownFile] : []), [section]);
+  const partIndex = Math.min(Math.max(Number(searchParams.get('part')) || 1, 1), Math.max(parts.length, 1)) - 1;
+  const markdownFile = parts[partIndex];
+  const partLink = (index: number) =>
+    `/chapter/${chapterId}/section/${sectionId}${index > 0 ? `?part=${index + 1}` : ''}`;
+
   // Загружаем markdown файл
   useEffect(() => {
-    if (!section?.markdownFile) {
+    if (!section || !markdownFile) {
       setLoading(false);
       return;
     }
 
     setLoading(true);
-    // Используем fetch для загрузки markdown файлов из public директории
-    // Файлы должны быть в public/content/chapters/
-    const fetchPath = `/content/${section.markdownFile}`;
-    
-    fetch(fetchPath)
-      .then((response) => {
-        if (!response.ok) {
-          throw new Error(`HTTP error! status: ${response.status}`);
-        }
-        return response.text();
-      })
-      .then((text) => {
-        setMarkdownContent(text);
+    // Markdown берём из пакета главы (public/content/packs/<chapterId>.json): глава скачивается
+    // один раз, остальные разделы отдаются из памяти. Без пакета грузится сам файл
+    // public/content/chapters/*.md. Если в пакете есть готовое дерево (--mdast), markdown не парсится.
+    const fetchPath = `/content/${markdownFile}`;
+    let cancelled = false;
+
+    loadSectionContent(chapterId ?? '', markdownFile)
+      .then(({ markdown, ast }) => {
+        if (cancelled) return;
+        setMarkdownContent(markdown);
+        setMarkdownTree(ast);
         setLoading(false);
       })
       .catch((error) => {
+        if (cancelled) return;
         console.error('Ошибка загрузки markdown файла:', error, fetchPath);
+        setMarkdownTree(undefined);
         setMarkdownContent('# Ошибка загрузки контента\n\nФайл не найден или не может быть загружен.\n\nПуть: ' + fetchPath);
         setLoading(false);
       });
-  }, [section?.markdownFile]);
+
+    // Следующую часть раздела подгружаем заранее; на последней части последнего раздела
+    // главы — пакет следующей главы.
+    const chapterIndex = chapters.findIndex((c) => c.id === chapterId);
+    const isLastSection = chapter?.sections[chapter.sections.length - 1]?.id === section.id;
+    if (partIndex < parts.length - 1) {
+      prefetchSectionContent(chapterId ?? '', parts[partIndex + 1]);
+    } else if (isLastSection && chapterIndex >= 0 && chapterIndex < chapters.length - 1) {
+      prefetchChapter(chapters[chapterIndex + 1].id);
+    }
+
+    return () => {
+      cancelled = true;
+    };
+  }, [chapter, chapterId, section, markdownFile, partIndex, parts]);
+
+  // Новая часть раздела открывается с начала.
+  useEffect(() => {
+    const scrollContainer = contentRef.current?.closest('.layout-content');
+    scrollContainer?.scrollTo({ top: 0 });
+  }, [partIndex]);
+
+  // Ссылка на рисунок, таблицу или формулу (#fig-2-5, tools/xref_index.py): после загрузки
+  // части прокручиваем к якорю.
+  useEffect(() => {
+    if (loading || !location.hash) return;
+    document.getElementById(decodeURIComponent(location.hash.slice(1)))?.scrollIntoView({ block: 'start' });
+  }, [loading, location.hash, markdownFile]);
 
   useEffect(() => {
     if (!chapterId || !sectionId) return;
@@ -88,7 +127,9 @@ const Chapter: React.FC = () => {
       const raw =
         scrollable <= 0 ? 1 : (containerScrollTop - bodyTopInContainer) / scrollable;
 
-      const newProgress = Math.max(0, Math.min(100, Math.round(raw * 100)));
+      // Progress of the whole section: earlier parts count as read.
+      const partRaw = (partIndex + Math.max(0, Math.min(1, raw))) / parts.length;
+      const newProgress = Math.max(0, Math.min(100, Math.round(partRaw * 100)));
 
       setProgress(newProgress);
       if (chapterId && sectionId) {
@@ -120,7 +161,7 @@ const Chapter: React.FC = () => {
         ro?.disconnect();
       };
     }
-  }, [chapterId, sectionId, loading, markdownContent]);
+  }, [chapterId, sectionId, loading, markdownContent, partIndex, parts.length]);
 
   if (!chapter || !section) {
     return (
@@ -187,17 +228,28 @@ const Chapter: React.FC = () => {
         </nav>
 
         <h1 className="chapter-title">{section.title}</h1>
+        {parts.length > 1 && (
+          <div className="chapter-part">
+            Часть {partIndex + 1} из {parts.length}
+          </div>
+        )}
 
         <div className="chapter-body" ref={bodyRef}>
           {loading ? (
             <div>Загрузка...</div>
+          ) : markdownTree ? (
+            <MarkdownTree tree={markdownTree} />
           ) : (
             <MarkdownContent content={markdownContent} />
           )}
         </div>
 
         <div className="chapter-navigation">
-          {prevSection ? (
+          {partIndex > 0 ? (
+            <Link to={partLink(partIndex - 1)} className="chapter-nav-link prev">
+              ← Часть {partIndex} из {parts.length}
+            </Link>
+          ) : prevSection ? (
             <Link
               to={`/chapter/${chapterId}/section/${prevSection.id}`}
               className="chapter-nav-link prev"
@@ -208,7 +260,11 @@ const Chapter: React.FC = () => {
             <div></div>
           )}
 
-          {nextSection ? (
+          {partIndex < parts.length - 1 ? (
+            <Link to={partLink(partIndex + 1)} className="chapter-nav-link next">
+              Часть {partIndex + 2} из {parts.length} →
+            </Link>
+          ) : nextSection ? (
             <Link
               to={`/chapter/${chapterId}/section/${nextSection.id}`}
               className="chapter-nav-link next"
@@ -1,9 +1,18 @@
-import React, { useState, useMemo } from 'react';
+import React, { useState, useMemo, useEffect } from 'react';
+import { useLocation } from 'react-router-dom';
 import { glossary } from '../data/glossary';
 import './Glossary.css';
 
 const Glossary: React.FC = () => {
   const [searchQuery, setSearchQuery] = useState('');
+  const location = useLocation();
+  // Ссылки из текста разделов ведут на /glossary#<термин> (tools/glossary_link.py).
+  const activeTerm = location.hash ? decodeURIComponent(location.hash.slice(1)) : '';
+
+  useEffect(() => {
+    if (!activeTerm) return;
+    document.getElementById(activeTerm)?.scrollIntoView({ behavior: 'smooth', block: 'center' });
+  }, [activeTerm]);
 
   const filteredGlossary = useMemo(() => {
     if (!searchQuery.trim()) return glossary;
@@ -34,7 +43,11 @@ const Glossary: React.FC = () => {
 
       <div className="glossary-list">
         {filteredGlossary.map((item, index) => (
-          <div key={index} className="glossary-item">
+          <div
+            key={index}
+            id={item.term}
+            className={`glossary-item ${item.term === activeTerm ? 'glossary-item-active' : ''}`}
+          >
             <h3 className="glossary-term">{item.term}</h3>
             <p className="glossary-definition">{item.definition}</p>
           </div>
@@ -8,6 +8,7 @@ export interface Section {
   id: string;
   title: string;
   markdownFile: string; // Path to markdown file (e.g., 'chapters/introduction-1.md')
+  parts?: string[]; // Long sections: markdown files of the parts, shown one at a time
   images?: ImageData[];
 }
 
@@ -0,0 +1,98 @@
+// Section markdown loading through the per-chapter content packs written by the converter
+// (tools/content_pack.py -> public/content/packs/<chapterId>.json). A chapter is fetched once
+// and its other sections are served from memory; if the pack is missing (e.g. content edited
+// by hand), the single section file is fetched as before. Packs built with --mdast also
+// carry each section's parsed tree (tools/mdast.py), rendered without a markdown parse.
+// Sections split into parts (Section.parts) are stored in the pack part by part; every part
+// is looked up by its own markdownFile.
+
+import type { MarkdownTreeRoot } from './markdown';
+
+interface PackFile {
+  markdownFile: string;
+  markdown: string;
+  ast?: MarkdownTreeRoot;
+}
+
+interface PackSection extends Partial<PackFile> {
+  id: string;
+  title: string;
+  markdownFile: string;
+  parts?: PackFile[];
+}
+
+export interface SectionContent {
+  markdown: string;
+  ast?: MarkdownTreeRoot;
+}
+
+interface ChapterPack {
+  version: number;
+  chapter: { id: string; title: string };
+  sections: PackSection[];
+}
+
+const packs = new Map<string, Promise<Map<string, SectionContent>>>();
+// Files fetched one by one (no pack), so a prefetched part is not downloaded twice.
+const files = new Map<string, Promise<SectionContent>>();
+
+const loadPack = (chapterId: string): Promise<Map<string, SectionContent>> => {
+  let pack = packs.get(chapterId);
+  if (!pack) {
+    pack = fetch(`/content/packs/${encodeURIComponent(chapterId)}.json`)
+      .then((response) => {
+        if (!response.ok) {
+          throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        return response.json() as Promise<ChapterPack>;
+      })
+      .then((data) => {
+        const files = new Map<string, SectionContent>();
+        for (const s of data.sections) {
+          for (const f of s.parts ?? [s]) {
+            if (f.markdown !== undefined) files.set(f.markdownFile, { markdown: f.markdown, ast: f.ast });
+          }
+        }
+        return files;
+      });
+    // Do not cache failures: the next section view may retry.
+    pack.catch(() => packs.delete(chapterId));
+    packs.set(chapterId, pack);
+  }
+  return pack;
+};
+
+export const prefetchChapter = (chapterId: string): void => {
+  loadPack(chapterId).catch(() => undefined);
+};
+
+const loadFile = (markdownFile: string): Promise<SectionContent> => {
+  let file = files.get(markdownFile);
+  if (!file) {
+    file = fetch(`/content/${markdownFile}`).then(async (response) => {
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
+      return { markdown: await response.text() };
+    });
+    file.catch(() => files.delete(markdownFile));
+    files.set(markdownFile, file);
+  }
+  return file;
+};
+
+// markdownFile is a section's file or one of its parts.
+export const loadSectionContent = async (chapterId: string, markdownFile: string): Promise<SectionContent> => {
+  try {
+    const content = (await loadPack(chapterId)).get(markdownFile);
+    if (content !== undefined) return content;
+  } catch {
+    // no pack for this chapter: fall back to the section file
+  }
+  return loadFile(markdownFile);
+};
+
+// Warm the cache for a part about to be shown (the next one while reading the current).
+export const prefetchSectionContent = (chapterId: string, markdownFile: string): void => {
+  loadSectionContent(chapterId, markdownFile).catch(() => undefined);
+};
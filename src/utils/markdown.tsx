@@ -1,59 +1,214 @@
-import React from 'react';
-import ReactMarkdown from 'react-markdown';
+import React, { useEffect, useMemo, useState } from 'react';
+import { Fragment, jsx, jsxs } from 'react/jsx-runtime';
+import ReactMarkdown, { type Components } from 'react-markdown';
+import { Link } from 'react-router-dom';
+import { toHast } from 'mdast-util-to-hast';
+import { toJsxRuntime } from 'hast-util-to-jsx-runtime';
+import { fromHtml } from 'hast-util-from-html';
+import { unified } from 'unified';
 import remarkMath from 'remark-math';
 import remarkGfm from 'remark-gfm';
 import rehypeKatex from 'rehype-katex';
 import rehypeHighlight from 'rehype-highlight';
+import { resolveXref, xrefPath, type XrefItem } from './xref';
 
 interface MarkdownContentProps {
   content: string;
 }
 
-export const MarkdownContent: React.FC<MarkdownContentProps> = ({ content }) => {
+// Figure links carry their intrinsic size and generated variants in the URL fragment
+// (tools/image_optimize.py): /images/x/ris_1_5.png#w=1200&h=900&srcset=480,960&fmt=avif,webp
+interface ImageMeta {
+  src: string;
+  width?: number;
+  height?: number;
+  widths: number[];
+  formats: string[];
+}
+
+const parseImageSrc = (src: string = ''): ImageMeta => {
+  const hashAt = src.indexOf('#');
+  if (hashAt < 0) return { src, widths: [], formats: [] };
+  const params = new URLSearchParams(src.slice(hashAt + 1));
+  const num = (v: string | null) => (v ? Number(v) || undefined : undefined);
+  const list = (v: string | null) => (v ? v.split(',').filter(Boolean) : []);
+  return {
+    src: src.slice(0, hashAt),
+    width: num(params.get('w')),
+    height: num(params.get('h')),
+    widths: list(params.get('srcset')).map(Number).filter((w) => w > 0),
+    formats: list(params.get('fmt')),
+  };
+};
+
+const variantSrcSet = (meta: ImageMeta, format: string): string => {
+  const base = meta.src.replace(/\.[^./]+$/, '');
+  const items = meta.widths.map((w) => `${base}-${w}w.${format} ${w}w`);
+  items.push(meta.width ? `${base}.${format} ${meta.width}w` : `${base}.${format}`);
+  return items.join(', ');
+};
+
+// Tables with merged cells come as a <table> HTML block (tools/docx_tables.py), anchors of
+// figures, tables and formulas as an empty <div id="fig-2-5"> block (tools/xref_index.py).
+// Only those raw nodes are parsed into elements, before KaTeX so math in cells is rendered;
+// any other raw HTML is left for react-markdown to show as text.
+type HastParent = { children?: any[] };
+
+const expandHtmlBlocks = (node: HastParent) => {
+  if (!node.children) return;
+  node.children = node.children.flatMap((child) => {
+    if (child.type === 'raw' && /^\s*<(?:table|div)[\s>]/i.test(child.value)) {
+      return fromHtml(child.value, { fragment: true }).children;
+    }
+    expandHtmlBlocks(child);
+    return [child];
+  });
+};
+
+const rehypeHtmlBlocks = () => (tree: HastParent) => {
+  expandHtmlBlocks(tree);
+};
+
+// Reference to a figure, table or formula ([рис. 2.5](#fig-2-5)): a link to the section that
+// holds it, with a preview on hover, both from the cross-reference index (utils/xref.ts).
+// Until the index answers, or if the anchor is not in it, the reference stays plain text.
+const XrefLink: React.FC<{ anchor: string; children?: React.ReactNode }> = ({ anchor, children }) => {
+  const [item, setItem] = useState<XrefItem | null>(null);
+  const [preview, setPreview] = useState(false);
+
+  useEffect(() => {
+    let cancelled = false;
+    resolveXref(anchor).then((found) => {
+      if (!cancelled) setItem(found);
+    });
+    return () => {
+      cancelled = true;
+    };
+  }, [anchor]);
+
+  if (!item) return <span className="xref">{children}</span>;
   return (
-    <ReactMarkdown
-      remarkPlugins={[remarkMath, remarkGfm]}
-      rehypePlugins={[rehypeKatex, rehypeHighlight]}
-      components={{
-        img: ({ node, ...props }) => (
-          <img
-            {...props}
-            style={{ maxWidth: '100%', height: 'auto', borderRadius: '8px', margin: '1rem auto', display: 'block', cursor: 'pointer' }}
-            onClick={() => {
-              // Open image in modal (will be handled by parent)
-              const event = new CustomEvent('imageClick', { detail: { src: props.src, alt: props.alt } });
-              window.dispatchEvent(event);
-            }}
-          />
-        ),
-        code: ({ className, children, ...props }: any) => {
-          return (
-            <code className={className} {...props}>
-              {children}
-            </code>
-          );
-        },
-        table: ({ children, ...props }: any) => (
-          <div style={{ overflowX: 'auto', margin: '1rem 0' }}>
-            <table style={{ borderCollapse: 'collapse', width: '100%', border: '1px solid #ddd' }} {...props}>
-              {children}
-            </table>
-          </div>
-        ),
-        th: ({ children, ...props }: any) => (
-          <th style={{ border: '1px solid #ddd', padding: '8px', backgroundColor: '#f2f2f2', textAlign: 'left' }} {...props}>
-            {children}
-          </th>
-        ),
-        td: ({ children, ...props }: any) => (
-          <td style={{ border: '1px solid #ddd', padding: '8px' }} {...props}>
-            {children}
-          </td>
-        ),
-      }}
+    <span
+      className="xref"
+      onMouseEnter={() => setPreview(true)}
+      onMouseLeave={() => setPreview(false)}
+      onFocus={() => setPreview(true)}
+      onBlur={() => setPreview(false)}
     >
+      <Link to={xrefPath(anchor, item)} className="xref-link">
+        {children}
+      </Link>
+      {preview && (
+        <span className="xref-preview" role="tooltip">
+          {item.thumbnail && (
+            <img
+              src={item.thumbnail.src}
+              width={item.thumbnail.width}
+              height={item.thumbnail.height}
+              alt=""
+              className="xref-preview-image"
+            />
+          )}
+          <span className="xref-preview-caption">{item.caption}</span>
+        </span>
+      )}
+    </span>
+  );
+};
+
+const components: Components = {
+  img: ({ node, src, ...props }) => {
+    const meta = parseImageSrc(src);
+    const image = (
+      <img
+        {...props}
+        src={meta.src}
+        width={meta.width}
+        height={meta.height}
+        loading="lazy"
+        decoding="async"
+        style={{ maxWidth: '100%', height: 'auto', borderRadius: '8px', margin: '1rem auto', display: 'block', cursor: 'pointer' }}
+        onClick={() => {
+          // Open image in modal (will be handled by parent)
+          const event = new CustomEvent('imageClick', { detail: { src: meta.src, alt: props.alt } });
+          window.dispatchEvent(event);
+        }}
+      />
+    );
+    if (!meta.formats.length) return image;
+    const sizes = meta.width ? `(max-width: ${meta.width}px) 100vw, ${meta.width}px` : '100vw';
+    return (
+      <picture>
+        {meta.formats.map((format) => (
+          <source key={format} type={`image/${format}`} srcSet={variantSrcSet(meta, format)} sizes={sizes} />
+        ))}
+        {image}
+      </picture>
+    );
+  },
+  // In-app links (e.g. glossary terms linked by tools/glossary_link.py) go through the router;
+  // #anchor links are cross-references (tools/xref_index.py).
+  a: ({ node, href, children, ...props }) =>
+    href && href.startsWith('#') ? (
+      <XrefLink anchor={decodeURIComponent(href.slice(1))}>{children}</XrefLink>
+    ) : href && href.startsWith('/') ? (
+      <Link to={href} className="glossary-link" {...props}>
+        {children}
+      </Link>
+    ) : (
+      <a href={href} {...props}>
+        {children}
+      </a>
+    ),
+  code: ({ className, children, ...props }: any) => {
+    return (
+      <code className={className} {...props}>
+        {children}
+      </code>
+    );
+  },
+  table: ({ children, ...props }: any) => (
+    <div style={{ overflowX: 'auto', margin: '1rem 0' }}>
+      <table style={{ borderCollapse: 'collapse', width: '100%', border: '1px solid #ddd' }} {...props}>
+        {children}
+      </table>
+    </div>
+  ),
+  th: ({ children, ...props }: any) => (
+    <th style={{ border: '1px solid #ddd', padding: '8px', backgroundColor: '#f2f2f2', textAlign: 'left' }} {...props}>
+      {children}
+    </th>
+  ),
+  td: ({ children, ...props }: any) => (
+    <td style={{ border: '1px solid #ddd', padding: '8px' }} {...props}>
+      {children}
+    </td>
+  ),
+};
+
+export const MarkdownContent: React.FC<MarkdownContentProps> = ({ content }) => {
+  return (
+    <ReactMarkdown remarkPlugins={[remarkMath, remarkGfm]} rehypePlugins={[rehypeHtmlBlocks, rehypeKatex, rehypeHighlight]} components={components}>
       {content}
     </ReactMarkdown>
   );
 };
 
+// Tree prebuilt by the converter (tools/mdast.py, --mdast): the same mdast remark-parse +
+// remark-gfm + remark-math would give, so only the hast/rehype/React steps run here.
+export type MarkdownTreeRoot = Parameters<typeof toHast>[0];
+
+const rehypeProcessor = unified().use(rehypeHtmlBlocks).use(rehypeKatex).use(rehypeHighlight);
+
+interface MarkdownTreeProps {
+  tree: MarkdownTreeRoot;
+}
+
+export const MarkdownTree: React.FC<MarkdownTreeProps> = ({ tree }) => {
+  const element = useMemo(() => {
+    const hast = rehypeProcessor.runSync(toHast(tree, { allowDangerousHtml: true }) as any);
+    return toJsxRuntime(hast, { Fragment, jsx, jsxs, components, passNode: true, ignoreInvalidStyle: true });
+  }, [tree]);
+  return element;
+};
+
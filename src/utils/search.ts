@@ -0,0 +1,137 @@
+// Full-text search over the index written by the converter (tools/search_index.py ->
+// public/content/search/). The root dictionary (index.json) is fetched once; a query then
+// fetches only the shards for its terms' prefixes. Query words are normalized and stemmed
+// with the ending list from the root dictionary, exactly like the indexed text.
+
+interface SearchRoot {
+  version: number;
+  minStem: number;
+  prefixLen: number;
+  endings: string[];
+  stopWords: string[];
+  docs: [chapterId: string, sectionId: string, title: string, tokens: number][];
+  shards: Record<string, [file: string, terms: number]>;
+}
+
+// term -> postings: [doc, p0, d1, d2, ...] (positions delta-encoded)
+type Shard = Record<string, number[][]>;
+
+export interface SearchHit {
+  chapterId: string;
+  sectionId: string;
+  title: string;
+  matches: number;
+  score: number;
+}
+
+const BASE = '/content/search';
+const TOKEN_RE = /[0-9a-zа-яё]+(?:-[0-9a-zа-яё]+)*/gi;
+const CYRILLIC_RE = /[а-я]/;
+
+let rootPromise: Promise<SearchRoot> | null = null;
+const shards = new Map<string, Promise<Shard>>();
+
+const fetchJson = async <T>(url: string): Promise<T> => {
+  const response = await fetch(url);
+  if (!response.ok) {
+    throw new Error(`HTTP error! status: ${response.status}`);
+  }
+  return response.json() as Promise<T>;
+};
+
+const loadRoot = (): Promise<SearchRoot> => {
+  if (!rootPromise) {
+    rootPromise = fetchJson<SearchRoot>(`${BASE}/index.json`);
+    rootPromise.catch(() => {
+      rootPromise = null;
+    });
+  }
+  return rootPromise;
+};
+
+const loadShard = (file: string): Promise<Shard> => {
+  let shard = shards.get(file);
+  if (!shard) {
+    shard = fetchJson<{ terms: Shard }>(`${BASE}/${file}`).then((data) => data.terms);
+    shard.catch(() => shards.delete(file));
+    shards.set(file, shard);
+  }
+  return shard;
+};
+
+const normalize = (word: string): string => word.toLowerCase().replace(/ё/g, 'е');
+
+const stem = (root: SearchRoot, word: string): string => {
+  if (!CYRILLIC_RE.test(word)) return word;
+  for (const ending of root.endings) {
+    if (word.endsWith(ending) && word.length - ending.length >= root.minStem) {
+      return word.slice(0, -ending.length);
+    }
+  }
+  return word;
+};
+
+const positions = (posting: number[]): number[] => {
+  const out: number[] = [];
+  let p = 0;
+  for (let i = 1; i < posting.length; i++) {
+    p = i === 1 ? posting[i] : p + posting[i];
+    out.push(p);
+  }
+  return out;
+};
+
+// doc -> positions of one query word (several index terms when the last word is a prefix)
+const lookup = async (root: SearchRoot, word: string, asPrefix: boolean): Promise<Map<number, number[]>> => {
+  const term = stem(root, word);
+  const hits = new Map<number, number[]>();
+  const entry = root.shards[term.slice(0, root.prefixLen)];
+  if (!entry) return hits;
+  const shard = await loadShard(entry[0]);
+  const matching = asPrefix && word.length >= root.prefixLen
+    ? Object.keys(shard).filter((t) => t === term || t.startsWith(word))
+    : term in shard ? [term] : [];
+  for (const t of matching) {
+    for (const posting of shard[t]) {
+      const list = hits.get(posting[0]) ?? [];
+      list.push(...positions(posting));
+      hits.set(posting[0], list);
+    }
+  }
+  return hits;
+};
+
+/**
+ * Sections containing every word of the query, best first. The last word also matches as a
+ * prefix while it is being typed. Sections where the words stand next to each other rank higher.
+ */
+export const searchSections = async (query: string, limit = 20): Promise<SearchHit[]> => {
+  const root = await loadRoot();
+  const stop = new Set(root.stopWords);
+  const words = (query.match(TOKEN_RE) ?? []).map(normalize).filter((w) => !stop.has(w));
+  if (!words.length) return [];
+
+  const typing = !/\s$/.test(query);
+  const perWord = await Promise.all(words.map((w, i) => lookup(root, w, typing && i === words.length - 1)));
+
+  const total = root.docs.length;
+  const hits: SearchHit[] = [];
+  for (const doc of perWord[0].keys()) {
+    if (!perWord.every((m) => m.has(doc))) continue;
+    let score = 0;
+    let matches = 0;
+    perWord.forEach((m) => {
+      const tf = m.get(doc)!.length;
+      matches += tf;
+      score += (tf / Math.sqrt(root.docs[doc][3] || 1)) * Math.log(1 + total / m.size);
+    });
+    for (let i = 1; i < perWord.length; i++) {
+      const next = new Set(perWord[i].get(doc));
+      // stop words are not indexed but still count as positions: allow a small gap
+      if (perWord[i - 1].get(doc)!.some((p) => next.has(p + 1) || next.has(p + 2) || next.has(p + 3))) score *= 1.5;
+    }
+    const [chapterId, sectionId, title] = root.docs[doc];
+    hits.push({ chapterId, sectionId, title, matches, score });
+  }
+  return hits.sort((a, b) => b.score - a.score).slice(0, limit);
+};
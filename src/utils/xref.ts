@@ -0,0 +1,48 @@
+// Cross-reference index written by the converter (tools/xref_index.py ->
+// public/content/xref.json): every figure, table and numbered formula with its anchor, section,
+// part and caption (figures also a thumbnail). References in the text are links to the anchor
+// alone ([рис. 2.5](#fig-2-5)); the index resolves them to a section and gives the hover
+// preview, so neither needs the referenced section's markdown.
+
+export interface XrefItem {
+  kind: 'figure' | 'table' | 'formula';
+  number: string;
+  caption: string;
+  chapterId: string;
+  sectionId: string;
+  part: number;
+  thumbnail?: { src: string; width?: number; height?: number };
+}
+
+interface XrefIndex {
+  version: number;
+  items: Record<string, XrefItem>;
+  unresolved: Record<string, string>; // linked anchors no section has -> first section linking
+}
+
+let indexPromise: Promise<XrefIndex> | null = null;
+
+const loadIndex = (): Promise<XrefIndex> => {
+  if (!indexPromise) {
+    indexPromise = fetch('/content/xref.json').then((response) => {
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
+      return response.json() as Promise<XrefIndex>;
+    });
+    // Do not cache failures: the next reference may retry.
+    indexPromise.catch(() => {
+      indexPromise = null;
+    });
+  }
+  return indexPromise;
+};
+
+// The indexed item of an anchor id ("fig-2-5"), or null if there is none (or no index).
+export const resolveXref = (anchor: string): Promise<XrefItem | null> =>
+  loadIndex()
+    .then((index) => index.items[anchor] ?? null)
+    .catch(() => null);
+
+export const xrefPath = (anchor: string, item: XrefItem): string =>
+  `/chapter/${item.chapterId}/section/${item.sectionId}${item.part > 1 ? `?part=${item.part}` : ''}#${anchor}`;
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Convert many DOCX manuals in parallel, each into its own output root.
+
+Every document goes through the same pipeline as tools/build_content.py and gets the
+repo layout below its root:
+  <root>/public/content/chapters/*.md, <root>/src/content/chapters/*.md,
+  <root>/src/data/chapters.ts, <root>/public/images/store/<hash>.<ext> and
+  <root>/public/images/<slug>/figures.json
+
+Usage:
+  python tools/batch_convert.py manuals/*.docx --out-dir build/manuals
+  python tools/batch_convert.py a.docx=site-a b.docx=site-b -j 4
+
+An input given as DOCX=ROOT uses ROOT; a bare DOCX goes to <out-dir>/<slug of file name>.
+Glossary terms are linked only with --glossary PATH (a glossary.ts; the manuals are not
+this repo's). Documents run on a process pool; a failure is reported for that document only and the
+others still complete. A worker that dies (e.g. killed for memory) breaks the pool: every
+document not finished by then is reported as failed. Exit status is 1 if any document failed.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import time
+import traceback
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from build_content import build
+from docx_to_md import OutputPaths, slugify_ru
+
+
+@dataclass
+class BatchResult:
+    docx: Path
+    root: Path
+    ok: bool
+    seconds: float
+    chapters: int = 0
+    sections: int = 0
+    rendered: int = 0
+    written: int = 0
+    images: int = 0
+    error: Optional[str] = None
+
+
+def convert_one(
+    docx_path: Path, root: Path, force: bool = False, stream: bool = False, glossary: Optional[Path] = None
+) -> BatchResult:
+    """
+    Worker entry point (runs in a child process). Never raises: errors go into the result.
+    """
+    t0 = time.perf_counter()
+    try:
+        if not docx_path.exists():
+            raise FileNotFoundError(f"DOCX not found: {docx_path}")
+        paths = OutputPaths.under(root, images_name=slugify_ru(docx_path.stem))
+        res = build(docx_path, paths=paths, force=force, stream=stream, glossary=glossary)
+    except Exception:
+        return BatchResult(
+            docx=docx_path,
+            root=root,
+            ok=False,
+            seconds=time.perf_counter() - t0,
+            error=traceback.format_exc(),
+        )
+
+    chapters = res["convert"]
+    sections = [sec for ch in chapters for sec in ch.sections]  # type: ignore[attr-defined]
+    return BatchResult(
+        docx=docx_path,
+        root=root,
+        ok=True,
+        seconds=time.perf_counter() - t0,
+        chapters=len(chapters),  # type: ignore[arg-type]
+        sections=len(sections),
+        rendered=sum(sec.rendered for sec in sections),
+        written=len(res["write_markdown"]),  # type: ignore[arg-type]
+        images=len(res["images"]),  # type: ignore[arg-type]
+    )
+
+
+def parse_inputs(items: List[str], out_dir: Path) -> List[Tuple[Path, Path]]:
+    jobs: List[Tuple[Path, Path]] = []
+    roots: set = set()
+    for item in items:
+        if "=" in item:
+            docx_s, root_s = item.split("=", 1)
+            docx_path, root = Path(docx_s), Path(root_s)
+        else:
+            docx_path = Path(item)
+            root = out_dir / slugify_ru(docx_path.stem)
+        if root in roots:
+            raise SystemExit(f"Two inputs map to the same output root: {root}")
+        roots.add(root)
+        jobs.append((docx_path, root))
+    return jobs
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Convert many DOCX manuals in parallel.")
+    ap.add_argument("inputs", nargs="+", help="DOCX or DOCX=OUTPUT_ROOT")
+    ap.add_argument("--out-dir", type=Path, default=Path("build/manuals"), help="root for inputs without =ROOT")
+    ap.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="worker processes")
+    ap.add_argument("--force", action="store_true", help="re-render every section, ignoring build manifests")
+    ap.add_argument("--stream", action="store_true", help="low-memory streaming reader (tools/docx_stream.py)")
+    ap.add_argument("--glossary", type=Path, help="glossary.ts whose terms to link (tools/glossary_link.py; default: none)")
+    args = ap.parse_args()
+    if args.glossary is not None and not args.glossary.is_file():
+        raise SystemExit(f"Glossary not found: {args.glossary}")
+
+    jobs = parse_inputs(args.inputs, args.out_dir)
+    workers = max(1, min(args.jobs, len(jobs)))
+
+    t0 = time.perf_counter()
+    results: List[BatchResult] = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(convert_one, docx_path, root, args.force, args.stream, args.glossary): (docx_path, root)
+            for docx_path, root in jobs
+        }
+        for fut in as_completed(futures):
+            try:
+                r = fut.result()
+            except BrokenExecutor as e:  # a worker died (e.g. killed for memory)
+                docx_path, root = futures[fut]
+                r = BatchResult(
+                    docx=docx_path,
+                    root=root,
+                    ok=False,
+                    seconds=0.0,  # its own time is unknown
+                    error=f"Worker pool failed: {type(e).__name__}: {e}",
+                )
+            results.append(r)
+            if r.ok:
+                print(
+                    f"ok    {r.docx.as_posix()} -> {r.root.as_posix()}: {r.sections} sections "
+                    f"({r.rendered} re-rendered, {r.written} written), {r.images} images, {r.seconds:.2f}s"
+                )
+            else:
+                print(f"FAIL  {r.docx.as_posix()} -> {r.root.as_posix()} ({r.seconds:.2f}s)")
+                print((r.error or "").rstrip())
+
+    failed = [r for r in results if not r.ok]
+    ok = [r for r in results if r.ok]
+    print("")
+    print(f"Documents: {len(results)} ({len(ok)} ok, {len(failed)} failed) on {workers} workers")
+    print(f"Sections: {sum(r.sections for r in ok)} (re-rendered: {sum(r.rendered for r in ok)})")
+    print(f"Markdown files written: {sum(r.written for r in ok)}")
+    print(f"Images: {sum(r.images for r in ok)}")
+    print(f"Wall time: {time.perf_counter() - t0:.2f}s (sum of per-document time: {sum(r.seconds for r in results):.2f}s)")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark for docx_to_md.runs_to_md: runs processed per second, before and after
+run coalescing.
+
+"before" is a verbatim copy of the per-run implementation that runs_to_md replaced, kept
+here only as the baseline. Paragraphs are built in memory with python-docx and mimic Word's
+fragmentation: words split into several runs with identical formatting, plus bold/italic
+and highlighted stretches.
+
+Usage (from repo root):
+  python tools/bench/bench_runs_to_md.py [--paragraphs 2000] [--runs 40] [--repeat 5]
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from docx import Document  # noqa: E402
+from docx.enum.text import WD_COLOR_INDEX  # noqa: E402
+from docx.text.paragraph import Paragraph  # noqa: E402
+
+from docx_to_md import escape_md_text, norm_spaces, runs_to_md  # noqa: E402
+
+
+WORDS = "модуль связность сцепление программа система проектирование интерфейс данные".split()
+
+
+def runs_to_md_before(p: Paragraph) -> str:
+    parts: List[str] = []
+
+    for run in p.runs:
+        t = run.text or ""
+        if not t:
+            continue
+        t = t.replace("\r", "").replace("\n", " ")
+        m = re.match(r"^(\s*)(.*?)(\s*)$", t, flags=re.DOTALL)
+        lead, core, tail = (m.group(1), m.group(2), m.group(3)) if m else ("", t, "")
+        lead = norm_spaces(lead)
+        core = escape_md_text(norm_spaces(core))
+        tail = norm_spaces(tail)
+
+        bold = bool(run.bold)
+        italic = bool(run.italic)
+        if getattr(run.font, "highlight_color", None) is not None:
+            bold = True
+
+        has_word = bool(re.search(r"[0-9A-Za-zА-Яа-яЁё]", core))
+        styled = core
+        if has_word:
+            if bold and italic:
+                styled = f"***{core}***"
+            elif bold:
+                styled = f"**{core}**"
+            elif italic:
+                styled = f"*{core}*"
+
+        parts.append(f"{lead}{styled}{tail}")
+
+    return "".join(parts).strip()
+
+
+def make_paragraphs(count: int, runs_per_paragraph: int, seed: int = 1) -> List[Paragraph]:
+    rnd = random.Random(seed)
+    doc = Document()
+    paragraphs: List[Paragraph] = []
+    for _ in range(count):
+        p = doc.add_paragraph()
+        n = 0
+        while n < runs_per_paragraph:
+            word = rnd.choice(WORDS)
+            kind = rnd.random()
+            # a word split into 1-3 runs with the same formatting, then a separate space run
+            pieces = rnd.randint(1, 3)
+            step = max(1, len(word) // pieces)
+            chunks = [word[i : i + step] for i in range(0, len(word), step)] + [" "]
+            for chunk in chunks:
+                r = p.add_run(chunk)
+                if kind < 0.15:
+                    r.bold = True
+                elif kind < 0.25:
+                    r.italic = True
+                elif kind < 0.3:
+                    r.font.highlight_color = WD_COLOR_INDEX.YELLOW
+                n += 1
+        paragraphs.append(p)
+    return paragraphs
+
+
+def measure(fn: Callable[[Paragraph], str], paragraphs: List[Paragraph], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for p in paragraphs:
+            fn(p)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="runs_to_md micro-benchmark")
+    ap.add_argument("--paragraphs", type=int, default=2000)
+    ap.add_argument("--runs", type=int, default=40, help="approximate runs per paragraph")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    paragraphs = make_paragraphs(args.paragraphs, args.runs)
+    total_runs = sum(len(p.runs) for p in paragraphs)
+
+    before = measure(runs_to_md_before, paragraphs, args.repeat)
+    after = measure(runs_to_md, paragraphs, args.repeat)
+
+    sample_before = runs_to_md_before(paragraphs[0])
+    sample_after = runs_to_md(paragraphs[0])
+
+    print(f"paragraphs: {len(paragraphs)}, runs: {total_runs}")
+    print(f"before: {total_runs / before:12,.0f} runs/s  ({before * 1000:.1f} ms)")
+    print(f"after:  {total_runs / after:12,.0f} runs/s  ({after * 1000:.1f} ms)")
+    print(f"speedup: {before / after:.2f}x")
+    print(f"markdown length, first paragraph: {len(sample_before)} -> {len(sample_after)} chars")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Load test for tools/convert_service.py, on one machine.
+
+Sends --requests uploads of one DOCX (--docx, or a synthetic manual from
+tools/bench/synth_docx.py with the same size flags) with --concurrency connections in
+flight, then prints status counts, throughput, client-side latency percentiles and the
+service's own /metrics (queue depth, per-stage percentiles). With --retry, refused uploads
+are sent again after Retry-After (latency then includes the waits).
+
+Usage (start the service first, from repo root):
+  python tools/convert_service.py -j 4 --queue 8
+  python tools/bench/load_service.py --requests 200 --concurrency 16 --paragraphs 1500
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import io
+import json
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from convert_service import DEFAULT_PORT, percentiles  # noqa: E402
+from synth_docx import add_spec_arguments, generate, spec_from_args  # noqa: E402
+
+
+async def request(host: str, port: int, method: str, path: str, body: bytes = b"") -> Tuple[int, Dict[str, str], bytes]:
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        head = f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n"
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    while response.startswith(b"HTTP/1.1 100"):  # interim "100 Continue"
+        response = response.partition(b"\r\n\r\n")[2]
+    status_line, _, rest = response.partition(b"\r\n")
+    head, _, payload = rest.partition(b"\r\n\r\n")
+    headers = {k.strip().lower(): v.strip() for k, _, v in (line.partition(":") for line in head.decode("latin-1").split("\r\n"))}
+    return int(status_line.split()[1]), headers, payload
+
+
+async def run(args: argparse.Namespace, docx: bytes) -> None:
+    statuses: Counter = Counter()
+    latencies: List[float] = []
+    todo = iter(range(args.requests))
+
+    async def client() -> None:
+        for _ in todo:
+            t0 = time.perf_counter()
+            while True:
+                try:
+                    status, headers, _ = await request(args.host, args.port, "POST", "/convert?name=load", docx)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    status, headers = 0, {}  # connection dropped
+                statuses[status] += 1
+                if status != 503 or not args.retry:
+                    break
+                await asyncio.sleep(float(headers.get("retry-after", "1")))
+            if status == 200:
+                latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(args.concurrency)))
+    wall = time.perf_counter() - t0
+
+    print(f"Requests: {args.requests} in {wall:.2f}s ({statuses[200] / wall:.2f} conversions/s)")
+    print("Statuses: " + ", ".join(f"{k}: {v}" for k, v in sorted(statuses.items())))
+    print(f"Client latency (ms, 200 only): {percentiles(latencies)}")
+    _, _, metrics = await request(args.host, args.port, "GET", "/metrics")
+    print("Service metrics:")
+    print(json.dumps(json.loads(metrics), indent=2))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Load test the conversion service.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=DEFAULT_PORT)
+    ap.add_argument("--requests", type=int, default=50)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--retry", action="store_true", help="resend refused (503) uploads after Retry-After")
+    ap.add_argument("--docx", type=Path, help="upload this file instead of a synthetic manual")
+    add_spec_arguments(ap)
+    args = ap.parse_args()
+
+    if args.docx:
+        docx = args.docx.read_bytes()
+    else:
+        buf = io.BytesIO()
+        generate(spec_from_args(args), buf)
+        docx = buf.getvalue()
+    asyncio.run(run(args, docx))
+
+
+if __name__ == "__main__":
+    main()
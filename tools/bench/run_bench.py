@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite for the conversion tools (docx_to_md.py, extract_docx_images_and_insert.py).
+
+Generates a synthetic manual (tools/bench/synth_docx.py; size knobs are the same flags) or
+uses --docx, then times each stage separately:
+  parse, build_numbering_map, iter_block_items, segment, runs_to_md, table_to_md,
+  extract_figures, save_images, convert, write_outputs, insert_figures, stream_convert
+Every stage is run --repeat times and the best time is kept; then each stage runs once more
+under tracemalloc to record its peak Python heap (lxml's C-side allocations are not seen by
+tracemalloc; process max RSS is reported separately).
+
+Results are written as JSON (--out). With --baseline OLD.json, stages whose throughput fell
+by more than --tolerance are reported and the exit status is 1, so CI can catch regressions.
+
+Usage (from repo root):
+  python tools/bench/run_bench.py --paragraphs 3000 --out .build/bench/results.json
+  python tools/bench/run_bench.py --baseline .build/bench/results.json --tolerance 0.2
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from docx import Document  # noqa: E402
+
+import docx_to_md as d2m  # noqa: E402
+import extract_docx_images_and_insert as ext  # noqa: E402
+from docx_stream import StreamDocument  # noqa: E402
+from synth_docx import add_spec_arguments, generate, spec_from_args  # noqa: E402
+
+
+class BenchStage(NamedTuple):
+    name: str
+    setup: Callable[[], object]  # untimed; its result is passed to run
+    run: Callable[[object], int]  # timed; returns number of items processed
+
+
+def _none() -> object:
+    return None
+
+
+def make_stages(docx_path: Path, work: Path) -> List[BenchStage]:
+    doc = Document(str(docx_path))
+    blocks = list(d2m.iter_block_items(doc))
+    paragraphs = [obj for kind, obj in blocks if kind == "p"]
+    tables = [obj for kind, obj in blocks if kind == "tbl"]
+
+    chapters = d2m.convert_document(doc)
+    figures = ext.extract_figures_from_docx(doc)
+    counter = iter(range(1_000_000))
+
+    def fresh_paths() -> d2m.OutputPaths:
+        return d2m.OutputPaths.under(work / f"out-{next(counter)}")
+
+    # Markdown without images, written once; insert_figures gets a fresh copy per run.
+    md_source = fresh_paths()
+    d2m.write_outputs(chapters, md_source)
+    images_dir = work / "images"
+    img_map: Dict[str, Path] = {}
+    for num, info in figures.items():
+        out_path = ext.figure_image_path(doc, info, images_dir)
+        if out_path is not None:
+            ext.save_figure_image(doc, info, out_path)
+            img_map[num] = out_path
+
+    def copy_markdown() -> List[Path]:
+        dst = work / f"insert-{next(counter)}"
+        shutil.copytree(md_source.public_dir, dst)
+        return sorted(dst.glob("*.md"))
+
+    def run_parse(_: object) -> int:
+        return len(Document(str(docx_path)).element.body)
+
+    def run_numbering(_: object) -> int:
+        return len(d2m.build_numbering_map(doc))
+
+    def run_iter(_: object) -> int:
+        return sum(1 for _ in d2m.iter_block_items(doc))
+
+    def run_segment(_: object) -> int:
+        return sum(len(ch.sections) for ch in d2m.segment_document(doc))
+
+    def run_runs(_: object) -> int:
+        for p in paragraphs:
+            d2m.runs_to_md(p)
+        return len(paragraphs)
+
+    def run_tables(_: object) -> int:
+        for tbl in tables:
+            d2m.table_to_md(tbl)
+        return len(tables)
+
+    def run_figures(_: object) -> int:
+        return len(ext.extract_figures_from_docx(doc))
+
+    def run_save_images(out_dir: object) -> int:
+        n = 0
+        for info in figures.values():
+            out_path = ext.figure_image_path(doc, info, out_dir)  # type: ignore[arg-type]
+            if out_path is not None:
+                ext.save_figure_image(doc, info, out_path)
+                n += 1
+        return n
+
+    def run_convert(_: object) -> int:
+        return sum(len(ch.sections) for ch in d2m.convert_document(doc))
+
+    def run_write(paths: object) -> int:
+        d2m.write_outputs(chapters, paths)  # type: ignore[arg-type]
+        return sum(len(ch.sections) for ch in chapters)
+
+    def run_insert(md_files: object) -> int:
+        ext.insert_figures(md_files, figures, img_map)  # type: ignore[arg-type]
+        return len(md_files)  # type: ignore[arg-type]
+
+    def run_stream(_: object) -> int:
+        with StreamDocument(docx_path) as sdoc:
+            return sum(len(ch.sections) for ch in d2m.convert_document(sdoc))
+
+    return [
+        BenchStage("parse", _none, run_parse),
+        BenchStage("build_numbering_map", _none, run_numbering),
+        BenchStage("iter_block_items", _none, run_iter),
+        BenchStage("segment", _none, run_segment),
+        BenchStage("runs_to_md", _none, run_runs),
+        BenchStage("table_to_md", _none, run_tables),
+        BenchStage("extract_figures", _none, run_figures),
+        BenchStage("save_images", lambda: work / f"img-{next(counter)}", run_save_images),
+        BenchStage("convert", _none, run_convert),
+        BenchStage("write_outputs", fresh_paths, run_write),
+        BenchStage("insert_figures", copy_markdown, run_insert),
+        BenchStage("stream_convert", _none, run_stream),
+    ]
+
+
+def run_stage(stage: BenchStage, repeat: int) -> Dict[str, float]:
+    best = float("inf")
+    items = 0
+    for _ in range(repeat):
+        arg = stage.setup()
+        t0 = time.perf_counter()
+        items = stage.run(arg)
+        best = min(best, time.perf_counter() - t0)
+
+    arg = stage.setup()
+    tracemalloc.start()
+    try:
+        stage.run(arg)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "seconds": best,
+        "items": items,
+        "items_per_s": items / best if best > 0 else 0.0,
+        "peak_bytes": peak,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """
+    Stages whose items/s dropped by more than `tolerance` (0.2 = 20%) versus baseline.
+    """
+    regressions: List[str] = []
+    for name, cur in results["stages"].items():
+        old = baseline.get("stages", {}).get(name)
+        if not old or not old.get("items_per_s") or not cur["items_per_s"]:
+            continue
+        ratio = cur["items_per_s"] / old["items_per_s"]
+        if ratio < 1.0 - tolerance:
+            regressions.append(f"{name}: {old['items_per_s']:,.0f} -> {cur['items_per_s']:,.0f} items/s ({ratio:.2f}x)")
+    return regressions
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Benchmark the DOCX conversion stages.")
+    ap.add_argument("--docx", type=Path, help="benchmark this file instead of a synthetic one")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--only", nargs="*", help="run only these stages")
+    ap.add_argument("--out", type=Path, default=Path(".build/bench/results.json"))
+    ap.add_argument("--baseline", type=Path, help="previous results JSON to compare against")
+    ap.add_argument("--tolerance", type=float, default=0.2, help="allowed throughput drop vs baseline")
+    add_spec_arguments(ap)
+    args = ap.parse_args()
+
+    spec = spec_from_args(args)
+    with tempfile.TemporaryDirectory(prefix="docx-bench-") as tmp:
+        work = Path(tmp)
+        docx_path: Path = args.docx
+        synth_stats: Optional[dict] = None
+        if docx_path is None:
+            docx_path = work / "synthetic.docx"
+            synth_stats = generate(spec, docx_path)
+
+        stages = make_stages(docx_path, work)
+        if args.only:
+            stages = [st for st in stages if st.name in set(args.only)]
+
+        results: dict = {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "docx": str(args.docx) if args.docx else None,
+                "docx_bytes": docx_path.stat().st_size,
+                "synthetic": asdict(spec) if synth_stats is not None else None,
+                "generated": synth_stats,
+                "repeat": args.repeat,
+            },
+            "stages": {},
+        }
+        for st in stages:
+            res = run_stage(st, args.repeat)
+            results["stages"][st.name] = res
+            print(
+                f"{st.name:20s} {res['seconds'] * 1000:10.1f} ms  {res['items_per_s']:12,.0f} items/s  "
+                f"peak {res['peak_bytes'] / 1e6:8.1f} MB  ({res['items']} items)"
+            )
+
+    results["meta"]["max_rss_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8")) if args.baseline else None
+
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    args.out.write_text(json.dumps(results, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    print(f"Results: {args.out.as_posix()}")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            raise SystemExit(1)
+        print(f"No regressions vs {args.baseline.as_posix()} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
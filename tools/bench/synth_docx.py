@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Generator of synthetic DOCX manuals shaped like milovanov-t.docx, for benchmarks.
+
+Structure: ВВЕДЕНИЕ, N numbered chapters (Heading 2) with sections (Heading 3) and
+subsections (Heading 4), ЗАКЛЮЧЕНИЕ. Knobs:
+- paragraph count and run fragmentation (words split into several same-format runs, as Word
+  does around spell-check boundaries), with bold/italic/highlighted stretches;
+- Word-numbered lists (direct numPr, bullet and decimal) nested to a given depth;
+- tables with horizontally (gridSpan) and vertically (vMerge) merged cells;
+- figures: an image paragraph followed by a "Рис. X.Y. ..." caption.
+
+Usage (from repo root):
+  python tools/bench/synth_docx.py out.docx --paragraphs 5000 --figure-every 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import random
+import struct
+import zlib
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from docx import Document
+from docx.enum.text import WD_COLOR_INDEX
+from docx.exceptions import InvalidSpanError
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from docx.shared import Inches
+
+
+WORDS = (
+    "модуль связность сцепление программа система проектирование интерфейс данные "
+    "класс объект наследование полиморфизм абстракция декомпозиция структура алгоритм "
+    "требование этап процесс спецификация тестирование сопровождение"
+).split()
+
+BULLET_NUM_ID = 901
+DECIMAL_NUM_ID = 902
+
+
+@dataclass
+class SynthSpec:
+    chapters: int = 4
+    sections_per_chapter: int = 6
+    paragraphs: int = 2000  # body paragraphs in total (lists/captions not included)
+    words_per_paragraph: int = 30
+    fragmentation: int = 3  # max runs a single word is split into
+    emphasis_ratio: float = 0.2  # share of words with bold/italic/highlight
+    list_every: int = 25  # one list per N paragraphs (0 = none)
+    list_items: int = 6
+    list_depth: int = 3
+    table_every: int = 100  # one table per N paragraphs (0 = none)
+    table_rows: int = 12
+    table_cols: int = 5
+    merge_ratio: float = 0.1  # share of cells starting a horizontal or vertical merge
+    figure_every: int = 40  # one figure per N paragraphs (0 = none)
+    image_size: int = 256  # px, square PNG
+    seed: int = 1
+
+
+def png_bytes(size: int, rnd: random.Random) -> bytes:
+    """
+    Small noisy RGB PNG (noise keeps it from compressing to nothing).
+    """
+    row_len = size * 3
+    raw = b"".join(b"\x00" + rnd.randbytes(row_len) for _ in range(size))
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    ihdr = struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", ihdr) + chunk(b"IDAT", zlib.compress(raw, 6)) + chunk(b"IEND", b"")
+
+
+def _add_numbering(doc: Document) -> None:
+    numbering = doc.part.numbering_part.element
+    first_num = numbering.find(qn("w:num"))
+    for num_id, fmt in ((BULLET_NUM_ID, "bullet"), (DECIMAL_NUM_ID, "decimal")):
+        abs_num = OxmlElement("w:abstractNum")
+        abs_num.set(qn("w:abstractNumId"), str(num_id))
+        for ilvl in range(9):
+            lvl = OxmlElement("w:lvl")
+            lvl.set(qn("w:ilvl"), str(ilvl))
+            num_fmt = OxmlElement("w:numFmt")
+            num_fmt.set(qn("w:val"), fmt)
+            lvl.append(num_fmt)
+            abs_num.append(lvl)
+        if first_num is not None:
+            first_num.addprevious(abs_num)
+        else:
+            numbering.append(abs_num)
+
+        num = OxmlElement("w:num")
+        num.set(qn("w:numId"), str(num_id))
+        abs_ref = OxmlElement("w:abstractNumId")
+        abs_ref.set(qn("w:val"), str(num_id))
+        num.append(abs_ref)
+        numbering.append(num)
+
+
+def _set_num(p, num_id: int, ilvl: int) -> None:
+    num_pr = OxmlElement("w:numPr")
+    ilvl_el = OxmlElement("w:ilvl")
+    ilvl_el.set(qn("w:val"), str(ilvl))
+    num_id_el = OxmlElement("w:numId")
+    num_id_el.set(qn("w:val"), str(num_id))
+    num_pr.append(ilvl_el)
+    num_pr.append(num_id_el)
+    p._p.get_or_add_pPr().append(num_pr)
+
+
+def _fill_paragraph(p, spec: SynthSpec, rnd: random.Random, words: int) -> None:
+    for i in range(words):
+        word = rnd.choice(WORDS) + ("," if rnd.random() < 0.1 else "")
+        kind = rnd.random() / max(spec.emphasis_ratio, 1e-9)
+        pieces = rnd.randint(1, max(1, spec.fragmentation))
+        step = max(1, -(-len(word) // pieces))
+        for chunk in [word[j : j + step] for j in range(0, len(word), step)]:
+            r = p.add_run(chunk)
+            if kind < 0.5:
+                r.bold = True
+            elif kind < 0.85:
+                r.italic = True
+            elif kind < 1.0:
+                r.font.highlight_color = WD_COLOR_INDEX.YELLOW
+        if i < words - 1:
+            p.add_run(" ")
+
+
+def _add_table(doc: Document, spec: SynthSpec, rnd: random.Random) -> None:
+    tbl = doc.add_table(rows=spec.table_rows, cols=spec.table_cols)
+    for r_idx, row in enumerate(tbl.rows):
+        for c_idx, cell in enumerate(row.cells):
+            cell.text = f"{rnd.choice(WORDS)} {r_idx}.{c_idx}"
+    # Merges after filling: merged cells share a single tc, filling later would be ambiguous.
+    for r_idx in range(1, spec.table_rows - 1):
+        for c_idx in range(spec.table_cols - 1):
+            if rnd.random() >= spec.merge_ratio:
+                continue
+            a = tbl.cell(r_idx, c_idx)
+            b = tbl.cell(r_idx + 1, c_idx) if rnd.random() < 0.5 else tbl.cell(r_idx, c_idx + 1)
+            try:
+                a.merge(b)
+            except (InvalidSpanError, ValueError):
+                pass  # overlaps an existing merge: not a rectangle, skip
+
+
+def generate(spec: SynthSpec, out) -> dict:
+    """
+    Write a synthetic DOCX to `out` (path or binary file). Returns counts of what was generated.
+    """
+    rnd = random.Random(spec.seed)
+    doc = Document()
+    _add_numbering(doc)
+    images = [png_bytes(spec.image_size, rnd) for _ in range(4)]
+    stats = {"paragraphs": 0, "list_items": 0, "tables": 0, "figures": 0, "sections": 0}
+
+    doc.add_heading("СИНТЕТИЧЕСКОЕ ПОСОБИЕ", 1)
+    doc.add_heading("ВВЕДЕНИЕ", 2)
+    p = doc.add_paragraph()
+    _fill_paragraph(p, spec, rnd, spec.words_per_paragraph)
+
+    sections_total = max(1, spec.chapters * spec.sections_per_chapter)
+    per_section = max(1, spec.paragraphs // sections_total)
+    n = 0
+    for ch in range(1, spec.chapters + 1):
+        doc.add_heading(f"{ch}. ГЛАВА {ch}", 2)
+        fig_no = 0
+        for sec in range(1, spec.sections_per_chapter + 1):
+            doc.add_heading(f"{ch}.{sec}. Раздел {rnd.choice(WORDS)} {sec}", 3)
+            stats["sections"] += 1
+            for k in range(per_section):
+                n += 1
+                if k and k % max(1, per_section // 3) == 0:
+                    doc.add_heading(f"Подраздел {rnd.choice(WORDS)}", 4)
+                p = doc.add_paragraph()
+                _fill_paragraph(p, spec, rnd, rnd.randint(spec.words_per_paragraph // 2, spec.words_per_paragraph))
+                stats["paragraphs"] += 1
+
+                if spec.list_every and n % spec.list_every == 0:
+                    num_id = BULLET_NUM_ID if rnd.random() < 0.5 else DECIMAL_NUM_ID
+                    for _ in range(spec.list_items):
+                        item = doc.add_paragraph()
+                        _fill_paragraph(item, spec, rnd, 6)
+                        _set_num(item, num_id, rnd.randint(0, max(0, spec.list_depth - 1)))
+                        stats["list_items"] += 1
+
+                if spec.table_every and n % spec.table_every == 0:
+                    _add_table(doc, spec, rnd)
+                    stats["tables"] += 1
+
+                if spec.figure_every and n % spec.figure_every == 0:
+                    fig_no += 1
+                    doc.add_picture(io.BytesIO(images[fig_no % len(images)]), width=Inches(2))
+                    doc.add_paragraph(f"Рис. {ch}.{fig_no}. Схема {rnd.choice(WORDS)}")
+                    stats["figures"] += 1
+
+    doc.add_heading("ЗАКЛЮЧЕНИЕ", 2)
+    p = doc.add_paragraph()
+    _fill_paragraph(p, spec, rnd, spec.words_per_paragraph)
+
+    doc.save(out if not isinstance(out, Path) else str(out))
+    return stats
+
+
+def add_spec_arguments(ap: argparse.ArgumentParser) -> None:
+    for name, default in asdict(SynthSpec()).items():
+        ap.add_argument("--" + name.replace("_", "-"), type=type(default), default=default)
+
+
+def spec_from_args(args: argparse.Namespace) -> SynthSpec:
+    return SynthSpec(**{name: getattr(args, name) for name in asdict(SynthSpec())})
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Generate a synthetic DOCX manual.")
+    ap.add_argument("out", type=Path)
+    add_spec_arguments(ap)
+    args = ap.parse_args()
+
+    stats = generate(spec_from_args(args), args.out)
+    print(f"{args.out}: " + ", ".join(f"{k}={v}" for k, v in stats.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Single build entry point: DOCX -> markdown sections + figure images + src/data/chapters.ts.
+
+Replaces running tools/docx_to_md.py and then tools/extract_docx_images_and_insert.py:
+- the DOCX is opened and parsed once;
+- figure captions ("Рис. X.Y") are recognized during the same block walk that produces
+  markdown (tools/docx_figures.py), and the image link is emitted inline next to the caption
+  (no second pass that re-reads and rewrites the generated markdown);
+- image files are written by a separate stage that consumes figures as the walk finds them,
+  so extraction overlaps with markdown emission; each saved image is then optimized on a
+  thread pool (tools/image_optimize.py) and its dimensions go into the image link.
+
+The work is described as a small stage graph; a stage starts as soon as its dependencies
+have finished, independent stages run concurrently on a thread pool.
+"""
+
+from __future__ import annotations
+
+import argparse
+import queue
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple, TypeVar
+
+from docx_to_md import (
+    DEFAULT_PATHS,
+    DOCX_PATH,
+    Chapter,
+    ConvertCache,
+    DirectorySink,
+    OutputPaths,
+    Pagination,
+    add_pagination_arguments,
+    convert_document,
+    load_manifest,
+    open_document,
+    pagination_from_args,
+)
+from profiling import add_profile_argument, finish_profile, span, start_profile
+from docx_figures import FigureInfo, FigureScanner, FigureTable, scan_stories
+from extract_docx_images_and_insert import (
+    FIGURES_MANIFEST,
+    figure_blob,
+    figure_image_path,
+    md_image_line,
+    report_figures,
+    save_figure_image,
+    save_figure_manifest,
+    web_path,
+)
+from formula_rules import FORMULA_RULES, load_rules
+from glossary_link import GLOSSARY_TS, load_glossary
+from image_optimize import image_size, image_url, optimize_image
+from xref_index import report_xref
+
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class Stage:
+    name: str
+    deps: Tuple[str, ...]
+    run: Callable[[Dict[str, object]], object]  # receives results of finished stages
+
+
+def _run_stage(st: Stage, results: Dict[str, object]) -> object:
+    with span(f"stage:{st.name}"):
+        return st.run(results)
+
+
+def run_stages(stages: List[Stage], max_workers: int = 4) -> Dict[str, object]:
+    """
+    Run stages respecting dependencies. Returns stage name -> result.
+    The first failing stage aborts the build (its exception is re-raised).
+    """
+    by_name = {st.name: st for st in stages}
+    for st in stages:
+        for dep in st.deps:
+            if dep not in by_name:
+                raise ValueError(f"Stage {st.name!r} depends on unknown stage {dep!r}")
+
+    results: Dict[str, object] = {}
+    pending = dict(by_name)
+    running: Dict[Future, str] = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            for name, st in list(pending.items()):
+                if all(dep in results for dep in st.deps):
+                    del pending[name]
+                    running[pool.submit(_run_stage, st, results)] = name
+
+            if not running:
+                raise ValueError(f"Stage graph has a cycle: {sorted(pending)}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                name = running.pop(fut)
+                results[name] = fut.result()
+
+    return results
+
+
+def file_signature(path: Path) -> Optional[Tuple[int, int]]:
+    """
+    (mtime in ns, size) of path, or None if it does not exist.
+    """
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+@dataclass
+class BuildCache:
+    """
+    State a long-running process (tools/watch_content.py) keeps between builds: the
+    converter's numbering/style state (ConvertCache), the glossary and formula rules while
+    their files are unchanged, and the store images already optimized.
+    """
+
+    convert: ConvertCache = field(default_factory=ConvertCache)
+    optimized: Set[Path] = field(default_factory=set)
+    inputs: Dict[Path, Tuple[Optional[Tuple[int, int]], object]] = field(default_factory=dict)
+
+    def load(self, path: Path, loader: Callable[[Path], T]) -> T:
+        """
+        loader(path), reused until the file's mtime or size changes.
+        """
+        sig = file_signature(path)
+        hit = self.inputs.get(path)
+        if hit is None or hit[0] != sig:
+            hit = self.inputs[path] = (sig, loader(path))
+        return hit[1]  # type: ignore[return-value]
+
+
+def build(
+    docx_path: Path = DOCX_PATH,
+    paths: OutputPaths = DEFAULT_PATHS,
+    force: bool = False,
+    stream: bool = False,
+    optimize: bool = True,
+    mdast: bool = False,
+    glossary: Optional[Path] = GLOSSARY_TS,
+    formula_rules: Optional[Path] = None,
+    cache: Optional[BuildCache] = None,
+    pagination: Optional[Pagination] = None,
+) -> Dict[str, object]:
+    # Figures found by the walk, handed over to the image stage; None marks the end.
+    found: "queue.Queue[Optional[Tuple[FigureInfo, Path, bytes]]]" = queue.Queue()
+    tables: List[FigureTable] = []  # the scanner's figure table, set before the end mark
+    sinks: List[DirectorySink] = []  # writes sections during the walk; closed by write_markdown
+
+    def parse(_: Dict[str, object]) -> object:
+        return open_document(docx_path, stream=stream)
+
+    def convert(res: Dict[str, object]) -> List[Chapter]:
+        doc = res["parse"]
+        scanner = FigureScanner()
+
+        def emit(info: FigureInfo) -> Optional[str]:
+            out_path = figure_image_path(doc, info, paths.image_store)
+            if out_path is None:
+                return None
+            blob = figure_blob(doc, info)
+            found.put((info, out_path, blob))
+            url = image_url(web_path(out_path, paths.public_root), image_size(blob), variants=optimize)
+            return md_image_line(info.num, url, info.title)
+
+        def figure_hook(p_elm) -> List[str]:
+            return [line for line in map(emit, scanner.observe(p_elm)) if line]
+
+        try:
+            previous = None if force else load_manifest(paths.manifest)
+            if cache is not None:
+                matcher = cache.load(glossary, load_glossary) if glossary else None
+                rules = cache.load(formula_rules or FORMULA_RULES, load_rules)
+            else:
+                matcher = load_glossary(glossary) if glossary else None
+                rules = load_rules(formula_rules) if formula_rules else None
+            sinks.append(DirectorySink(paths, mdast, cache.convert if cache is not None else None))
+            chapters = convert_document(
+                doc,
+                figure_hook=figure_hook,
+                previous=previous,
+                paths=paths,
+                glossary=matcher,
+                formula_rules=rules,
+                cache=cache.convert if cache is not None else None,
+                pagination=pagination,
+                sink=sinks[0],
+            )
+            # Figures in headers, footers and notes are stored and listed, not put in the text.
+            for info in scan_stories(scanner, doc):
+                emit(info)
+            tables.append(scanner.finish())
+            return chapters
+        finally:
+            found.put(None)
+
+    def images(res: Dict[str, object]) -> Dict[str, Path]:
+        doc = res["parse"]
+        saved: Dict[str, Path] = {}
+        figures: Dict[str, FigureInfo] = {}
+        optimized: Set[Path] = cache.optimized if cache is not None else set()
+        # Each stored image is optimized on the pool while the walk keeps finding figures.
+        # Store files are named by content, so one already there (from an earlier build or
+        # another figure) is not rewritten; optimize_image() skips it if its variants exist,
+        # and a watch process does not even ask for images it optimized before (BuildCache).
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            pending: Dict[Path, Future] = {}
+            while True:
+                item = found.get()
+                if item is None:
+                    break
+                info, out_path, blob = item
+                if save_figure_image(doc, info, out_path, blob):
+                    optimized.discard(out_path)  # (re)written: optimize it again
+                saved[info.num] = out_path
+                figures[info.num] = info
+                if optimize and out_path not in pending and out_path not in optimized:
+                    pending[out_path] = pool.submit(optimize_image, out_path)
+            for out_path, fut in pending.items():
+                fut.result()  # an image Pillow fails on is reported and kept; anything else fails the build
+                optimized.add(out_path)
+        table = tables[0] if tables else None
+        save_figure_manifest(paths.images_dir / FIGURES_MANIFEST, figures, saved, paths.public_root, table)
+        return saved
+
+    def write_markdown(res: Dict[str, object]) -> List[str]:
+        return sinks[0].close(res["convert"])  # type: ignore[arg-type]
+
+    return run_stages(
+        [
+            Stage("parse", (), parse),
+            Stage("convert", ("parse",), convert),
+            Stage("images", ("parse",), images),
+            Stage("write_markdown", ("convert",), write_markdown),
+            Stage("figure_table", ("convert",), lambda _: tables[0]),
+        ]
+    )
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Build markdown content and figure images from the DOCX.")
+    ap.add_argument("--force", action="store_true", help="re-render every section, ignoring the build manifest")
+    ap.add_argument("--stream", action="store_true", help="low-memory streaming reader (tools/docx_stream.py)")
+    ap.add_argument("--no-optimize", action="store_true", help="keep images exactly as embedded (tools/image_optimize.py)")
+    ap.add_argument("--mdast", action="store_true", help="also write each section's parsed tree (tools/mdast.py)")
+    ap.add_argument("--no-glossary", action="store_true", help="do not link glossary terms (tools/glossary_link.py)")
+    ap.add_argument("--formula-rules", type=Path, help="formula rule file (default: tools/formula_rules.json)")
+    add_pagination_arguments(ap)
+    add_profile_argument(ap, Path(".build/profile/build_content.trace.json"))
+    args = ap.parse_args()
+
+    if not DOCX_PATH.exists():
+        raise SystemExit(f"DOCX not found: {DOCX_PATH}")
+
+    start_profile(args.profile)
+    t0 = time.perf_counter()
+    res = build(
+        DOCX_PATH,
+        force=args.force,
+        stream=args.stream,
+        optimize=not args.no_optimize,
+        mdast=args.mdast,
+        glossary=None if args.no_glossary else GLOSSARY_TS,
+        formula_rules=args.formula_rules,
+        pagination=pagination_from_args(args),
+    )
+    chapters: List[Chapter] = res["convert"]  # type: ignore[assignment]
+    written: List[str] = res["write_markdown"]  # type: ignore[assignment]
+    saved: Dict[str, Path] = res["images"]  # type: ignore[assignment]
+
+    sections = [sec for ch in chapters for sec in ch.sections]
+    print(f"Chapters: {len(chapters)}")
+    print(f"Sections: {len(sections)} (re-rendered: {sum(sec.rendered for sec in sections)})")
+    print(f"Split into parts: {sum(bool(sec.breaks) for sec in sections)}")
+    print(f"Markdown files written: {len(written)} (mirrored to src/ and public/)")
+    for rel in written:
+        print(f"  rebuilt: {rel}")
+    print(f"Extracted images: {len(saved)}")
+    report_figures(res["figure_table"], DEFAULT_PATHS.images_dir / FIGURES_MANIFEST)  # type: ignore[arg-type]
+    report_xref(DEFAULT_PATHS.xref)
+    print(f"Done in {time.perf_counter() - t0:.2f}s")
+    finish_profile(args.profile)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Content packs: every section's markdown bundled per chapter and for the whole book.
+
+The reader fetches a section as /content/chapters/<file>.md, one round trip per section.
+Packs let it fetch a chapter once and serve its other sections from memory
+(src/utils/contentPack.ts); the per-section files are still written as before.
+
+Layout (public/content/packs/):
+  <chapter id>.json   {"version", "chapter": {"id", "title"}, "sections": [{"id", "title",
+                       "markdownFile", "markdown", "ast"?}, ...]}  ("ast": mdast, with --mdast);
+                       a section split into parts has "parts": [{"markdownFile",
+                       "markdown", "ast"?}, ...] instead of "markdown"/"ast"
+  book.json           {"version", "chapters": [<same chapter objects with sections>]}
+  index.json          chapter ids in book order
+Each pack also gets precompressed .gz and .br (brotli, if the brotli module is installed)
+siblings for servers that serve precompressed files (nginx gzip_static/brotli_static, etc.).
+A chapter's pack is written as soon as its last section is converted; the book pack is then
+assembled from the chapter packs. Files are only rewritten when their bytes change,
+atomically (tools/output_tree.py); gzip output is deterministic (mtime=0), and an unchanged
+pack is not compressed again.
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+from pathlib import Path
+from typing import List, Optional
+
+from mdast import ast_file_name, encode_ast, markdown_to_mdast
+from output_tree import OutputTree, same_content, write_bytes_if_changed
+from profiling import count, span
+
+try:  # optional: .br variants need brotli
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None  # type: ignore[assignment]
+
+
+PACKS_DIR = Path("public/content/packs")
+PACK_VERSION = 2
+INDEX_FILE = "index.json"
+BOOK_FILE = "book.json"
+
+
+def encode(data: dict) -> bytes:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def write_pack(path: Path, data: dict, tree: Optional[OutputTree] = None) -> List[Path]:
+    """
+    Write path (JSON) and its .gz/.br siblings. Returns the files actually rewritten.
+    """
+    write = tree.write_bytes if tree is not None else write_bytes_if_changed
+    raw = encode(data)
+    gz_path, br_path = path.with_name(path.name + ".gz"), path.with_name(path.name + ".br")
+    siblings = [gz_path, br_path] if brotli is not None else [gz_path]
+    if brotli is None and tree is None:
+        br_path.unlink(missing_ok=True)  # left by a build that had brotli: would be stale
+    # The JSON is written after its siblings, so an unchanged JSON means they are current
+    # and the (slow) compression is skipped.
+    if same_content(path, raw) and all(p.exists() for p in siblings):
+        count("files_skipped", 1 + len(siblings))
+        if tree is not None:
+            for p in (path, *siblings):
+                tree.keep(p)
+        return []
+    variants = {gz_path: gzip.compress(raw, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants[br_path] = brotli.compress(raw, quality=11)
+    variants[path] = raw
+    return [p for p, blob in variants.items() if write(p, blob)]
+
+
+def write_chapter_pack(chapter: dict, packs_dir: Path = PACKS_DIR, tree: Optional[OutputTree] = None) -> List[Path]:
+    """
+    chapter: {"id", "title", "sections"}. Writes <id>.json (and siblings) as soon as the chapter
+    is complete. Returns the files rewritten.
+    """
+    with span("write_packs"):
+        packs_dir.mkdir(parents=True, exist_ok=True)
+        pack = {"version": PACK_VERSION, "chapter": {"id": chapter["id"], "title": chapter["title"]}, "sections": chapter["sections"]}
+        return write_pack(packs_dir / f"{chapter['id']}.json", pack, tree)
+
+
+def write_book_pack(
+    chapter_ids: List[str],
+    packs_dir: Path = PACKS_DIR,
+    tree: Optional[OutputTree] = None,
+    chapters: Optional[List[dict]] = None,
+) -> List[Path]:
+    """
+    Book pack and index for the chapters (in book order) whose packs are written. The book is
+    assembled from the chapter packs on disk unless `chapters` (the same dicts) is given.
+    Returns the files rewritten.
+    """
+    with span("write_packs"):
+        if chapters is None:
+            chapters = []
+            for ch_id in chapter_ids:
+                pack = json.loads((packs_dir / f"{ch_id}.json").read_text(encoding="utf-8"))
+                chapters.append({**pack["chapter"], "sections": pack["sections"]})
+        written = write_pack(packs_dir / BOOK_FILE, {"version": PACK_VERSION, "chapters": chapters}, tree)
+        index = {"version": PACK_VERSION, "chapters": chapter_ids, "book": BOOK_FILE}
+        index_path = packs_dir / INDEX_FILE
+        write = tree.write_bytes if tree is not None else write_bytes_if_changed
+        if write(index_path, json.dumps(index, ensure_ascii=False, indent=2).encode("utf-8") + b"\n"):
+            written.append(index_path)
+        return written
+
+
+def write_packs(chapters: List[dict], packs_dir: Path = PACKS_DIR, tree: Optional[OutputTree] = None) -> List[Path]:
+    """
+    chapters: [{"id", "title", "sections": [{"id", "title", "markdownFile", "markdown" or "parts"}]}]
+    in book order. Writes chapter packs, the book pack and the index; removes packs of
+    chapters that no longer exist (left to `tree` when the build tracks its outputs).
+    Returns the files rewritten.
+    """
+    written: List[Path] = []
+    for ch in chapters:
+        written += write_chapter_pack(ch, packs_dir, tree)
+    written += write_book_pack([ch["id"] for ch in chapters], packs_dir, tree, chapters)
+    if tree is not None:
+        return written
+    keep = {INDEX_FILE, BOOK_FILE, *(f"{ch['id']}.json" for ch in chapters)}
+    for f in packs_dir.iterdir():
+        base = f.name[: -len(f.suffix)] if f.suffix in (".gz", ".br") else f.name
+        if f.is_file() and base not in keep:
+            f.unlink()
+    return written
+
+
+def refresh_packs(packs_dir: Path = PACKS_DIR, content_root: Path = Path("public/content")) -> Optional[List[Path]]:
+    """
+    Re-read every section's markdown from content_root and rewrite the packs, keeping the
+    structure recorded in the existing book pack (used after markdown files were edited in
+    place, e.g. by tools/extract_docx_images_and_insert.py). Sections built with --mdast get
+    their tree re-parsed, in the pack and in content_root/ast/. None if there are no packs yet.
+    """
+    try:
+        book = json.loads((packs_dir / BOOK_FILE).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    chapters: List[dict] = book.get("chapters", [])
+    for ch in chapters:
+        for sec in ch["sections"]:
+            for entry in sec.get("parts", [sec]):
+                md = content_root / entry["markdownFile"]
+                if md.exists():
+                    entry["markdown"] = md.read_text(encoding="utf-8")
+                if "ast" in entry:
+                    entry["ast"] = markdown_to_mdast(entry["markdown"])
+                    ast_path = content_root / "ast" / ast_file_name(entry["markdownFile"])
+                    if ast_path.parent.is_dir():
+                        write_bytes_if_changed(ast_path, encode_ast(entry["ast"]).encode("utf-8"))
+    return write_packs(chapters, packs_dir)
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Local conversion service: upload a DOCX, get the MultiPulti content tree back as a zip.
+
+Authors do not need python-docx: they POST the manual and unpack the answer into the repo.
+
+    python tools/convert_service.py --port 8765 -j 4
+    curl --data-binary @manual.docx "http://127.0.0.1:8765/convert?name=manual" -o content.zip
+
+Endpoints:
+  POST /convert   body: the .docx; query: name=<slug for images/<name>/>, mdast=1
+                  -> application/zip with
+                     content/chapters/*.md          (public/content/chapters/)
+                     content/ast/*.json             (with mdast=1, see tools/mdast.py)
+                     content/xref.json              (figure/table/formula index, tools/xref_index.py)
+                     images/store/<hash>.<ext>      (public/images/store/, as embedded)
+                     images/<name>/figures.json
+                     chapters.ts                    (src/data/chapters.ts)
+                  content/ and images/ go to public/; image links in the markdown already
+                  point at /images/store/.
+  GET /metrics    JSON: queue depth (uploads being received or waiting for a worker),
+                  running conversions, counters, and latency percentiles (ms) of every
+                  stage over the last SAMPLES requests.
+  GET /health     "ok"
+
+Conversions run on a process pool of --workers processes, each with its own DocxConverter
+(tools/docx_converter.py: glossary and formula rules loaded once per worker, everything in
+memory, no temp files). Glossary terms are linked only with --glossary: uploads are other
+people's manuals, not this repo's. At most --workers conversions run at once and at most --queue
+uploads wait for a worker; beyond that the upload is refused with 503 and Retry-After
+without keeping its body (a client that sent "Expect: 100-continue", as curl does for
+large files, does not even send it), so a burst cannot pile up unbounded memory. Uploads
+larger than --max-upload-mb get 413, their body refused or dropped the same way.
+
+Stages timed per request: read (receiving the body), queue (waiting for a worker), convert
+and zip (in the worker), transfer (handing data to and from the worker process), total.
+Standard library only (asyncio streams); HTTP/1.1 with one request per connection.
+Load test: tools/bench/load_service.py.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import io
+import json
+import math
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+from pathlib import Path
+from typing import Deque, Dict, Iterable, Optional, Tuple
+from urllib.parse import parse_qs, quote, urlsplit
+
+from docx_converter import Conversion, DocxConverter
+from docx_to_md import slugify_ru
+from mdast import ast_file_name, encode_ast, markdown_to_mdast
+
+
+DEFAULT_PORT = 8765
+MAX_UPLOAD_MB = 100
+SAMPLES = 1000  # latency samples kept per stage (a sliding window)
+PERCENTILES = (50, 90, 95, 99)
+HEADER_TIMEOUT = 30.0
+STAGES = ("read", "queue", "convert", "zip", "transfer", "total")
+DEFAULT_NAME = "manual"
+STORED_EXTS = {".png", ".jpg", ".jpeg", ".gif", ".webp", ".avif"}  # already compressed
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    411: "Length Required",
+    413: "Payload Too Large",
+    422: "Unprocessable Entity",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+# --- worker side -------------------------------------------------------------------------
+
+_converter: Optional[DocxConverter] = None
+
+
+def _init_worker(glossary: Optional[Path], formula_rules: Optional[Path]) -> None:
+    global _converter
+    _converter = DocxConverter(glossary=glossary, formula_rules=formula_rules, optimize=False)
+
+
+def _ping() -> bool:
+    return True
+
+
+def conversion_zip(result: Conversion, name: str, mdast: bool = False) -> bytes:
+    """
+    The zip returned by POST /convert (layout in the module docstring).
+    """
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for markdown_file, text in result.markdown.items():
+            zf.writestr(f"content/{markdown_file}", text)
+            if mdast:
+                zf.writestr(f"content/ast/{ast_file_name(markdown_file)}", encode_ast(markdown_to_mdast(text)))
+        for img in {img.name: img for img in result.images.values()}.values():
+            ext = Path(img.name).suffix.lower()
+            compress = zipfile.ZIP_STORED if ext in STORED_EXTS else zipfile.ZIP_DEFLATED
+            zf.writestr(f"images/store/{img.name}", img.data, compress_type=compress)
+        figures = json.dumps(result.figures_json(), ensure_ascii=False, indent=2) + "\n"
+        zf.writestr(f"images/{name}/figures.json", figures)
+        zf.writestr("content/xref.json", result.xref_json())
+        zf.writestr("chapters.ts", result.chapters_ts)
+    return buf.getvalue()
+
+
+def convert_upload(data: bytes, name: str, mdast: bool) -> Tuple[bytes, Dict[str, float]]:
+    """
+    Worker entry point: (zip bytes, {"convert": s, "zip": s}).
+    """
+    assert _converter is not None, "worker not initialized"
+    t0 = time.perf_counter()
+    result = _converter.convert(data)
+    t1 = time.perf_counter()
+    blob = conversion_zip(result, name, mdast)
+    return blob, {"convert": t1 - t0, "zip": time.perf_counter() - t1}
+
+
+# --- server side -------------------------------------------------------------------------
+
+
+def percentiles(samples: Iterable[float], points: Tuple[int, ...] = PERCENTILES) -> Dict[str, float]:
+    """
+    Nearest-rank percentiles of samples (seconds), in milliseconds.
+    """
+    values = sorted(samples)
+    out: Dict[str, float] = {"count": len(values)}
+    if not values:
+        return out
+    for p in points:
+        out[f"p{p}"] = round(values[max(0, math.ceil(p / 100 * len(values)) - 1)] * 1000, 2)
+    out["max"] = round(values[-1] * 1000, 2)
+    return out
+
+
+async def discard(reader: asyncio.StreamReader, length: int, chunk: int = 64 * 1024) -> None:
+    while length > 0:
+        data = await reader.read(min(length, chunk))
+        if not data:
+            return
+        length -= len(data)
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str, headers: Optional[Dict[str, str]] = None) -> None:
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+class ConvertService:
+    """
+    The HTTP front end and its bounded worker pool (see the module docstring).
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        queue_limit: int,
+        max_upload: int,
+        glossary: Optional[Path] = None,
+        formula_rules: Optional[Path] = None,
+    ) -> None:
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.max_upload = max_upload
+        self.pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(glossary, formula_rules))
+        self.slots = asyncio.Semaphore(workers)
+        self.queued = 0
+        self.running = 0
+        self.counters: Dict[str, int] = {"completed": 0, "failed": 0, "rejected": 0}
+        self.timings: Dict[str, Deque[float]] = {stage: deque(maxlen=SAMPLES) for stage in STAGES}
+
+    async def warm_up(self) -> None:
+        """
+        Start every worker process (and load its converter) before the first upload.
+        """
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.pool, _ping) for _ in range(self.workers)))
+
+    def close(self) -> None:
+        self.pool.shutdown(cancel_futures=True)
+
+    def metrics(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queue_limit": self.queue_limit,
+            "queue_depth": self.queued,
+            "running": self.running,
+            **self.counters,
+            "stages_ms": {stage: percentiles(samples) for stage, samples in self.timings.items()},
+        }
+
+    async def convert(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        headers: Dict[str, str],
+        name: str,
+        mdast: bool,
+    ) -> bytes:
+        t0 = time.perf_counter()
+        length_s = headers.get("content-length")
+        if length_s is None or not length_s.isdigit():
+            raise HttpError(411, "Content-Length required (send the .docx as the request body)")
+        length = int(length_s)
+        expect_continue = headers.get("expect", "").lower() == "100-continue"
+        # A refused body is not kept: with "Expect: 100-continue" the client has not sent it;
+        # otherwise it is sending it anyway, so drop it, or the client gets a connection reset
+        # instead of the answer.
+        if length > self.max_upload:
+            if not expect_continue:
+                await discard(reader, length)
+            raise HttpError(413, f"Upload larger than {self.max_upload} bytes")
+        if self.queued + self.running >= self.workers + self.queue_limit:
+            self.counters["rejected"] += 1
+            if not expect_continue:
+                await discard(reader, length)
+            raise HttpError(503, "All workers busy and the queue is full; retry later", {"Retry-After": "1"})
+
+        # Queued from the moment its body is accepted until a worker slot is free.
+        self.queued += 1
+        try:
+            if expect_continue:
+                writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+            data = await reader.readexactly(length)
+            t_read = time.perf_counter()
+            await self.slots.acquire()
+        finally:
+            self.queued -= 1
+        self.running += 1
+        try:
+            t_start = time.perf_counter()
+            loop = asyncio.get_running_loop()
+            blob, stages = await loop.run_in_executor(self.pool, convert_upload, data, name, mdast)
+            t_end = time.perf_counter()
+        finally:
+            self.running -= 1
+            self.slots.release()
+
+        self._record("read", t_read - t0)
+        self._record("queue", t_start - t_read)
+        self._record("convert", stages["convert"])
+        self._record("zip", stages["zip"])
+        self._record("transfer", max(0.0, t_end - t_start - stages["convert"] - stages["zip"]))
+        self._record("total", t_end - t0)
+        return blob
+
+    def _record(self, stage: str, seconds: float) -> None:
+        self.timings[stage].append(seconds)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            try:
+                head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), HEADER_TIMEOUT)
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError):
+                return
+            status, ctype, body, extra = await self._dispatch(head, reader, writer)
+            reason = REASONS.get(status, "")
+            lines = [f"HTTP/1.1 {status} {reason}", f"Content-Type: {ctype}", f"Content-Length: {len(body)}", "Connection: close"]
+            lines += [f"{k}: {v}" for k, v in extra.items()]
+            writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass  # client went away
+        finally:
+            writer.close()
+
+    async def _dispatch(
+        self, head: bytes, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> Tuple[int, str, bytes, Dict[str, str]]:
+        text = "text/plain; charset=utf-8"
+        try:
+            request_line, *header_lines = head.decode("utf-8", "replace").rstrip("\r\n").split("\r\n")
+            method, target, _version = request_line.split(" ", 2)
+        except ValueError:
+            return 400, text, b"Malformed request\n", {}
+        headers = {k.strip().lower(): v.strip() for k, _, v in (line.partition(":") for line in header_lines)}
+        url = urlsplit(target)
+        try:
+            if url.path == "/convert":
+                if method != "POST":
+                    raise HttpError(405, "Use POST", {"Allow": "POST"})
+                query = parse_qs(url.query)
+                name = slugify_ru(query.get("name", [DEFAULT_NAME])[0]) or DEFAULT_NAME
+                mdast = query.get("mdast", ["0"])[0] in ("1", "true", "yes")
+                try:
+                    blob = await self.convert(reader, writer, headers, name, mdast)
+                except (HttpError, asyncio.IncompleteReadError):
+                    raise
+                except BrokenExecutor as e:  # a worker died (e.g. killed for memory)
+                    self.counters["failed"] += 1
+                    raise HttpError(500, f"Worker pool failed: {e}")
+                except Exception as e:  # the document could not be converted
+                    self.counters["failed"] += 1
+                    raise HttpError(422, f"Conversion failed: {type(e).__name__}: {e}")
+                self.counters["completed"] += 1
+                return 200, "application/zip", blob, {"Content-Disposition": f"attachment; filename=content.zip; filename*=UTF-8''{quote(name)}-content.zip"}
+            if url.path == "/metrics" and method == "GET":
+                return 200, "application/json", (json.dumps(self.metrics(), indent=2) + "\n").encode("utf-8"), {}
+            if url.path == "/health" and method == "GET":
+                return 200, text, b"ok\n", {}
+            raise HttpError(404, "Not found")
+        except HttpError as e:
+            return e.status, text, f"{e}\n".encode("utf-8"), e.headers
+
+
+async def serve(
+    host: str,
+    port: int,
+    workers: int,
+    queue_limit: int,
+    max_upload: int,
+    glossary: Optional[Path] = None,
+    formula_rules: Optional[Path] = None,
+) -> None:
+    service = ConvertService(workers, queue_limit, max_upload, glossary, formula_rules)
+    try:
+        await service.warm_up()
+        server = await asyncio.start_server(service.handle, host, port)
+        print(f"Serving on http://{host}:{port} ({workers} workers, queue {queue_limit})")
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Local DOCX -> content zip conversion service.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=DEFAULT_PORT)
+    ap.add_argument("-j", "--workers", type=int, default=2, help="conversion processes (default: %(default)s)")
+    ap.add_argument("--queue", type=int, default=8, help="uploads allowed to wait for a worker (default: %(default)s)")
+    ap.add_argument("--max-upload-mb", type=int, default=MAX_UPLOAD_MB, help="largest accepted upload (default: %(default)s)")
+    ap.add_argument("--glossary", type=Path, help="glossary.ts whose terms to link (tools/glossary_link.py; default: none)")
+    ap.add_argument("--formula-rules", type=Path, help="formula rule file (default: tools/formula_rules.json)")
+    args = ap.parse_args()
+    if args.glossary is not None and not args.glossary.is_file():
+        raise SystemExit(f"Glossary not found: {args.glossary}")
+
+    try:
+        asyncio.run(
+            serve(
+                args.host,
+                args.port,
+                max(1, args.workers),
+                max(0, args.queue),
+                args.max_upload_mb * 1024 * 1024,
+                glossary=args.glossary,
+                formula_rules=args.formula_rules,
+            )
+        )
+    except KeyboardInterrupt:
+        print()
+
+
+if __name__ == "__main__":
+    main()
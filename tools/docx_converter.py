@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+In-memory conversion API: a DOCX as bytes (or a file object) in, content objects out.
+
+build_content.py is a command-line build around this repo's paths; a service converting
+uploads would have to save each upload, run the tool in a subprocess and read the files
+back. DocxConverter loads the glossary (if given one: glossary.ts of the site the manual is
+for) and formula rules once and converts any number of documents in the calling process,
+touching the disk only if asked to:
+
+    converter = DocxConverter()
+    result = converter.convert(upload_bytes)
+    result.markdown["chapters/introduction-1.md"]   # section markdown
+    result.chapters_ts                              # src/data/chapters.ts source
+    result.images["1.5"].data                       # figure image bytes
+    result.write()                                  # optional: the usual files on disk
+
+Image links in the markdown point where write() stores the images (paths.image_store,
+served from paths.public_root), so the result can be written as is; with optimize=False
+they do not list WebP/AVIF variants, and the images are kept exactly as embedded. The walk is the same
+as build_content.py's (tools/docx_figures.py for figures), so the markdown is identical.
+
+A converter handles one document at a time; a service uses one converter per worker.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import IO, Dict, List, Optional, Tuple, Union
+
+from docx_figures import FigureInfo, FigureScanner, FigureTable, scan_stories
+from docx_to_md import (
+    DEFAULT_PATHS,
+    Chapter,
+    ConvertCache,
+    DirectorySink,
+    OutputPaths,
+    Pagination,
+    Section,
+    chapters_ts_source,
+    convert_document,
+    open_document,
+    split_parts,
+)
+from extract_docx_images_and_insert import (
+    FIGURES_MANIFEST,
+    figure_blob,
+    figure_image_path,
+    figure_manifest_data,
+    md_image_line,
+    save_figure_manifest,
+    web_path,
+)
+from formula_rules import load_rules
+from glossary_link import load_glossary
+from image_optimize import image_size, image_url, optimize_images
+from output_tree import write_atomic
+from profiling import count, span
+from section_sinks import CallbackSink
+from xref_index import XrefIndexBuilder
+
+
+@dataclass(frozen=True)
+class ConvertedImage:
+    info: FigureInfo
+    name: str  # store file name, "<sha256 prefix>.<ext>"
+    data: bytes
+    size: Optional[Tuple[int, int]]  # (width, height), None if the format is not recognized
+    url: str  # link used in the markdown (web path + size fragment)
+
+
+@dataclass
+class Conversion:
+    """
+    Everything one conversion produces, in memory.
+    """
+
+    chapters: List[Chapter]  # metadata only: the text is in markdown
+    markdown: Dict[str, str]  # markdown_file ("chapters/<slug>.md", parts too) -> text
+    images: Dict[str, ConvertedImage]  # figure number -> image
+    figure_table: FigureTable
+    chapters_ts: str
+    paths: OutputPaths
+    optimize: bool = True  # image links list optimized variants; write() must create them
+    # every section's markdown in book order (two sections may share a markdown file)
+    section_texts: List[str] = field(default_factory=list, repr=False)
+
+    def figures_json(self) -> Dict[str, object]:
+        """
+        Contents of figures.json for this document.
+        """
+        return figure_manifest_data(*self._figure_maps(), self.paths.public_root, self.figure_table)
+
+    def xref_json(self) -> str:
+        """
+        Contents of xref.json (figure, table and formula index, see tools/xref_index.py).
+        """
+        xref = XrefIndexBuilder()
+        texts = iter(self.section_texts)
+        for ch in self.chapters:
+            for sec in ch.sections:
+                xref.add_section(ch.id, sec.id, next(texts), sec.breaks)
+        return xref.encode()
+
+    def _figure_maps(self) -> Tuple[Dict[str, FigureInfo], Dict[str, Path]]:
+        infos = {num: img.info for num, img in self.images.items()}
+        stored = {num: self.paths.image_store / img.name for num, img in self.images.items()}
+        return infos, stored
+
+    def write(self, mdast: bool = False) -> List[str]:
+        """
+        Disk sink: the files build_content.py would write, under self.paths. Returns the
+        markdown files written (unchanged files are not rewritten).
+        """
+        infos, stored = self._figure_maps()
+        with span("write_images"):
+            for out_path, img in {stored[num]: img for num, img in self.images.items()}.items():
+                if out_path.exists():
+                    count("images_reused")
+                    continue
+                write_atomic(out_path, img.data)
+                count("images_saved")
+                count("image_bytes", len(img.data))
+        if self.optimize:
+            optimize_images(set(stored.values()))
+        save_figure_manifest(self.paths.images_dir / FIGURES_MANIFEST, infos, stored, self.paths.public_root, self.figure_table)
+        sink = DirectorySink(self.paths, mdast)
+        texts = iter(self.section_texts)
+        for ch in self.chapters:
+            for sec in ch.sections:
+                sink.add(ch, sec, next(texts))
+        return sink.close(self.chapters)
+
+
+class DocxConverter:
+    """
+    Reusable converter (see the module docstring).
+    """
+
+    def __init__(
+        self,
+        paths: OutputPaths = DEFAULT_PATHS,
+        glossary: Optional[Path] = None,
+        formula_rules: Optional[Path] = None,
+        stream: bool = False,
+        optimize: bool = True,
+        pagination: Optional[Pagination] = None,
+    ) -> None:
+        self.paths = paths
+        self.stream = stream
+        self.optimize = optimize
+        self.pagination = pagination
+        self.glossary = load_glossary(glossary) if glossary else None
+        self.formula_rules = load_rules(formula_rules) if formula_rules else None
+        self.cache = ConvertCache()
+
+    def convert(self, source: Union[bytes, IO[bytes], Path]) -> Conversion:
+        """
+        Convert a DOCX given as bytes, a binary file object or a path.
+        """
+        doc = open_document(source, stream=self.stream)
+        scanner = FigureScanner()
+        images: Dict[str, ConvertedImage] = {}
+
+        def emit(info: FigureInfo) -> Optional[str]:
+            out_path = figure_image_path(doc, info, self.paths.image_store)
+            if out_path is None:
+                return None
+            blob = figure_blob(doc, info)
+            size = image_size(blob)
+            url = image_url(web_path(out_path, self.paths.public_root), size, variants=self.optimize)
+            images[info.num] = ConvertedImage(info, out_path.name, blob, size, url)
+            return md_image_line(info.num, url, info.title)
+
+        def figure_hook(p_elm) -> List[str]:
+            return [line for line in map(emit, scanner.observe(p_elm)) if line]
+
+        markdown: Dict[str, str] = {}
+        texts: List[str] = []
+
+        def keep(chapter: Chapter, sec: Section, text: str) -> None:
+            texts.append(text)
+            markdown[sec.markdown_file] = text
+            markdown.update(split_parts(sec, text))
+
+        chapters = convert_document(
+            doc,
+            figure_hook=figure_hook,
+            paths=self.paths,
+            glossary=self.glossary,
+            formula_rules=self.formula_rules,
+            cache=self.cache,
+            pagination=self.pagination,
+            sink=CallbackSink(keep),
+        )
+        for info in scan_stories(scanner, doc):
+            emit(info)
+        close = getattr(doc, "close", None)  # StreamDocument keeps the zip open
+        if close is not None:
+            close()
+
+        return Conversion(
+            chapters=chapters,
+            markdown=markdown,
+            images=images,
+            figure_table=scanner.finish(),
+            chapters_ts=chapters_ts_source(chapters),
+            paths=self.paths,
+            optimize=self.optimize,
+            section_texts=texts,
+        )
+
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Figure scanner: every image reference in every story of a .docx, paired with its caption.
+
+The old matcher only saw a:blip embeds in body paragraphs and gave each "Рис. X.Y" caption
+the last image seen, so VML pictures were skipped and a caption placed above its picture got
+the previous figure's image. FigureScanner is fed paragraphs in document order (one pass,
+so it works inside the converter's streaming walk) and:
+- finds images in a:blip (pictures, drawing canvases, groups) and v:imagedata (VML), once
+  per picture: mc:Fallback copies of a drawing are skipped;
+- treats the paragraphs of a text box (w:txbxContent) as paragraphs of their own, right after
+  the paragraph that anchors it, so a picture and its caption in text boxes are matched too;
+- records every image reference with its position (story part, paragraph index);
+- matches a caption with an image in the same paragraph, else the nearest unclaimed image
+  above it, else the first image below it within CAPTION_WINDOW text paragraphs. Each
+  figure gets a placement and a confidence, so doubtful ones can be checked by hand.
+scan_figures() also walks headers, footers, footnotes, endnotes and comments (each with its
+own relationships) and returns a FigureTable with the figures, all image references, captions
+without an image and images without a caption.
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml.ns import qn
+from docx.oxml.parser import parse_xml
+
+
+BODY = "word/document.xml"
+STORY_RELTYPES = {RT.HEADER, RT.FOOTER, RT.FOOTNOTES, RT.ENDNOTES, RT.COMMENTS}
+CAPTION_WINDOW = 2  # text paragraphs allowed between a caption and its picture
+
+V_NS = "urn:schemas-microsoft-com:vml"
+MC_NS = "http://schemas.openxmlformats.org/markup-compatibility/2006"
+
+W_P, W_T, W_TXBX = qn("w:p"), qn("w:t"), qn("w:txbxContent")
+A_BLIP, R_EMBED, R_ID = qn("a:blip"), qn("r:embed"), qn("r:id")
+V_IMAGEDATA = f"{{{V_NS}}}imagedata"
+MC_FALLBACK = f"{{{MC_NS}}}Fallback"
+
+CAPTION_RE = re.compile(r"^\s*Рис\.\s*(\d+)\.(\d+)\.?\s*(.*)\s*$", re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class ImageRef:
+    story: str  # part name, e.g. "word/document.xml", "word/footnotes.xml"
+    paragraph: int  # index of the paragraph in the story (text box paragraphs included)
+    rel_id: str  # relationship id in that part
+    kind: str  # "drawing" (a:blip) or "vml" (v:imagedata)
+
+
+@dataclass(frozen=True)
+class FigureInfo:
+    num: str  # e.g. "1.12"
+    title: str  # caption title part (may be empty)
+    rel_id: str  # relationship id like "rId7" (in `story`)
+    story: str = BODY
+    paragraph: int = -1  # caption paragraph
+    placement: str = "same"  # picture is in the caption paragraph, "above" or "below" it
+    confidence: str = "high"  # "high", "medium" (text in between) or "low" (far away)
+    flags: Tuple[str, ...] = ()  # e.g. "several-images": other pictures were passed over
+
+
+@dataclass
+class FigureTable:
+    figures: Dict[str, FigureInfo] = field(default_factory=dict)
+    images: List[ImageRef] = field(default_factory=list)
+    missing: List[Tuple[str, str, int]] = field(default_factory=list)  # (num, story, paragraph)
+    uncaptioned: List[ImageRef] = field(default_factory=list)
+
+
+def block_paragraphs(el) -> Iterator:
+    """
+    w:p elements of a story (or a table) in order; paragraphs inside text boxes are left to
+    paragraph_parts().
+    """
+    for child in el.iterchildren():
+        if child.tag == W_P:
+            yield child
+        else:
+            yield from block_paragraphs(child)
+
+
+def image_rel_ids(el) -> List[str]:
+    return [rid for rid in (e.get(R_EMBED) or e.get(R_ID) for e in el.iter(A_BLIP, V_IMAGEDATA)) if rid]
+
+
+def paragraph_parts(p_elm) -> List[Tuple[str, List[Tuple[str, str]]]]:
+    """
+    (text, [(kind, rel_id)]) of a paragraph, followed by the same for every paragraph in its
+    text boxes. Text box content is not part of the host paragraph's text.
+    """
+    if next(p_elm.iter(W_TXBX, MC_FALLBACK), None) is None:
+        refs = [("vml" if e.tag == V_IMAGEDATA else "drawing", e.get(R_EMBED) or e.get(R_ID)) for e in p_elm.iter(A_BLIP, V_IMAGEDATA)]
+        return [("".join(p_elm.itertext(W_T, with_tail=False)), [r for r in refs if r[1]])]
+
+    text: List[str] = []
+    refs: List[Tuple[str, str]] = []
+    boxes: List = []
+
+    def visit(el) -> None:
+        for child in el.iterchildren():
+            tag = child.tag
+            if tag == MC_FALLBACK:
+                continue
+            if tag == W_TXBX:
+                boxes.append(child)
+                continue
+            if tag == W_T:
+                text.append(child.text or "")
+            elif tag == A_BLIP or tag == V_IMAGEDATA:
+                rid = child.get(R_EMBED) or child.get(R_ID)
+                if rid:
+                    refs.append(("vml" if tag == V_IMAGEDATA else "drawing", rid))
+            visit(child)
+
+    visit(p_elm)
+    out = [("".join(text), refs)]
+    for box in boxes:
+        for inner in block_paragraphs(box):
+            out.extend(paragraph_parts(inner))
+    return out
+
+
+@dataclass
+class _Caption:
+    num: str
+    title: str
+    paragraph: int
+    texts: int  # text paragraphs seen before it (text box paragraphs do not count)
+
+
+class FigureScanner:
+    """
+    Incremental caption matcher: feed paragraphs in document order via observe(), story by
+    story (begin_story()). The first caption of each figure number counts (captions repeated
+    in a list of figures are ignored).
+    """
+
+    def __init__(self, window: int = CAPTION_WINDOW) -> None:
+        self.window = window
+        self.table = FigureTable()
+        self._claimed: Set[ImageRef] = set()
+        self._pending: Optional[_Caption] = None  # caption waiting for a picture below it
+        self.begin_story(BODY)
+
+    def begin_story(self, story: str) -> None:
+        self._expire(force=True)
+        self.story = story
+        self._index = -1
+        self._texts = 0
+        self._unclaimed: List[Tuple[ImageRef, int]] = []  # images since the last caption
+
+    def observe(self, p_elm) -> List[FigureInfo]:
+        """
+        Figures whose image belongs right before this paragraph: captions matched here with a
+        picture above them, and pictures here that a caption above was waiting for.
+        """
+        out: List[FigureInfo] = []
+        for i, (text, refs) in enumerate(paragraph_parts(p_elm)):
+            out.extend(self._paragraph(text, refs, in_text_box=i > 0))
+        return out
+
+    def _paragraph(self, text: str, refs: List[Tuple[str, str]], in_text_box: bool = False) -> List[FigureInfo]:
+        self._index += 1
+        here = [ImageRef(self.story, self._index, rid, kind) for kind, rid in refs]
+        self.table.images.extend(here)
+        out: List[FigureInfo] = []
+
+        self._expire()
+        if here and self._pending is not None:
+            cap, self._pending = self._pending, None
+            gap = self._texts - cap.texts - 1
+            flags = ("several-images",) if len(here) > 1 else ()
+            out.append(self._figure(cap, here.pop(0), "below", gap, flags))
+
+        m = CAPTION_RE.match(text)
+        num = f"{m.group(1)}.{m.group(2)}" if m else None
+        if num is None or num in self.table.figures or (self._pending is not None and self._pending.num == num):
+            self._unclaimed.extend((ref, self._texts) for ref in here)
+        else:
+            cap = _Caption(num, (m.group(3) or "").strip(), self._index, self._texts)
+            if here:
+                flags = ("several-images",) if len(here) > 1 or self._unclaimed else ()
+                out.append(self._figure(cap, here[-1], "same", 0, flags))
+            elif self._unclaimed:
+                ref, seen_at = self._unclaimed[-1]
+                flags = ("several-images",) if len(self._unclaimed) > 1 else ()
+                out.append(self._figure(cap, ref, "above", self._texts - seen_at, flags))
+            else:
+                self._expire(force=True)
+                self._pending = cap
+            self._unclaimed = []
+
+        if text.strip() and not in_text_box:  # labels inside a drawing are not text between
+            self._texts += 1
+        return out
+
+    def _figure(self, cap: _Caption, ref: ImageRef, placement: str, gap: int, flags: Tuple[str, ...]) -> FigureInfo:
+        confidence = "high" if gap == 0 else "medium" if gap <= self.window else "low"
+        info = FigureInfo(cap.num, cap.title, ref.rel_id, self.story, cap.paragraph, placement, confidence, flags)
+        self.table.figures[cap.num] = info
+        self._claimed.add(ref)
+        return info
+
+    def _expire(self, force: bool = False) -> None:
+        cap = self._pending
+        if cap is not None and (force or self._texts - cap.texts - 1 > self.window):
+            self.table.missing.append((cap.num, self.story, cap.paragraph))
+            self._pending = None
+
+    def finish(self) -> FigureTable:
+        self._expire(force=True)
+        # a number listed before its figure (e.g. in a list of figures) is not missing
+        self.table.missing = [m for m in self.table.missing if m[0] not in self.table.figures]
+        self.table.uncaptioned = [ref for ref in self.table.images if ref not in self._claimed]
+        return self.table
+
+
+def story_parts(doc) -> Iterator[Tuple[str, object]]:
+    """
+    (name, part) of the headers, footers, footnotes, endnotes and comments of a document
+    (python-docx Document or docx_stream.StreamDocument).
+    """
+    seen: Set[str] = set()
+    for rel in doc.part.rels.values():
+        if rel.is_external or rel.reltype not in STORY_RELTYPES:
+            continue
+        part = rel.target_part
+        name = str(part.partname).lstrip("/")
+        if name not in seen:
+            seen.add(name)
+            yield name, part
+
+
+def story_rels(doc, story: str):
+    if story == BODY:
+        return doc.part.rels
+    for name, part in story_parts(doc):
+        if name == story:
+            return part.rels
+    return {}
+
+
+def scan_stories(scanner: FigureScanner, doc) -> List[FigureInfo]:
+    """
+    Feed the non-body stories to the scanner; returns the figures found there.
+    """
+    found: List[FigureInfo] = []
+    for name, part in story_parts(doc):
+        element = getattr(part, "element", None)
+        if element is None:
+            element = parse_xml(part.blob)
+        scanner.begin_story(name)
+        for p_elm in block_paragraphs(element):
+            found.extend(scanner.observe(p_elm))
+    return found
+
+
+def scan_figures(doc) -> FigureTable:
+    """
+    One pass over the body and every other story part.
+    """
+    scanner = FigureScanner()
+    for p_elm in block_paragraphs(doc.element.body):
+        scanner.observe(p_elm)
+    scan_stories(scanner, doc)
+    return scanner.finish()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Low-memory DOCX reader for the converter.
+
+python-docx's Document() parses the whole word/document.xml into one lxml tree before
+anything can be converted; on big manuals with many scans that tree is the largest thing in
+memory. StreamDocument instead:
+- reads word/document.xml straight from the zip in chunks with an incremental (pull) parser;
+- yields each top-level paragraph/table as soon as its closing tag arrives and detaches it
+  from the tree, so it is freed once the caller drops it (see docx_to_md.convert_document);
+- reads image bytes from the zip only when they are asked for.
+
+Elements are built with python-docx's element classes and wrapped in the usual Paragraph and
+Table objects, so the heading, list, table and figure logic in docx_to_md.py and
+extract_docx_images_and_insert.py is used unchanged. Only the subset of the Document API
+that those tools use is provided (part.rels, part.numbering_part, styles, get_style, and
+the rels and blob of other parts, for the figure scanner's headers and footnotes).
+
+Small parts (styles.xml, numbering.xml, relationships) are parsed whole.
+"""
+
+from __future__ import annotations
+
+import posixpath
+import threading
+import zipfile
+from pathlib import Path
+from typing import IO, Dict, Iterator, Optional, Tuple, Union
+
+from docx.oxml.ns import qn
+from docx.oxml.parser import element_class_lookup, parse_xml
+from docx.oxml.table import CT_Tbl
+from docx.oxml.text.paragraph import CT_P
+from docx.styles.styles import Styles
+from docx.table import Table
+from docx.text.paragraph import Paragraph
+from lxml import etree
+
+
+DOCUMENT_XML = "word/document.xml"
+RT_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+CHUNK_SIZE = 64 * 1024
+
+EMPTY_NUMBERING = (
+    b'<w:numbering xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"/>'
+)
+EMPTY_STYLES = b'<w:styles xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"/>'
+
+
+class ZipPart:
+    """
+    Image (or other) part; bytes and relationships are read from the zip on first access.
+    """
+
+    def __init__(self, doc: "StreamDocument", name: str) -> None:
+        self._doc = doc
+        self.name = name  # zip member name, e.g. 'word/media/image1.png'
+        self.partname = "/" + name
+        self._rels: Optional[Dict[str, "ZipRel"]] = None
+
+    @property
+    def blob(self) -> bytes:
+        return self._doc.read_member(self.name)
+
+    @property
+    def rels(self) -> Dict[str, "ZipRel"]:
+        # header/footer/footnote parts have their own relationships (their images)
+        if self._rels is None:
+            self._rels = self._doc.part_rels(self.name)
+        return self._rels
+
+
+class ZipRel:
+    def __init__(
+        self, rel_id: str, reltype: str, target_ref: str, is_external: bool, target_part: Optional[ZipPart]
+    ) -> None:
+        self.rId = rel_id
+        self.reltype = reltype
+        self.target_ref = target_ref
+        self.is_external = is_external
+        self._target_part = target_part
+
+    @property
+    def target_part(self) -> ZipPart:
+        if self._target_part is None:
+            raise ValueError("target_part property on Relationship is undefined when target mode is External")
+        return self._target_part
+
+
+class _XmlPartStub:
+    def __init__(self, element) -> None:
+        self.element = element
+
+
+class StreamPart:
+    """
+    Stand-in for python-docx's DocumentPart: parent of the streamed Paragraph/Table objects.
+    """
+
+    def __init__(self, styles: Styles, numbering_el, rels: Dict[str, ZipRel]) -> None:
+        self.styles = styles
+        self.numbering_part = _XmlPartStub(numbering_el)
+        self.rels = rels
+
+    @property
+    def part(self) -> "StreamPart":
+        return self
+
+    def get_style(self, style_id: Optional[str], style_type):
+        return self.styles.get_by_id(style_id, style_type)
+
+
+class StreamDocument:
+    """
+    DOCX opened for streaming conversion. Accepts a path or a binary file-like object.
+    """
+
+    def __init__(self, source: Union[str, Path, IO[bytes]]) -> None:
+        self._zip = zipfile.ZipFile(source if not isinstance(source, Path) else str(source))
+        self._lock = threading.Lock()  # image reads may come from other threads
+
+        names = self._names = set(self._zip.namelist())
+        if DOCUMENT_XML not in names:
+            raise ValueError(f"Not a Word document (no {DOCUMENT_XML})")
+
+        def read_optional(name: str, default: bytes) -> bytes:
+            return self._zip.read(name) if name in names else default
+
+        self.styles = Styles(parse_xml(read_optional("word/styles.xml", EMPTY_STYLES)))
+        numbering_el = parse_xml(read_optional("word/numbering.xml", EMPTY_NUMBERING))
+        self.part = StreamPart(self.styles, numbering_el, self.part_rels(DOCUMENT_XML))
+
+    def part_rels(self, name: str) -> Dict[str, ZipRel]:
+        """
+        Relationships of the part `name` ('word/document.xml', 'word/header1.xml', ...).
+        """
+        base, file_name = posixpath.split(name)
+        rels_name = posixpath.join(base, "_rels", f"{file_name}.rels")
+        rels: Dict[str, ZipRel] = {}
+        if rels_name not in self._names:
+            return rels
+        with self._lock:
+            xml = self._zip.read(rels_name)
+        for rel in etree.fromstring(xml).iter(f"{{{RT_NS}}}Relationship"):
+            rel_id = rel.get("Id")
+            reltype = rel.get("Type") or ""
+            target = rel.get("Target") or ""
+            if not rel_id:
+                continue
+            if rel.get("TargetMode") == "External":
+                rels[rel_id] = ZipRel(rel_id, reltype, target, True, None)
+                continue
+            target_name = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join(base, target))
+            part = ZipPart(self, target_name) if target_name in self._names else None
+            rels[rel_id] = ZipRel(rel_id, reltype, target, part is None, part)
+        return rels
+
+    def read_member(self, name: str) -> bytes:
+        with self._lock:
+            return self._zip.read(name)
+
+    def iter_block_items(self) -> Iterator[Tuple[str, object]]:
+        """
+        Yield ("p", Paragraph) and ("tbl", Table) for body children in document order,
+        parsing document.xml incrementally. Yielded elements are detached from the tree.
+        """
+        body_tag = qn("w:body")
+        parser = etree.XMLPullParser(
+            events=("end",),
+            tag=(qn("w:p"), qn("w:tbl")),
+            remove_blank_text=True,
+            resolve_entities=False,
+        )
+        parser.set_element_class_lookup(element_class_lookup)
+
+        with self._lock:
+            stream = self._zip.open(DOCUMENT_XML)
+        try:
+            while True:
+                with self._lock:
+                    chunk = stream.read(CHUNK_SIZE)
+                if chunk:
+                    parser.feed(chunk)
+                else:
+                    parser.close()
+                for _, elm in parser.read_events():
+                    parent = elm.getparent()
+                    if parent is None or parent.tag != body_tag:
+                        continue  # paragraphs inside tables: handled with their table
+                    # Detach so the tree does not keep it alive after the caller is done with it.
+                    parent.remove(elm)
+                    if isinstance(elm, CT_P):
+                        yield "p", Paragraph(elm, self.part)
+                    elif isinstance(elm, CT_Tbl):
+                        yield "tbl", Table(elm, self.part)
+                if not chunk:
+                    return
+        finally:
+            stream.close()
+
+    def close(self) -> None:
+        self._zip.close()
+
+    def __enter__(self) -> "StreamDocument":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Paragraph style resolution for heading and list detection, built once per document.
+
+python-docx resolves `p.style` through the styles part on every access, and the converter
+asked for it several times per paragraph. StyleResolver reads styles.xml once and keeps, per
+paragraph styleId:
+- the UI name ("Heading 2"; built-in names are translated like python-docx does);
+- the effective outline level: "heading N" / "Заголовок N" by name, else w:outlineLvl,
+  else inherited through the w:basedOn chain (so "My heading" based on "heading 2" is a
+  level-2 heading);
+- the effective numbering (numId, ilvl) from w:numPr, also inherited through w:basedOn, so
+  lists numbered through a paragraph style are detected, not only direct w:numPr.
+Per-paragraph queries then read the paragraph's w:pStyle/w:numPr and answer from a dict.
+
+resolver_for(part) caches one resolver per document part; it works for python-docx
+documents and docx_stream.StreamDocument alike (both expose part.styles.element).
+use_resolver() hands a resolver built earlier to a re-opened document with the same styles.
+"""
+
+from __future__ import annotations
+
+import re
+import weakref
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from docx.oxml.ns import qn
+from docx.styles import BabelFish
+
+
+W_STYLE, W_NAME, W_BASED_ON, W_PPR, W_OUTLINE_LVL = (qn(t) for t in ("w:style", "w:name", "w:basedOn", "w:pPr", "w:outlineLvl"))
+W_NUM_PR, W_NUM_ID, W_ILVL, W_PSTYLE, W_VAL = (qn(t) for t in ("w:numPr", "w:numId", "w:ilvl", "w:pStyle", "w:val"))
+W_TYPE, W_STYLE_ID, W_DEFAULT = qn("w:type"), qn("w:styleId"), qn("w:default")
+
+HEADING_NAME_RE = re.compile(r"^(?:heading|заголовок)\s*([1-9])$", re.IGNORECASE)
+BODY_TEXT_LEVEL = 9  # w:outlineLvl 9 means "body text"
+
+
+@dataclass(frozen=True)
+class StyleInfo:
+    name: str
+    outline_level: Optional[int]  # 1-based heading level
+    num: Optional[Tuple[int, int]]  # (numId, ilvl); numId 0 means "numbering removed"
+
+
+def _val(el, tag: str) -> Optional[str]:
+    child = el.find(tag) if el is not None else None
+    return child.get(W_VAL) if child is not None else None
+
+
+def _int(v: Optional[str]) -> Optional[int]:
+    try:
+        return int(v) if v is not None else None
+    except ValueError:
+        return None
+
+
+class StyleResolver:
+    """
+    styleId -> StyleInfo for paragraph styles, plus per-paragraph lookups.
+    """
+
+    def __init__(self, styles_element) -> None:
+        raw: Dict[str, dict] = {}
+        self.default_style: Optional[str] = None
+        for st in styles_element.iterchildren(W_STYLE):
+            if st.get(W_TYPE) != "paragraph":
+                continue
+            style_id = st.get(W_STYLE_ID)
+            if style_id is None:
+                continue
+            ppr = st.find(W_PPR)
+            num_pr = ppr.find(W_NUM_PR) if ppr is not None else None
+            raw[style_id] = {
+                "name": _val(st, W_NAME) or style_id,
+                "based_on": _val(st, W_BASED_ON),
+                "outline": _int(_val(ppr, W_OUTLINE_LVL)),
+                "num_id": _int(_val(num_pr, W_NUM_ID)),
+                "ilvl": _int(_val(num_pr, W_ILVL)),
+            }
+            if st.get(W_DEFAULT) in ("1", "true", "on"):
+                self.default_style = style_id
+
+        self.styles: Dict[str, StyleInfo] = {}
+        for style_id in raw:
+            self._resolve(style_id, raw, set())
+
+    def _resolve(self, style_id: str, raw: Dict[str, dict], seen: set) -> Optional[StyleInfo]:
+        info = self.styles.get(style_id)
+        if info is not None or style_id not in raw or style_id in seen:
+            return info
+        seen.add(style_id)
+        r = raw[style_id]
+        base = self._resolve(r["based_on"], raw, seen) if r["based_on"] else None
+
+        m = HEADING_NAME_RE.match(r["name"])
+        if m:
+            level: Optional[int] = int(m.group(1))
+        elif r["outline"] is not None:
+            level = r["outline"] + 1 if r["outline"] < BODY_TEXT_LEVEL else None
+        else:
+            level = base.outline_level if base is not None else None
+
+        num = base.num if base is not None else None
+        if r["num_id"] is not None:
+            num = (r["num_id"], r["ilvl"] or 0)
+        elif r["ilvl"] is not None and num is not None:
+            num = (num[0], r["ilvl"])
+
+        info = StyleInfo(name=BabelFish.internal2ui(r["name"]), outline_level=level, num=num)
+        self.styles[style_id] = info
+        return info
+
+    def style_of(self, p_elm) -> Optional[StyleInfo]:
+        ppr = p_elm.find(W_PPR)
+        style_id = _val(ppr, W_PSTYLE) or self.default_style
+        return self.styles.get(style_id) if style_id is not None else None
+
+    def style_name(self, p_elm) -> str:
+        info = self.style_of(p_elm)
+        return info.name if info is not None else ""
+
+    def heading_level(self, p_elm) -> Optional[int]:
+        info = self.style_of(p_elm)
+        return info.outline_level if info is not None else None
+
+    def num_info(self, p_elm) -> Optional[Tuple[int, int]]:
+        """
+        (numId, ilvl) of a list paragraph: direct w:numPr over the style's numbering.
+        """
+        info = self.style_of(p_elm)
+        num = info.num if info is not None else None
+        ppr = p_elm.find(W_PPR)
+        num_pr = ppr.find(W_NUM_PR) if ppr is not None else None
+        if num_pr is not None:
+            num_id = _int(_val(num_pr, W_NUM_ID))
+            ilvl = _int(_val(num_pr, W_ILVL))
+            if num_id is not None:
+                num = (num_id, ilvl or 0)
+            elif ilvl is not None and num is not None:
+                num = (num[0], ilvl)
+        if num is None or num[0] == 0:
+            return None
+        return num
+
+
+_RESOLVERS: "weakref.WeakKeyDictionary[object, StyleResolver]" = weakref.WeakKeyDictionary()
+
+
+def resolver_for(part) -> StyleResolver:
+    """
+    The (cached) resolver of the document that `part` belongs to.
+    """
+    resolver = _RESOLVERS.get(part)
+    if resolver is None:
+        resolver = _RESOLVERS[part] = StyleResolver(part.styles.element)
+    return resolver
+
+
+def use_resolver(part, resolver: StyleResolver) -> None:
+    """
+    Make resolver_for(part) return `resolver` (built from identical styles.xml).
+    """
+    _RESOLVERS[part] = resolver
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Table rendering straight from w:tbl: one walk over w:tr/w:tc, merged cells resolved here.
+
+python-docx's `tbl.rows` / `row.cells` rebuild the cell grid for every row and return a merged
+cell once per grid position it covers, so its text was repeated across the span. Here:
+- w:gridSpan gives a cell's colspan, w:trPr/w:gridBefore|gridAfter skipped grid columns;
+- w:vMerge="restart" opens a vertical merge and a bare w:vMerge continues the cell above
+  (tracked per grid column), which grows that cell's rowspan instead of emitting a new one.
+A table without merged cells is rendered as a GFM table. Otherwise it is rendered as one HTML
+block (<table> with colspan/rowspan, no blank lines, so it stays a single CommonMark HTML
+block); cell markdown is converted to inline HTML by tools/mdast.py, and the app turns
+the block into elements before KaTeX runs (src/utils/markdown.tsx).
+
+Work is linear in the number of cells.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+
+from docx.oxml.ns import qn
+
+from mdast import markdown_to_html_inline
+
+
+W_TR, W_TC, W_TCPR, W_TRPR, W_P = (qn(t) for t in ("w:tr", "w:tc", "w:tcPr", "w:trPr", "w:p"))
+W_GRID_SPAN, W_VMERGE, W_GRID_BEFORE, W_GRID_AFTER, W_VAL = (
+    qn(t) for t in ("w:gridSpan", "w:vMerge", "w:gridBefore", "w:gridAfter", "w:val")
+)
+
+# Markdown of one cell paragraph (w:p element) -> inline markdown ("" if empty).
+ParagraphRenderer = Callable[[object], str]
+
+
+@dataclass
+class Cell:
+    row: int
+    col: int
+    colspan: int = 1
+    rowspan: int = 1
+    paragraphs: List[str] = field(default_factory=list)  # inline markdown per non-empty paragraph
+
+
+@dataclass
+class TableGrid:
+    width: int
+    rows: List[List[Cell]]  # cells that start in each row, left to right
+
+    @property
+    def merged(self) -> bool:
+        return any(c.colspan > 1 or c.rowspan > 1 for row in self.rows for c in row)
+
+
+def _int_val(parent, tag: str, default: int) -> int:
+    el = parent.find(tag) if parent is not None else None
+    if el is None:
+        return default
+    try:
+        return max(0, int(el.get(W_VAL, default)))
+    except ValueError:
+        return default
+
+
+def read_grid(tbl_elm, paragraph_md: ParagraphRenderer) -> TableGrid:
+    """
+    Cells of a w:tbl element with their spans; covered grid positions have no cell.
+    """
+    rows: List[List[Cell]] = []
+    above: List[Optional[Cell]] = []  # per grid column: the cell covering it in the previous row
+    width = 0
+    for r, tr in enumerate(tbl_elm.iterchildren(W_TR)):
+        trpr = tr.find(W_TRPR)
+        col = _int_val(trpr, W_GRID_BEFORE, 0)
+        row: List[Cell] = []
+        current: List[Optional[Cell]] = [None] * col
+        for tc in tr.iterchildren(W_TC):
+            tcpr = tc.find(W_TCPR)
+            span = max(1, _int_val(tcpr, W_GRID_SPAN, 1))
+            vmerge = tcpr.find(W_VMERGE) if tcpr is not None else None
+            origin = above[col] if col < len(above) else None
+            if vmerge is not None and vmerge.get(W_VAL, "continue") == "continue" and origin is not None:
+                if origin.col == col:
+                    origin.rowspan = r - origin.row + 1
+                cell = origin
+            else:
+                cell = Cell(row=r, col=col, colspan=span)
+                for p in tc.iterchildren(W_P):
+                    md = paragraph_md(p)
+                    if md:
+                        cell.paragraphs.append(md)
+                row.append(cell)
+            current.extend([cell] * span)
+            col += span
+        width = max(width, col + _int_val(trpr, W_GRID_AFTER, 0))
+        rows.append(row)
+        above = current
+    return TableGrid(width=width, rows=rows)
+
+
+def trim_empty_rows(grid: TableGrid) -> None:
+    """
+    Drop trailing rows without any text (Word tables often end with one); cells spanning
+    into them are shortened.
+    """
+    n = len(grid.rows)
+    while n > 1 and not any(c.paragraphs for c in grid.rows[n - 1]):
+        n -= 1
+    if n == len(grid.rows):
+        return
+    del grid.rows[n:]
+    for row in grid.rows:
+        for c in row:
+            c.rowspan = min(c.rowspan, n - c.row)
+
+
+def _gfm_cell(cell: Optional[Cell]) -> str:
+    return " ".join(cell.paragraphs) if cell is not None else ""
+
+
+def grid_to_gfm(grid: TableGrid) -> List[str]:
+    out: List[str] = []
+    for i, row in enumerate(grid.rows):
+        cells = [""] * grid.width
+        for c in row:
+            cells[c.col] = _gfm_cell(c)
+        out.append("| " + " | ".join(cells) + " |")
+        if i == 0:
+            out.append("| " + " | ".join(["---"] * grid.width) + " |")
+    return out
+
+
+def grid_to_html(grid: TableGrid) -> List[str]:
+    out: List[str] = ["<table>"]
+    for i, row in enumerate(grid.rows):
+        tag = "th" if i == 0 else "td"
+        parts: List[str] = []
+        for c in row:
+            attrs = (f' colspan="{c.colspan}"' if c.colspan > 1 else "") + (f' rowspan="{c.rowspan}"' if c.rowspan > 1 else "")
+            body = "<br>".join(markdown_to_html_inline(md) for md in c.paragraphs)
+            parts.append(f"<{tag}{attrs}>{body}</{tag}>")
+        out.append("<tr>" + "".join(parts) + "</tr>")
+    out.append("</table>")
+    return out
+
+
+def render_table(tbl_elm, paragraph_md: ParagraphRenderer) -> List[str]:
+    """
+    Markdown lines for a table: GFM if no cell is merged, an HTML block otherwise.
+    """
+    grid = read_grid(tbl_elm, paragraph_md)
+    trim_empty_rows(grid)
+    if not grid.rows or grid.width == 0:
+        return []
+    return grid_to_html(grid) if grid.merged else grid_to_gfm(grid)
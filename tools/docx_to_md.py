@@ -9,37 +9,162 @@ Goals:
 - Preserve Word lists (numbering/bullets) via numbering.xml mapping.
 - Convert tables to GitHub-flavored Markdown tables (remark-gfm is enabled in the app).
 - Keep figure captions like "Рис. 1.17. ..." verbatim so tools/extract_docx_images_and_insert.py
-  can insert the extracted images at correct locations.
+  can insert the extracted images at correct locations (tools/build_content.py does both in one
+  pass via convert_document(figure_hook=...)).
 - Write BOTH:
   - public/content/chapters/*.md (runtime content)
-  - src/content/chapters/*.md (source mirror)
-  and update src/data/chapters.ts accordingly.
-
-This script intentionally wipes stale markdown files in the target dirs that are not generated.
+  - src/content/chapters/*.md (source mirror: hard links to the public files)
+  and update src/data/chapters.ts accordingly, plus per-chapter and whole-book content packs
+  with precompressed variants (public/content/packs/, see tools/content_pack.py).
+- With --part-chars / --part-blocks, split sections longer than a part limit into numbered part
+  files at Heading 4 or paragraph boundaries, never inside a table, list or formula; the
+  parts are listed in chapters.ts so the app loads one part at a time.
+  With --mdast, also the parsed tree of every section (public/content/ast/*.json and an "ast"
+  field in the packs, see tools/mdast.py), so the app renders without parsing markdown.
+- Link the first occurrence of every glossary term (src/data/glossary.ts) in each section to
+  the glossary page (see tools/glossary_link.py; --no-glossary turns it off).
+- Build a full-text search index over all sections, sharded by term prefix
+  (public/content/search/, see tools/search_index.py).
+- Anchor figure captions, table captions and numbered formulas, link references to them
+  ("рис. 2.5", "табл. 1.1", "соотношение (1.2)") and index them all, with the section, part and
+  a figure thumbnail, in public/content/xref.json (see tools/xref_index.py).
+
+Stale generated files (sections, trees, packs, search shards no longer produced) are removed
+using the list of files the previous build generated (.build/outputs.json), and every file is
+written atomically (tools/output_tree.py), so a crash never leaves a half-written tree.
+
+Sections are written as soon as they are converted (SectionSink: the output tree by default,
+a zip archive with --zip, stdout with --stdout, see tools/section_sinks.py); only their
+metadata is kept until chapters.ts, the book pack and the search index are written at the end.
+
+Rebuilds are incremental: a manifest (.build/) stores a hash of each section's source blocks
+(including the images they embed); sections whose hash did not change are not re-rendered and
+files whose content is unchanged are not rewritten. Use --force to re-render everything.
 """
 
 from __future__ import annotations
 
+import abc
+import argparse
+import contextlib
+import hashlib
+import io
+import json
 import re
+import sys
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from typing import IO, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
 
 from docx import Document
+from docx.oxml.ns import qn
 from docx.oxml.table import CT_Tbl
 from docx.oxml.text.paragraph import CT_P
 from docx.table import Table
 from docx.text.paragraph import Paragraph
+from lxml import etree
+
+from content_pack import PACKS_DIR, write_book_pack, write_chapter_pack
+from docx_styles import StyleResolver, resolver_for, use_resolver
+from docx_figures import block_paragraphs, image_rel_ids
+from docx_tables import render_table
+from formula_rules import FormulaMatch, FormulaRules, default_rules, load_rules
+from glossary_link import GlossaryMatcher, load_glossary
+from mdast import AST_DIR, ast_file_name, encode_ast, markdown_to_mdast
+from output_tree import OUTPUTS_MANIFEST, OutputTree, write_text_if_changed
+from profiling import PROFILER, add_profile_argument, count, finish_profile, span, start_profile, timed
+from search_index import SEARCH_DIR, SearchIndexBuilder
+from xref_index import (
+    XREF_DIGEST,
+    XREF_INDEX,
+    XrefIndexBuilder,
+    anchor_line,
+    block_anchor,
+    figure_anchors,
+    image_anchors,
+    link_references,
+    report_xref,
+)
 
 
 DOCX_PATH = Path("public/milovanov-t.docx")
 OUT_PUBLIC_DIR = Path("public/content/chapters")
 OUT_SRC_DIR = Path("src/content/chapters")
 CHAPTERS_TS = Path("src/data/chapters.ts")
+# Per-section source hashes of the last build (see convert_document(previous=...)).
+BUILD_MANIFEST = Path(".build/docx_to_md-manifest.json")
+
+
+@dataclass(frozen=True)
+class OutputPaths:
+    """
+    Where one conversion writes its results. Defaults are this repo's layout;
+    OutputPaths.under(root) gives the same layout below another output root.
+    """
+
+    public_root: Path = Path("public")  # web root: image links are relative to it
+    public_dir: Path = OUT_PUBLIC_DIR
+    src_dir: Path = OUT_SRC_DIR
+    chapters_ts: Path = CHAPTERS_TS
+    packs_dir: Path = PACKS_DIR
+    ast_dir: Path = AST_DIR
+    search_dir: Path = SEARCH_DIR
+    xref: Path = XREF_INDEX
+    images_dir: Path = Path("public/images/milovanov")  # this document's figures.json
+    image_store: Path = Path("public/images/store")  # content-addressed images, shared
+    manifest: Path = BUILD_MANIFEST
+    outputs: Path = OUTPUTS_MANIFEST  # every generated file of the last build (tools/output_tree.py)
+
+    @classmethod
+    def under(cls, root: Path, images_name: str = "milovanov") -> "OutputPaths":
+        return cls(
+            public_root=root / "public",
+            public_dir=root / OUT_PUBLIC_DIR,
+            src_dir=root / OUT_SRC_DIR,
+            chapters_ts=root / CHAPTERS_TS,
+            packs_dir=root / PACKS_DIR,
+            ast_dir=root / AST_DIR,
+            search_dir=root / SEARCH_DIR,
+            xref=root / XREF_INDEX,
+            images_dir=root / "public" / "images" / images_name,
+            image_store=root / "public" / "images" / "store",
+            manifest=root / BUILD_MANIFEST,
+            outputs=root / OUTPUTS_MANIFEST,
+        )
+
+
+DEFAULT_PATHS = OutputPaths()
+
+
+@dataclass(frozen=True)
+class Pagination:
+    """
+    Part limits: a section whose markdown is longer than max_chars characters or has more than
+    max_blocks blocks is split into parts of about equal size (0 turns a limit off). Builds
+    split only when given limits (pagination=None by default); Pagination() is a sensible pair.
+    """
+
+    max_chars: int = 4000
+    max_blocks: int = 30
+
+    @property
+    def digest(self) -> str:
+        return f"parts:{self.max_chars}:{self.max_blocks}"
 
 
 HEADING_RE = re.compile(r"^\s*(\d+)\.\s*(.+?)\s*$")
 TOC_TITLE_RE = re.compile(r"^\s*СОДЕРЖАНИЕ\s*$", re.IGNORECASE)
+MULTI_SPACE_RE = re.compile(r"[ \u00A0]{2,}")
+RUN_EDGES_RE = re.compile(r"^(\s*)(.*?)(\s*)$", re.DOTALL)  # lead / core / tail of a run
+WORD_CHAR_RE = re.compile(r"[0-9A-Za-zА-Яа-яЁё]")
+BOLD_LINE_RE = re.compile(r"^\*\*[^*]+\*\*$")  # a paragraph set in bold: a run-in heading or caption
+LIST_ITEM_RE = re.compile(r"^\s*(?:[-*+]|\d+[.)])\s")
+
+W_R, W_RPR, W_T, W_TAB, W_PTAB, W_BR, W_CR = (qn(t) for t in ("w:r", "w:rPr", "w:t", "w:tab", "w:ptab", "w:br", "w:cr"))
+W_NO_BREAK_HYPHEN, W_B, W_I, W_HIGHLIGHT, W_VAL = (
+    qn(t) for t in ("w:noBreakHyphen", "w:b", "w:i", "w:highlight", "w:val")
+)
+W_HYPERLINK = qn("w:hyperlink")
 
 
 def slugify_ru(text: str) -> str:
@@ -56,7 +181,7 @@ def slugify_ru(text: str) -> str:
 def norm_spaces(s: str) -> str:
     # Keep readability, but don't smash meaningful spacing in formulas too aggressively.
     s = s.replace("\t", " ")
-    s = re.sub(r"[ \u00A0]{2,}", " ", s)
+    s = MULTI_SPACE_RE.sub(" ", s)
     return s
 
 
@@ -69,20 +194,10 @@ def escape_md_text(s: str) -> str:
 
 def get_paragraph_num_info(p: Paragraph) -> Optional[Tuple[int, int]]:
     """
-    Returns (numId, ilvl) if paragraph is part of a Word numbered/bulleted list.
+    Returns (numId, ilvl) if paragraph is part of a Word numbered/bulleted list,
+    numbered directly or through its paragraph style (see tools/docx_styles.py).
     """
-    ppr = p._p.pPr
-    if ppr is None or ppr.numPr is None:
-        return None
-    num_id = None
-    ilvl = 0
-    if ppr.numPr.numId is not None and ppr.numPr.numId.val is not None:
-        num_id = int(ppr.numPr.numId.val)
-    if ppr.numPr.ilvl is not None and ppr.numPr.ilvl.val is not None:
-        ilvl = int(ppr.numPr.ilvl.val)
-    if num_id is None:
-        return None
-    return num_id, ilvl
+    return resolver_for(p.part).num_info(p._p)
 
 
 def build_numbering_map(doc: Document) -> Dict[int, Dict[int, str]]:
@@ -151,7 +266,11 @@ def build_numbering_map(doc: Document) -> Dict[int, Dict[int, str]]:
 def iter_block_items(doc: Document) -> Iterator[Tuple[str, object]]:
     """
     Yield ("p", Paragraph) and ("tbl", Table) in document order.
+    Documents opened with docx_stream.StreamDocument provide their own streaming iterator.
     """
+    if hasattr(doc, "iter_block_items"):
+        yield from doc.iter_block_items()  # type: ignore[attr-defined]
+        return
     parent = doc.element.body
     for child in parent.iterchildren():
         if isinstance(child, CT_P):
@@ -160,142 +279,165 @@ def iter_block_items(doc: Document) -> Iterator[Tuple[str, object]]:
             yield "tbl", Table(child, doc)
 
 
+@timed("style_name")
 def style_name(p: Paragraph) -> str:
-    return p.style.name if p.style is not None else ""
+    return resolver_for(p.part).style_name(p._p)
+
+
+@timed("heading_level")
+def heading_level(p: Paragraph) -> Optional[int]:
+    """
+    Effective outline level of the paragraph's style ("Heading N" / "Заголовок N", w:outlineLvl,
+    inherited through w:basedOn), or None for body text.
+    """
+    return resolver_for(p.part).heading_level(p._p)
 
 
 def is_heading(p: Paragraph, level: int) -> bool:
-    sn = style_name(p)
-    return sn == f"Heading {level}" or sn == f"Заголовок {level}"
+    return heading_level(p) == level
 
 
 def text_of(p: Paragraph) -> str:
-    return norm_spaces((p.text or "").strip())
+    return norm_spaces(paragraph_text(p._p).strip())
 
 
-def normalize_formula_line(s: str) -> Optional[Tuple[str, str, List[str], Optional[str]]]:
+@timed("normalize_formula_line")
+def normalize_formula_line(s: str, rules: Optional[FormulaRules] = None) -> Optional[FormulaMatch]:
     """
-    Recognize a few key formulas from the пособие and return:
+    Recognize a formula paragraph from the rule set (tools/formula_rules.json by default) and
+    return:
       (latex_block, caption, where_lines, purpose)
     to output in a nicer KaTeX-friendly way.
 
     Returns None if not a known formula line.
     """
-    raw = norm_spaces(s)
-
-    # 3) Approximate program length (Halstead)
-    if re.search(r"^N\s*[≈~]\s*n1\s*log2\s*\(n1\)\s*\+\s*n2\s*log2\s*\(n2\)\s*,?\s*$", raw, re.IGNORECASE):
-        latex = r"$$N \approx n_1 \cdot \log_2(n_1) + n_2 \cdot \log_2(n_2)$$"
-        caption = "**Формула 3. Оценка длины программы (приближённая)**"
-        where = [
-            "- $n_1$ - число различных операторов",
-            "- $n_2$ - число различных операндов",
-        ]
-        purpose = "**Назначение:** приближённая оценка длины программного модуля."
-        return latex, caption, where, purpose
-
-    # 1) Halstead volume
-    if re.search(r"^V\s*=\s*N\s*[×x*]\s*log2\s*\(\s*n1\s*\+\s*n2\s*\)\s*\.?,?\s*$", raw, re.IGNORECASE):
-        latex = r"$$V = N \cdot \log_2 (n_1 + n_2)$$"
-        caption = "**Формула 1. Объём программы по Холстеду**"
-        return latex, caption, [], None
-
-    # 2) McCabe cyclomatic complexity
-    if re.search(r"^V\\(G\\)\s*=\s*E\s*[–-]\s*N\s*\\+\s*2\s*,?\s*$", raw, re.IGNORECASE) or re.search(
-        r"^V\(G\)\s*=\s*E\s*[–-]\s*N\s*\+\s*2\s*,?\s*$", raw, re.IGNORECASE
-    ):
-        latex = r"$$V(G) = E - N + 2$$"
-        caption = "**Формула 2. Цикломатическая сложность Мак-Кейба**"
-        where = [
-            "- $E$ - количество дуг (рёбер) в управляющем графе",
-            "- $N$ - количество вершин",
-        ]
-        purpose = "**Назначение:** оценка логической сложности алгоритма и числа независимых путей выполнения."
-        return latex, caption, where, purpose
-
-    return None
+    return (rules or default_rules()).match(norm_spaces(s))
 
 
-def runs_to_md(p: Paragraph) -> str:
+def _on_off(el) -> bool:
+    # <w:b/> is on; <w:b w:val="0|false|off"/> is off
+    if el is None:
+        return False
+    return el.get(W_VAL) not in ("0", "false", "off")
+
+
+def run_text(r) -> str:
     """
-    Convert paragraph runs to Markdown inline text, preserving bold/italic.
+    Text of a w:r element, like python-docx Run.text (tabs -> \\t, line breaks -> \\n),
+    without building Run/proxy objects.
+    """
+    parts: List[str] = []
+    for child in r.iterchildren():
+        tag = child.tag
+        if tag == W_T:
+            parts.append(child.text or "")
+        elif tag == W_TAB or tag == W_PTAB:
+            parts.append("\t")
+        elif tag == W_CR:
+            parts.append("\n")
+        elif tag == W_BR:
+            if child.get(qn("w:type")) in (None, "textWrapping"):
+                parts.append("\n")
+        elif tag == W_NO_BREAK_HYPHEN:
+            parts.append("-")
+    return "".join(parts)
+
+
+def paragraph_text(p_elm) -> str:
+    """
+    Text of a w:p element, like python-docx Paragraph.text (its runs and hyperlink runs),
+    without an XPath query per paragraph and per run.
     """
     parts: List[str] = []
+    for child in p_elm.iterchildren(W_R, W_HYPERLINK):
+        if child.tag == W_R:
+            parts.append(run_text(child))
+        else:
+            parts.extend(run_text(r) for r in child.iterchildren(W_R))
+    return "".join(parts)
 
-    def append_text(txt: str) -> None:
-        if not txt:
-            return
-        parts.append(txt)
 
-    for run in p.runs:
-        t = run.text or ""
+def run_format(r) -> Tuple[bool, bool]:
+    """
+    Effective (bold, italic) of a w:r element as rendered in markdown (direct formatting).
+    """
+    rpr = r.find(W_RPR)
+    if rpr is None:
+        return False, False
+    # Highlight is a common "important" emphasis in методичках; approximate as bold.
+    bold = _on_off(rpr.find(W_B)) or rpr.find(W_HIGHLIGHT) is not None
+    return bold, _on_off(rpr.find(W_I))
+
+
+def coalesce_runs(p: Paragraph) -> List[Tuple[Tuple[bool, bool], str]]:
+    """
+    Merge consecutive runs with the same effective formatting: Word splits text into many
+    tiny runs (spell-check, revision marks), which would otherwise each get their own
+    emphasis markers ("**foo****bar**"). Whitespace-only runs join the preceding group,
+    since emphasis on spaces is invisible anyway.
+    """
+    groups: List[Tuple[Tuple[bool, bool], List[str]]] = []
+    for r in p._p.iterchildren(W_R):
+        t = run_text(r)
         if not t:
             continue
+        if groups and t.isspace():
+            groups[-1][1].append(t)
+            continue
+        fmt = run_format(r)
+        if groups and groups[-1][0] == fmt:
+            groups[-1][1].append(t)
+        else:
+            groups.append((fmt, [t]))
+    return [(fmt, "".join(texts)) for fmt, texts in groups]
+
+
+@timed("runs_to_md")
+def runs_to_md(p: Paragraph) -> str:
+    """
+    Convert paragraph runs to Markdown inline text, preserving bold/italic.
+    """
+    if PROFILER.enabled:
+        count("runs", len(p._p.findall(W_R)))
+    parts: List[str] = []
+
+    for (bold, italic), t in coalesce_runs(p):
         t = t.replace("\r", "").replace("\n", " ")
         # Keep leading/trailing spaces outside emphasis markers to avoid output like "*V *"
-        m = re.match(r"^(\s*)(.*?)(\s*)$", t, flags=re.DOTALL)
+        m = RUN_EDGES_RE.match(t)
         lead, core, tail = (m.group(1), m.group(2), m.group(3)) if m else ("", t, "")
-        lead = norm_spaces(lead)
         core = escape_md_text(norm_spaces(core))
-        tail = norm_spaces(tail)
-
-        bold = bool(run.bold)
-        italic = bool(run.italic)
-        # Highlight is a common "important" emphasis in методичках; approximate as bold.
-        if getattr(run.font, "highlight_color", None) is not None:
-            bold = True
 
         # Don't wrap pure punctuation in emphasis - it produces noisy output like "*.*"
-        has_word = bool(re.search(r"[0-9A-Za-zА-Яа-яЁё]", core))
-        styled = core
-        if has_word:
+        if (bold or italic) and WORD_CHAR_RE.search(core):
             if bold and italic:
-                styled = f"***{core}***"
+                core = f"***{core}***"
             elif bold:
-                styled = f"**{core}**"
-            elif italic:
-                styled = f"*{core}*"
+                core = f"**{core}**"
+            else:
+                core = f"*{core}*"
 
-        append_text(f"{lead}{styled}{tail}")
+        if lead:
+            parts.append(norm_spaces(lead))
+        parts.append(core)
+        if tail:
+            parts.append(norm_spaces(tail))
 
     return "".join(parts).strip()
 
 
+@timed("table_to_md")
 def table_to_md(tbl: Table) -> List[str]:
-    rows = tbl.rows
-    if not rows:
-        return []
-
-    def cell_text(cell) -> str:
-        texts = []
-        for p in cell.paragraphs:
-            txt = runs_to_md(p)
-            if txt:
-                texts.append(txt)
-        return escape_md_text(norm_spaces(" ".join(texts)))
-
-    matrix: List[List[str]] = []
-    for r in rows:
-        matrix.append([cell_text(c) for c in r.cells])
-
-    # normalize width
-    width = max(len(r) for r in matrix) if matrix else 0
-    for r in matrix:
-        while len(r) < width:
-            r.append("")
-
-    if width == 0:
-        return []
+    # runs_to_md() output is already normalized and escaped; cells are not re-escaped.
+    return render_table(tbl._tbl, lambda p_elm: runs_to_md(Paragraph(p_elm, tbl)))
 
-    header = matrix[0]
-    body = matrix[1:] if len(matrix) > 1 else []
 
-    out: List[str] = []
-    out.append("| " + " | ".join(header) + " |")
-    out.append("| " + " | ".join(["---"] * width) + " |")
-    for r in body:
-        out.append("| " + " | ".join(r) + " |")
-    return out
+@dataclass
+class Block:
+    kind: str  # "p" or "tbl"
+    obj: object  # Paragraph or Table
+    text: str = ""  # normalized paragraph text ("" for tables)
+    images: List[str] = field(default_factory=list)  # image lines to emit before the block
 
 
 @dataclass
@@ -304,6 +446,10 @@ class Section:
     title: str
     markdown_file: str
     lines: List[str] = field(default_factory=list)
+    blocks: List[Block] = field(default_factory=list, repr=False)
+    digest: str = ""
+    rendered: bool = False  # False when lines were not regenerated (unchanged since last build)
+    breaks: List[int] = field(default_factory=list)  # offsets in the markdown where parts 2.. start
 
 
 @dataclass
@@ -313,7 +459,95 @@ class Chapter:
     sections: List[Section] = field(default_factory=list)
 
 
-def write_ts(chapters: List[Chapter]) -> None:
+def section_markdown(sec: Section) -> str:
+    return "\n".join(sec.lines).rstrip() + "\n"
+
+
+def part_file(markdown_file: str, number: int) -> str:
+    """
+    "chapters/<slug>.md" -> "chapters/<slug>.part-<number>.md" (number counts from 1).
+    """
+    return f"{markdown_file[: -len('.md')]}.part-{number}.md"
+
+
+def section_parts(sec: Section) -> List[str]:
+    """
+    Markdown files of a split section's parts, in order; [] when it is not split.
+    """
+    return [part_file(sec.markdown_file, n) for n in range(1, len(sec.breaks) + 2)] if sec.breaks else []
+
+
+def split_parts(sec: Section, markdown: str) -> List[Tuple[str, str]]:
+    """
+    (markdown file, text) of each part of a split section, cut from its full markdown.
+    """
+    bounds = [0, *sec.breaks, len(markdown)]
+    return [
+        (name, markdown[start:end].rstrip() + "\n")
+        for name, start, end in zip(section_parts(sec), bounds, bounds[1:])
+    ]
+
+
+def splits_list(markdown: str, offset: int) -> bool:
+    """
+    True if a part starting at `offset` (a line start) would cut a markdown list in two: the
+    text before it ends in a list (items and lines glued to them) and the part would go on
+    with it (an item, an indented line, or a line glued to the list). A heading ends a list.
+    """
+    rest = markdown[offset:].split("\n", 1)[0]
+    if rest.startswith("#"):
+        return False
+    before = markdown[:offset].split("\n")[:-1]
+    end = len(before)
+    while end and not before[end - 1].strip():
+        end -= 1
+    start = end
+    while start and before[start - 1].strip():
+        start -= 1
+    if not any(LIST_ITEM_RE.match(line) for line in before[start:end]):
+        return False
+    glued = end == len(before)
+    return glued or bool(LIST_ITEM_RE.match(rest)) or rest.startswith(" ")
+
+
+def paginate(units: List[Tuple[int, bool, bool]], total: int, limits: Pagination) -> List[int]:
+    """
+    Offsets where parts 2.. of a section start. units: (offset, breakable, heading) of every
+    rendered block; a part may only start at a breakable block, and preferably at a heading.
+    total: length of the markdown. The section is split only if it exceeds a limit, into
+    parts close to an equal share of it.
+    """
+    blocks = len(units)
+    over = [
+        -(-size // limit)  # parts needed for this limit (ceil)
+        for size, limit in ((total, limits.max_chars), (blocks, limits.max_blocks))
+        if limit > 0
+    ]
+    count_parts = max(over, default=1)
+    if count_parts <= 1:
+        return []
+    share_chars, share_blocks = total / count_parts, blocks / count_parts
+
+    breaks: List[int] = []
+    start, start_block = 0, 0
+    for i, (offset, breakable, heading) in enumerate(units):
+        if not breakable or offset <= start:
+            continue
+        fill = max((offset - start) / share_chars, (i - start_block) / share_blocks if share_blocks else 0)
+        if fill >= 1 or (heading and fill >= 0.5):
+            breaks.append(offset)
+            start, start_block = offset, i
+    # A short tail is merged back into the previous part.
+    if breaks and max((total - start) / share_chars, (blocks - start_block) / share_blocks if share_blocks else 0) < 0.25:
+        breaks.pop()
+    return breaks
+
+
+def chapters_ts_source(chapters: List[Chapter]) -> str:
+    """
+    Contents of src/data/chapters.ts for these chapters.
+    """
+
     def q(s: str) -> str:
         return s.replace("\\", "\\\\").replace("'", "\\'")
 
@@ -331,33 +565,53 @@ def write_ts(chapters: List[Chapter]) -> None:
             lines.append(f"        id: '{q(sec.id)}',")
             lines.append(f"        title: '{q(sec.title)}',")
             lines.append(f"        markdownFile: '{q(sec.markdown_file)}',")
+            parts = section_parts(sec)
+            if parts:
+                quoted = ", ".join(f"'{q(name)}'" for name in parts)
+                lines.append(f"        parts: [{quoted}],")
             lines.append("      },")
         lines.append("    ],")
         lines.append("  },")
     lines.append("];")
     lines.append("")
-    CHAPTERS_TS.write_text("\n".join(lines), encoding="utf-8")
+    return "\n".join(lines)
 
 
-def main() -> None:
-    if not DOCX_PATH.exists():
-        raise SystemExit(f"DOCX not found: {DOCX_PATH}")
+def write_ts(chapters: List[Chapter], chapters_ts: Path = CHAPTERS_TS, tree: Optional[OutputTree] = None) -> None:
+    write = tree.write_text if tree is not None else write_text_if_changed
+    write(chapters_ts, chapters_ts_source(chapters))
 
-    doc = Document(str(DOCX_PATH))
-    numbering_map = build_numbering_map(doc)
 
-    chapters: List[Chapter] = []
+# Called for every paragraph element met during the walk (including paragraphs inside
+# tables); returns the markdown image lines to emit right before that paragraph.
+FigureHook = Callable[[CT_P], List[str]]
+
+
+def iter_sections(
+    doc: Document, chapters: List[Chapter], figure_hook: Optional[FigureHook] = None
+) -> Iterator[Section]:
+    """
+    Walk the document body once and split it into chapters/sections (Heading 2 / Heading 3).
+    Chapters are appended to `chapters` as they start; each section is yielded as soon as it
+    is complete, holding its source blocks (markdown is produced by render_section()).
+    Only one section's blocks are alive at a time if the caller drops them after use.
+
+    When figure_hook is given, it sees every paragraph (so it can track images and captions)
+    and the image links it returns are attached to that paragraph's block (the caption, or
+    the picture itself when its caption is above it).
+    """
+    done: List[Section] = []  # sections closed by the current block, not yet yielded
     current_ch: Optional[Chapter] = None
     current_sec: Optional[Section] = None
     in_toc = False
     started_main = False
-    skip_where_once = False
+    section_ids: Set[str] = set()  # ids (and file names) in use: two sections may share a title
 
     # Helpers
     def start_chapter(title: str, explicit_id: Optional[str] = None) -> Chapter:
         nonlocal current_ch, current_sec
         if current_sec is not None:
-            finalize_section()
+            done.append(current_sec)
         current_sec = None
 
         ch_id = explicit_id or slugify_ru(title)
@@ -372,55 +626,60 @@ def main() -> None:
             start_chapter("Материалы", explicit_id="materials")
 
         if current_sec is not None:
-            finalize_section()
+            done.append(current_sec)
 
         if special_prefix:
             sec_id = f"{special_prefix}-1"
-            file_name = f"{special_prefix}-1.md"
         else:
             slug = slugify_ru(title)
-            if chapter_num is None:
-                sec_id = slug
-                file_name = f"{slug}.md"
-            else:
-                sec_id = f"chapter-{chapter_num}-{slug}"
-                file_name = f"chapter-{chapter_num}-{slug}.md"
-
-        md_file = f"chapters/{file_name}"
-        current_sec = Section(id=sec_id, title=title, markdown_file=md_file, lines=[f"# {title}", ""])
+            sec_id = slug if chapter_num is None else f"chapter-{chapter_num}-{slug}"
+        # A repeated title ("Агрегация" of objects and of classes) gets a numeric suffix, so
+        # every section has its own route, file and manifest entry.
+        base_id, n = sec_id, 1
+        while sec_id in section_ids:
+            n += 1
+            sec_id = f"{base_id}-{n}"
+        section_ids.add(sec_id)
+
+        md_file = f"chapters/{sec_id}.md"
+        current_sec = Section(id=sec_id, title=title, markdown_file=md_file)
         current_ch.sections.append(current_sec)
         return current_sec
 
-    def finalize_section() -> None:
-        nonlocal current_sec
-        if current_sec is None:
-            return
-        # trim trailing blanks
-        while current_sec.lines and current_sec.lines[-1] == "":
-            current_sec.lines.pop()
-        current_sec.lines.append("")  # newline at EOF
-        current_sec = None
+    def ensure_section() -> Section:
+        # If we haven't started a section yet, create a generic one under current chapter.
+        if current_sec is not None:
+            return current_sec
+        if current_ch is None:
+            start_chapter("Материалы", explicit_id="materials")
+        return start_section(current_ch.title, chapter_num=chapter_num)
 
     # Track chapter number for numbered chapters (1..N)
     chapter_num: Optional[int] = None
     last_numbered: int = 0
 
     for kind, obj in iter_block_items(doc):
+        while done:
+            yield done.pop(0)
+
         if kind == "p":
+            count("paragraphs")
             p: Paragraph = obj  # type: ignore[assignment]
+            image_lines = figure_hook(p._p) if figure_hook is not None else []
             txt = text_of(p)
             if not txt:
                 # preserve paragraph spacing inside a section
-                if current_sec is not None and current_sec.lines and current_sec.lines[-1] != "":
-                    current_sec.lines.append("")
+                if current_sec is not None:
+                    current_sec.blocks.append(Block("p", p, "", image_lines))
                 continue
 
+            level = heading_level(p)
             # Heading 1 is usually book title — ignore.
-            if is_heading(p, 1):
+            if level == 1:
                 continue
 
             # Heading 2: top-level parts
-            if is_heading(p, 2):
+            if level == 2:
                 started_main = True
                 if TOC_TITLE_RE.match(txt):
                     in_toc = True
@@ -458,7 +717,7 @@ def main() -> None:
                 continue
 
             # Heading 3: section start (one md per Heading 3)
-            if is_heading(p, 3):
+            if level == 3:
                 if in_toc:
                     continue
                 if chapter_num is None:
@@ -476,123 +735,644 @@ def main() -> None:
             if not started_main:
                 continue
 
-            if current_sec is None:
-                # If we haven't started a section yet, create a generic one under current chapter.
-                if current_ch is None:
-                    start_chapter("Материалы", explicit_id="materials")
-                start_section(current_ch.title, chapter_num=chapter_num)
+            ensure_section().blocks.append(Block("p", p, txt, image_lines))
 
-            # Heading 4+ inside a section
-            if is_heading(p, 4):
-                current_sec.lines.append(f"## {txt}")
-                current_sec.lines.append("")
-                continue
-            if is_heading(p, 5):
-                current_sec.lines.append(f"### {txt}")
-                current_sec.lines.append("")
+        elif kind == "tbl":
+            count("tables")
+            tbl: Table = obj  # type: ignore[assignment]
+            # Images/captions placed inside layout tables go before the table itself.
+            table_images: List[str] = []
+            if figure_hook is not None:
+                for p_elm in block_paragraphs(tbl._tbl):
+                    table_images.extend(figure_hook(p_elm))
+            if in_toc:
                 continue
-            if is_heading(p, 6):
-                current_sec.lines.append(f"#### {txt}")
-                current_sec.lines.append("")
+            # Ignore any front-matter before the first real Heading 2 (title pages, etc.)
+            if not started_main:
                 continue
+            ensure_section().blocks.append(Block("tbl", tbl, "", table_images))
 
-            # Regular paragraph: try formula normalization first
-            formula = normalize_formula_line(txt)
-            if formula:
-                latex, caption, where, purpose = formula
-                current_sec.lines.append(latex)
-                current_sec.lines.append("")
-                current_sec.lines.append(caption)
-                current_sec.lines.append("")
-                if where:
-                    current_sec.lines.append("где:")
-                    current_sec.lines.extend(where)
-                    current_sec.lines.append("")
-                if purpose:
-                    current_sec.lines.append(purpose)
-                    current_sec.lines.append("")
-                skip_where_once = True
-                continue
+    if current_sec is not None:
+        done.append(current_sec)
+    yield from done
 
-            if skip_where_once:
-                # If we already inserted a normalized formula with "где:", skip the following
-                # Word sentence starting with "где ..." to avoid duplication.
-                if re.match(r"^\s*где\b", txt, flags=re.IGNORECASE):
-                    skip_where_once = False
-                    continue
-                skip_where_once = False
-
-            # List handling (Word numbering)
-            num_info = get_paragraph_num_info(p)
-            if num_info:
-                num_id, ilvl = num_info
-                fmt = numbering_map.get(num_id, {}).get(ilvl, "decimal")
-                indent = "  " * ilvl
-                bullet = fmt == "bullet"
-                prefix = "- " if bullet else "1. "
-                content = runs_to_md(p)
-                if not content:
-                    content = escape_md_text(txt)
-                current_sec.lines.append(f"{indent}{prefix}{content}")
+
+def segment_document(doc: Document, figure_hook: Optional[FigureHook] = None) -> List[Chapter]:
+    """
+    Split the whole document into chapters/sections, keeping every section's blocks.
+    """
+    chapters: List[Chapter] = []
+    for _ in iter_sections(doc, chapters, figure_hook=figure_hook):
+        pass
+    return chapters
+
+
+def render_section(
+    sec: Section,
+    numbering_map: Dict[int, Dict[int, str]],
+    glossary: Optional[GlossaryMatcher] = None,
+    formula_rules: Optional[FormulaRules] = None,
+    pagination: Optional[Pagination] = None,
+) -> None:
+    """
+    Produce sec.lines (markdown, with a trailing "" for the EOF newline) from sec.blocks.
+    With a glossary, the first occurrence of each term in paragraphs and list items is linked.
+    With pagination, sec.breaks gets the offsets where the section's parts start.
+    Figure and table captions and numbered formulas get an anchor line, and references to
+    them in paragraphs and list items become links (tools/xref_index.py).
+    """
+    lines: List[str] = [f"# {sec.title}", ""]
+    skip_where_once = False
+    link_terms = glossary.section().link if glossary is not None else (lambda line: line)
+    # (line index, breakable, heading) of every block that produced output: a part may start
+    # at a block, but not right after a heading (or bold paragraph) or inside a list (items
+    # and the text glued to them, which markdown reads as a continuation of the item; only a
+    # heading ends a list); a table or formula is always one block.
+    units: List[Tuple[int, bool, bool]] = []
+    after = ""  # kind of the previous block: "", "heading", "list" or "text"
+    list_start = 0  # line index of the first item of the last list
+    anchors: Set[str] = set()
+
+    def unit(kind: str, start: int) -> None:
+        nonlocal after, list_start
+        if after == "list" and kind != "heading" and lines[start - 1] != "":
+            kind = "list"  # glued to a list item: continues it
+        if kind == "list" and after != "list":
+            list_start = start
+        breakable = after != "heading" and (after != "list" or kind == "heading")
+        units.append((start, breakable, kind == "heading"))
+        after = kind
+
+    blocks = sec.blocks
+    for i, block in enumerate(blocks):
+        start = len(lines)
+        anchor = None  # the block is a caption or numbered formula
+        found: List[str] = []
+        if block.kind != "tbl" and block.text:
+            # A table caption is the paragraph right above the table (blank ones aside).
+            following = next((blocks[j] for j in range(i + 1, len(blocks)) if blocks[j].kind == "tbl" or blocks[j].text), None)
+            anchor = block_anchor(block.text, following is not None and following.kind == "tbl")
+            found = ([anchor] if anchor else []) + figure_anchors(block.text)
+        # A caption in a table cell shows only in the alt text of the image put above the table.
+        for image_line in block.images:
+            found.extend(image_anchors(image_line))
+        found = [target for target in dict.fromkeys(found) if target not in anchors]
+        anchors.update(found)
+        anchor_lines = [ln for target in found for ln in (anchor_line(target), "")]
+        # Inside a list: glued to an item, or the next item (a heading or table ends the list).
+        in_list = after == "list" and block.kind != "tbl" and lines[-1] != ""
+        if anchor_lines and after == "list" and block.kind != "tbl" and block.text:
+            level = heading_level(block.obj)  # type: ignore[arg-type]
+            if level is not None and 4 <= level <= 6:
+                in_list = False
+            elif get_paragraph_num_info(block.obj) is not None:  # type: ignore[arg-type]
+                in_list = True
+        if anchor_lines and in_list:
+            # An HTML block would end the list (and cut a glued paragraph off its item): the
+            # anchors go right above the list, into its unit.
+            lines[list_start:list_start] = anchor_lines
+            units[:] = [(s + len(anchor_lines) if s > list_start else s, ok, h) for s, ok, h in units]
+            list_start += len(anchor_lines)
+            start = len(lines)
+        else:
+            lines.extend(anchor_lines)
+        for image_line in block.images:
+            # Figure caption: put the extracted image right above it.
+            lines.append(image_line)
+            lines.append("")
+
+        if block.kind == "tbl":
+            md_lines = table_to_md(block.obj)  # type: ignore[arg-type]
+            if md_lines:
+                lines.extend(md_lines)
+                lines.append("")
+            if len(lines) > start:
+                unit("text", start)
+            continue
+
+        p: Paragraph = block.obj  # type: ignore[assignment]
+        txt = block.text
+        if not txt:
+            # preserve paragraph spacing inside a section
+            if lines and lines[-1] != "":
+                lines.append("")
+            if block.images:
+                unit("text", start)
+            continue
+
+        # Heading 4..6 inside a section
+        level = heading_level(p)
+        if level is not None and 4 <= level <= 6:
+            unit("heading", start)
+            lines.append(f"{'#' * (level - 2)} {txt}")
+            lines.append("")
+            continue
+
+        # Regular paragraph: try formula normalization first
+        formula = normalize_formula_line(txt, formula_rules)
+        if formula:
+            count("formulas")
+            latex, caption, where, purpose = formula
+            unit("text", start)
+            lines.append(latex)
+            lines.append("")
+            lines.append(caption)
+            lines.append("")
+            if where:
+                lines.append("где:")
+                lines.extend(where)
+                lines.append("")
+            if purpose:
+                lines.append(purpose)
+                lines.append("")
+            skip_where_once = True
+            continue
+
+        if skip_where_once:
+            # If we already inserted a normalized formula with "где:", skip the following
+            # Word sentence starting with "где ..." to avoid duplication.
+            skip_where_once = False
+            if re.match(r"^\s*где\b", txt, flags=re.IGNORECASE):
+                if block.images:
+                    unit("text", start)
                 continue
 
-            # Normal paragraph
+        # List handling (Word numbering)
+        num_info = get_paragraph_num_info(p)
+        if num_info:
+            num_id, ilvl = num_info
+            fmt = numbering_map.get(num_id, {}).get(ilvl, "decimal")
+            indent = "  " * ilvl
+            bullet = fmt == "bullet"
+            prefix = "- " if bullet else "1. "
             content = runs_to_md(p)
             if not content:
                 content = escape_md_text(txt)
-            current_sec.lines.append(content)
-            current_sec.lines.append("")
+            unit("list", start)
+            lines.append(f"{indent}{prefix}{link_terms(content if anchor else link_references(content))}")
+            continue
 
-        elif kind == "tbl":
-            if in_toc:
-                continue
-            # Ignore any front-matter before the first real Heading 2 (title pages, etc.)
-            if not started_main:
-                continue
-            if current_sec is None:
-                # same fallback as for paragraphs
-                if current_ch is None:
-                    start_chapter("Материалы", explicit_id="materials")
-                start_section(current_ch.title, chapter_num=chapter_num)
-            tbl: Table = obj  # type: ignore[assignment]
-            md_lines = table_to_md(tbl)
-            if md_lines:
-                current_sec.lines.extend(md_lines)
-                current_sec.lines.append("")
+        # Normal paragraph
+        content = runs_to_md(p)
+        if not content:
+            content = escape_md_text(txt)
+        unit("heading" if BOLD_LINE_RE.match(content) else "text", start)
+        lines.append(link_terms(content if anchor else link_references(content)))
+        lines.append("")
+
+    # trim trailing blanks
+    while lines and lines[-1] == "":
+        lines.pop()
+    lines.append("")  # newline at EOF
+    sec.lines = lines
+    sec.rendered = True
+    sec.breaks = []
+    if pagination is not None and units:
+        # line index -> offset in section_markdown(sec)
+        offsets = [0]
+        for line in lines:
+            offsets.append(offsets[-1] + len(line) + 1)
+        text = section_markdown(sec)
+        breaks = paginate([(offsets[i], ok, heading) for i, ok, heading in units], len(text), pagination)
+        # Check on the markdown itself: a part never starts inside a list.
+        sec.breaks = [b for b in breaks if not splits_list(text, b)]
+        count("part_breaks_in_list", len(breaks) - len(sec.breaks))
+
+
+def open_document(source: Union[Path, bytes, IO[bytes]], stream: bool = False) -> Document:
+    """
+    python-docx Document, or a docx_stream.StreamDocument (same subset of the API) when stream.
+    source is a path, the file's bytes or a binary file object.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    with span("open_document", stream=stream):
+        if stream:
+            from docx_stream import StreamDocument
+
+            return StreamDocument(source)  # type: ignore[return-value]
+        return Document(str(source) if isinstance(source, Path) else source)
+
+
+# The modules whose code shapes a section's markdown: editing any of them re-renders every
+# section on the next incremental build.
+RENDER_MODULES = (
+    "docx_to_md.py",
+    "docx_stream.py",
+    "docx_styles.py",
+    "docx_figures.py",
+    "docx_tables.py",
+    "formula_rules.py",
+    "glossary_link.py",
+    "search_index.py",
+    "xref_index.py",
+    "mdast.py",
+)
+
+
+def render_source() -> bytes:
+    """
+    Digests of the source of every module in RENDER_MODULES, in order.
+    """
+    here = Path(__file__).parent
+    return b"".join(hashlib.sha1((here / name).read_bytes()).digest() for name in RENDER_MODULES)
 
-    finalize_section()
 
-    # Write markdown files
-    OUT_PUBLIC_DIR.mkdir(parents=True, exist_ok=True)
-    OUT_SRC_DIR.mkdir(parents=True, exist_ok=True)
+def build_salt(doc: Document) -> str:
+    """
+    Hash of everything besides a section's own blocks that affects its markdown:
+    the converter's source (RENDER_MODULES), numbering definitions and styles.
+    """
+    numbering_xml, styles_xml = document_xml(doc)
+    return _salt(render_source(), numbering_xml, styles_xml)
 
-    generated_files: List[str] = []
-    for ch in chapters:
-        for sec in ch.sections:
+
+def document_xml(doc: Document) -> Tuple[bytes, bytes]:
+    return etree.tostring(doc.part.numbering_part.element), etree.tostring(doc.styles.element)
+
+
+def _salt(source: bytes, numbering_xml: bytes, styles_xml: bytes) -> str:
+    h = hashlib.sha1(source)
+    h.update(numbering_xml)
+    h.update(styles_xml)
+    return h.hexdigest()
+
+
+class ConvertCache:
+    """
+    State reused by convert_document()/write_outputs() when the same document is converted
+    again in one process (tools/watch_content.py): the numbering map and style resolver are
+    kept while numbering.xml/styles.xml are unchanged, the converter's source is read once,
+    and the search index keeps its word -> term memo.
+    """
+
+    def __init__(self) -> None:
+        self.source = render_source()
+        self.stems: Dict[str, str] = {}
+        self._numbering: Optional[Tuple[bytes, Dict[int, Dict[int, str]]]] = None
+        self._styles: Optional[Tuple[bytes, StyleResolver]] = None
+
+    def prepare(self, doc: Document) -> Tuple[Dict[int, Dict[int, str]], str]:
+        """
+        (numbering map, salt) of doc; its style resolver is set up as a side effect.
+        """
+        numbering_xml, styles_xml = document_xml(doc)
+        if self._numbering is None or self._numbering[0] != numbering_xml:
+            self._numbering = (numbering_xml, build_numbering_map(doc))
+            count("numbering_rebuilt")
+        if self._styles is None or self._styles[0] != styles_xml:
+            self._styles = (styles_xml, StyleResolver(doc.styles.element))
+            count("styles_rebuilt")
+        use_resolver(doc.part, self._styles[1])
+        return self._numbering[1], _salt(self.source, numbering_xml, styles_xml)
+
+
+@timed("section_digest")
+def section_digest(sec: Section, doc: Document, salt: str, blob_cache: Dict[str, str]) -> str:
+    """
+    Hash of a section's source: its identity, the XML of its blocks, the image lines attached
+    to them and the bytes of every image the blocks embed.
+    """
+    h = hashlib.sha1(salt.encode("utf-8"))
+    h.update(f"{sec.id}\0{sec.title}\0{sec.markdown_file}\0".encode("utf-8"))
+    for block in sec.blocks:
+        elm = block.obj._element  # type: ignore[attr-defined]
+        h.update(block.kind.encode("ascii"))
+        h.update(etree.tostring(elm))
+        for line in block.images:
+            h.update(line.encode("utf-8"))
+        for rel_id in image_rel_ids(elm):
+            if rel_id not in blob_cache:
+                rel = doc.part.rels.get(rel_id)
+                blob = rel.target_part.blob if rel is not None and not rel.is_external else b""
+                blob_cache[rel_id] = hashlib.sha1(blob).hexdigest()
+            h.update(blob_cache[rel_id].encode("ascii"))
+    return h.hexdigest()
+
+
+def convert_document(
+    doc: Document,
+    figure_hook: Optional[FigureHook] = None,
+    previous: Optional[Dict[str, str]] = None,
+    paths: OutputPaths = DEFAULT_PATHS,
+    glossary: Optional[GlossaryMatcher] = None,
+    formula_rules: Optional[FormulaRules] = None,
+    cache: Optional[ConvertCache] = None,
+    pagination: Optional[Pagination] = None,
+    sink: Optional["SectionSink"] = None,
+) -> List[Chapter]:
+    """
+    Segment the document and render its sections to markdown (linking glossary terms if given).
+    formula_rules defaults to tools/formula_rules.json. Sections over the pagination limits
+    are split into parts (None: never).
+
+    previous: markdown_file -> digest from the last build (see load_manifest()). Sections whose
+    digest is unchanged and whose output files still exist are not re-rendered (rendered=False).
+    cache: state kept from converting an earlier version of the document (see ConvertCache).
+    sink: every section is handed to it as soon as it is converted, and its markdown is then
+    dropped (only the metadata stays in the returned chapters); the caller closes the sink.
+    """
+    if cache is not None:
+        with span("prepare_document"):
+            numbering_map, salt = cache.prepare(doc)
+    else:
+        with span("build_numbering_map"):
+            numbering_map = build_numbering_map(doc)
+        with span("build_salt"):
+            salt = build_salt(doc)
+    formula_rules = formula_rules or default_rules()
+    salt += formula_rules.digest
+    if glossary is not None:
+        salt += glossary.digest  # a glossary edit re-renders every section
+    if pagination is not None:
+        salt += pagination.digest
+    salt += XREF_DIGEST
+    blob_cache: Dict[str, str] = {}
+    previous_breaks: Optional[Dict[str, List[int]]] = None
+
+    chapters: List[Chapter] = []
+    with span("convert_document"):
+        for sec in iter_sections(doc, chapters, figure_hook=figure_hook):
+            sec.digest = section_digest(sec, doc, salt, blob_cache)
             rel = sec.markdown_file.replace("chapters/", "")
-            generated_files.append(rel)
+            if not (
+                previous is not None
+                and previous.get(sec.markdown_file) == sec.digest
+                and (paths.public_dir / rel).exists()
+                and (paths.src_dir / rel).exists()
+            ):
+                with span("render_section", section=sec.id, blocks=len(sec.blocks)):
+                    render_section(sec, numbering_map, glossary, formula_rules, pagination)
+                count("sections_rendered")
+            else:
+                if previous_breaks is None:
+                    previous_breaks = load_breaks(paths.manifest)
+                sec.breaks = previous_breaks.get(sec.markdown_file, [])
+                count("sections_skipped")
+            # Source blocks are no longer needed; drop them so a streamed document stays small.
+            sec.blocks = []
+            if sink is not None:
+                chapter = next(ch for ch in reversed(chapters) if any(s is sec for s in ch.sections))
+                sink.add(chapter, sec, section_text(sec, paths))
+                sec.lines = []
 
-            content = "\n".join(sec.lines).rstrip() + "\n"
+    return chapters
 
-            (OUT_PUBLIC_DIR / rel).write_text(content, encoding="utf-8")
-            (OUT_SRC_DIR / rel).write_text(content, encoding="utf-8")
 
-    # Remove stale markdowns not referenced
-    gen_set = set(generated_files)
-    for d in (OUT_PUBLIC_DIR, OUT_SRC_DIR):
-        for md in d.glob("*.md"):
-            if md.name not in gen_set:
-                md.unlink()
+def section_text(sec: Section, paths: OutputPaths = DEFAULT_PATHS) -> str:
+    """
+    Markdown of a section: rendered, or (rendered=False) as the previous build wrote it.
+    """
+    if sec.rendered:
+        return section_markdown(sec)
+    return (paths.public_dir / sec.markdown_file.replace("chapters/", "")).read_text(encoding="utf-8")
 
-    # Update chapters.ts
-    write_ts(chapters)
 
-    print(f"Chapters: {len(chapters)}")
-    print(f"Sections: {sum(len(ch.sections) for ch in chapters)}")
-    print(f"Markdown files written: {len(generated_files)} (mirrored to src/ and public/)")
+def _read_manifest(manifest: Path, key: str) -> Optional[dict]:
+    try:
+        data = json.loads(manifest.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    value = data.get(key)
+    return value if isinstance(value, dict) else None
 
 
-if __name__ == "__main__":
-    main()
+def load_manifest(manifest: Path = BUILD_MANIFEST) -> Optional[Dict[str, str]]:
+    """
+    markdown_file -> digest recorded by the previous build, or None if there is no manifest.
+    """
+    return _read_manifest(manifest, "sections")
+
+
+def load_breaks(manifest: Path = BUILD_MANIFEST) -> Dict[str, List[int]]:
+    """
+    markdown_file -> part offsets (Section.breaks) of the sections the previous build split.
+    """
+    return _read_manifest(manifest, "parts") or {}
+
+
+def save_manifest(chapters: List[Chapter], manifest: Path = BUILD_MANIFEST) -> None:
+    data = {
+        "sections": {sec.markdown_file: sec.digest for ch in chapters for sec in ch.sections},
+        "parts": {sec.markdown_file: sec.breaks for ch in chapters for sec in ch.sections if sec.breaks},
+    }
+    write_text_if_changed(manifest, json.dumps(data, ensure_ascii=False, indent=2) + "\n")
+
+
+class SectionSink(abc.ABC):
+    """
+    Where converted sections go (convert_document(sink=...)): add() is called with each
+    section as soon as it is converted, in book order, close() once at the end with all
+    chapters (sections then carry only their metadata). DirectorySink writes this repo's
+    tree; tools/section_sinks.py has zip, stream and callback sinks.
+    """
 
+    @abc.abstractmethod
+    def add(self, chapter: Chapter, sec: Section, markdown: str) -> None:
+        """
+        Take one converted section (its markdown is not kept by the converter).
+        """
 
+    def close(self, chapters: List[Chapter]) -> List[str]:
+        """
+        Finish the output; returns the markdown files written.
+        """
+        return []
+
+
+class DirectorySink(SectionSink):
+    """
+    The output tree under `paths` (see write_outputs()), written while the document is being
+    converted: a section's markdown, part and tree files as soon as it arrives, a chapter's
+    pack once its last section did, and the book pack (read back from the chapter packs),
+    chapters.ts, search index and manifests at close(). Two sections with the same markdown
+    file are refused (ValueError) instead of one overwriting the other.
+    """
+
+    def __init__(self, paths: OutputPaths = DEFAULT_PATHS, mdast: bool = False, cache: Optional[ConvertCache] = None) -> None:
+        self.paths = paths
+        self.mdast = mdast
+        self.tree = OutputTree(paths.outputs)
+        # Layouts written before the outputs manifest existed: their stale files are found once.
+        self.tree.adopt(paths.public_dir, "*.md")
+        self.tree.adopt(paths.src_dir, "*.md")
+        self.tree.adopt(paths.ast_dir, "*.json")
+        self.tree.adopt(paths.packs_dir, "*")
+        self.tree.adopt(paths.search_dir, "*.json")
+        self.search = SearchIndexBuilder(stems=cache.stems if cache is not None else None)
+        self.xref = XrefIndexBuilder()
+        self.written: List[str] = []
+        self._chapter: Optional[Chapter] = None
+        self._pack_sections: List[dict] = []
+        self._packed: Set[str] = set()  # chapter ids whose pack is written
+        self._files: Set[str] = set()  # markdown files of the sections added so far
+
+    def add(self, chapter: Chapter, sec: Section, markdown: str) -> None:
+        if sec.markdown_file in self._files:
+            raise ValueError(f"two sections write {sec.markdown_file}")
+        self._files.add(sec.markdown_file)
+        if chapter is not self._chapter:
+            self._flush_pack()
+            self._chapter = chapter
+        if sec.rendered:
+            entry = self._write_md(sec.markdown_file, markdown)
+        else:
+            rel = sec.markdown_file.replace("chapters/", "")
+            self.tree.keep(self.paths.public_dir / rel)
+            self.tree.mirror(self.paths.public_dir / rel, self.paths.src_dir / rel)
+            entry = self._pack_file(sec.markdown_file, markdown)
+        pack_section = {"id": sec.id, "title": sec.title, **entry}
+        if sec.breaks:
+            # The pack carries the parts instead of the whole section (content_pack.py).
+            del pack_section["markdown"]
+            pack_section.pop("ast", None)
+            pack_section["parts"] = [self._write_md(name, text) for name, text in split_parts(sec, markdown)]
+        self._pack_sections.append(pack_section)
+        self.search.add_section(chapter.id, sec.id, sec.title, markdown)
+        self.xref.add_section(chapter.id, sec.id, markdown, sec.breaks)
+
+    def _write_md(self, markdown_file: str, content: str) -> dict:
+        rel = markdown_file.replace("chapters/", "")
+        public_md = self.paths.public_dir / rel
+        changed = self.tree.write_text(public_md, content)
+        if self.tree.mirror(public_md, self.paths.src_dir / rel) or changed:
+            self.written.append(rel)
+        return self._pack_file(markdown_file, content)
+
+    def _pack_file(self, markdown_file: str, content: str) -> dict:
+        entry = {"markdownFile": markdown_file, "markdown": content}
+        if self.mdast:
+            with span("mdast"):
+                ast = markdown_to_mdast(content)
+            self.tree.write_text(self.paths.ast_dir / ast_file_name(markdown_file), encode_ast(ast))
+            entry["ast"] = ast
+        return entry
+
+    def _flush_pack(self) -> None:
+        ch = self._chapter
+        if ch is None:
+            return
+        write_chapter_pack({"id": ch.id, "title": ch.title, "sections": self._pack_sections}, self.paths.packs_dir, self.tree)
+        self._packed.add(ch.id)
+        self._chapter, self._pack_sections = None, []
+
+    def close(self, chapters: List[Chapter]) -> List[str]:
+        with span("write_outputs"):
+            self._flush_pack()
+            for ch in chapters:
+                if ch.id not in self._packed:  # no sections
+                    write_chapter_pack({"id": ch.id, "title": ch.title, "sections": []}, self.paths.packs_dir, self.tree)
+            # chapters.ts, the book pack/index, the search index and the cross-reference index
+            write_ts(chapters, self.paths.chapters_ts, self.tree)
+            write_book_pack([ch.id for ch in chapters], self.paths.packs_dir, self.tree)
+            self.search.write(self.paths.search_dir, self.tree)
+            self.xref.write(self.paths.xref, self.tree)
+            # Sections, trees (all of them once --mdast is no longer used), packs and shards
+            # that are gone; only after everything else is in place.
+            self.tree.finish()
+            save_manifest(chapters, self.paths.manifest)
+        return self.written
+
+
+def write_outputs(
+    chapters: List[Chapter],
+    paths: OutputPaths = DEFAULT_PATHS,
+    mdast: bool = False,
+    cache: Optional[ConvertCache] = None,
+) -> List[str]:
+    """
+    Write rendered sections into public/ (src/ gets hard links to them), update chapters.ts
+    and the build manifest, and remove files the previous build generated that are no longer
+    generated. Every write is atomic and skipped when the content is unchanged
+    (tools/output_tree.py). Split sections also get their part files. With mdast=True every
+    markdown file's mdast JSON is written too (and put into the packs). Returns the list of
+    markdown file names actually written. (convert_document(sink=DirectorySink(...)) writes
+    the same tree while converting.)
+    """
+    sink = DirectorySink(paths, mdast, cache)
+    with span("write_outputs"):
+        for ch in chapters:
+            for sec in ch.sections:
+                sink.add(ch, sec, section_text(sec, paths))
+    return sink.close(chapters)
+
+
+def add_pagination_arguments(ap: argparse.ArgumentParser) -> None:
+    ap.add_argument(
+        "--part-chars",
+        type=int,
+        default=0,
+        help=f"split sections longer than this many markdown characters into parts (e.g. {Pagination.max_chars}; default: 0, no limit)",
+    )
+    ap.add_argument(
+        "--part-blocks",
+        type=int,
+        default=0,
+        help=f"split sections with more blocks than this into parts (e.g. {Pagination.max_blocks}; default: 0, no limit)",
+    )
+
+
+def pagination_from_args(args: argparse.Namespace) -> Optional[Pagination]:
+    if args.part_chars <= 0 and args.part_blocks <= 0:
+        return None
+    return Pagination(max(args.part_chars, 0), max(args.part_blocks, 0))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--force", action="store_true", help="re-render every section, ignoring the build manifest")
+    ap.add_argument("--stream", action="store_true", help="low-memory streaming reader (tools/docx_stream.py)")
+    ap.add_argument("--mdast", action="store_true", help="also write each section's parsed tree (tools/mdast.py)")
+    ap.add_argument("--no-glossary", action="store_true", help="do not link glossary terms (tools/glossary_link.py)")
+    ap.add_argument("--formula-rules", type=Path, help="formula rule file (default: tools/formula_rules.json)")
+    add_pagination_arguments(ap)
+    target = ap.add_mutually_exclusive_group()
+    target.add_argument("--zip", type=Path, help="write the sections and chapters.ts into this zip instead of the tree")
+    target.add_argument("--stdout", action="store_true", help="stream the book's markdown to stdout instead of the tree")
+    add_profile_argument(ap, Path(".build/profile/docx_to_md.trace.json"))
+    args = ap.parse_args()
+
+    if not DOCX_PATH.exists():
+        raise SystemExit(f"DOCX not found: {DOCX_PATH}")
+
+    start_profile(args.profile)
+    # Sections are written as they are converted (see SectionSink).
+    if args.zip or args.stdout:
+        from section_sinks import StreamSink, ZipSink
+
+        sink: SectionSink = ZipSink(args.zip) if args.zip else StreamSink(sys.stdout)
+        previous = None  # nothing to reuse: every section is rendered
+    else:
+        sink = DirectorySink(mdast=args.mdast)
+        previous = None if args.force else load_manifest()
+    doc = open_document(DOCX_PATH, stream=args.stream)
+    glossary = None if args.no_glossary else load_glossary()
+    rules = load_rules(args.formula_rules) if args.formula_rules else None
+    chapters = convert_document(
+        doc,
+        previous=previous,
+        glossary=glossary,
+        formula_rules=rules,
+        pagination=pagination_from_args(args),
+        sink=sink,
+    )
+    written = sink.close(chapters)
+
+    # With --stdout the report goes to stderr, after the markdown.
+    with contextlib.redirect_stdout(sys.stderr if args.stdout else sys.stdout):
+        sections = [sec for ch in chapters for sec in ch.sections]
+        print(f"Chapters: {len(chapters)}")
+        print(f"Sections: {len(sections)} (re-rendered: {sum(sec.rendered for sec in sections)})")
+        print(f"Split into parts: {sum(bool(sec.breaks) for sec in sections)}")
+        if args.zip:
+            print(f"Markdown files: {len(written)} in {args.zip}")
+        elif not args.stdout:
+            print(f"Markdown files written: {len(written)} (mirrored to src/ and public/)")
+            for rel in written:
+                print(f"  rebuilt: {rel}")
+            report_xref()
+        finish_profile(args.profile)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,14 @@
 Extract images from a .docx and insert them into markdown files at matching captions.
 
 Strategy:
-1) Parse DOCX XML for image references (a:blip r:embed) and nearby captions like "Рис. 1.12."
-2) Save images into public/images/milovanov/ as ris_1_12.<ext>
+1) Scan every story of the DOCX for image references (drawings, VML, text boxes, headers,
+   footnotes) and pair them with captions like "Рис. 1.12." above or below them
+   (tools/docx_figures.py)
+2) Save images into the content-addressed store public/images/store/<hash>.<ext> (the hash
+   is of the embedded bytes, so a picture used by several figures or several manuals is
+   stored once and an unchanged image is never rewritten), record figure -> file in
+   public/images/milovanov/figures.json and optimize new files (recompression, WebP/AVIF
+   variants, responsive widths; see tools/image_optimize.py)
 3) Insert markdown image links above matching caption lines in:
    - public/content/chapters/*.md
    - src/content/chapters/*.md
@@ -15,110 +21,201 @@ Idempotent: won't insert duplicate image links if already present nearby.
 
 from __future__ import annotations
 
+import argparse
+import hashlib
+import json
+import os
 import re
-from dataclasses import dataclass
 from pathlib import Path
 from typing import Dict, Iterable, List, Optional, Tuple
 
 from docx import Document
-from docx.oxml.ns import nsmap
+
+from content_pack import refresh_packs
+from docx_figures import BODY, FigureInfo, FigureTable, scan_figures, story_rels
+from image_optimize import image_size, image_url, optimize_images
+from output_tree import write_text_if_changed
+from profiling import add_profile_argument, count, finish_profile, span, start_profile
 
 
 DOCX_PATH = Path("public/milovanov-t.docx")
-OUT_DIR = Path("public/images/milovanov")
+OUT_DIR = Path("public/images/milovanov")  # per-document: figures.json
+STORE_DIR = Path("public/images/store")  # shared, content-addressed image files
+FIGURES_MANIFEST = "figures.json"
+HASH_LEN = 20  # hex digits of sha256 kept in store file names
 MD_DIRS = [
     Path("public/content/chapters"),
     Path("src/content/chapters"),
 ]
 
 
-NS = nsmap  # python-docx namespace map used by BaseOxmlElement.xpath()
-
-
-CAPTION_RE = re.compile(r"^\s*Рис\.\s*(\d+)\.(\d+)\.?\s*(.*)\s*$", re.IGNORECASE)
-
-
-@dataclass(frozen=True)
-class FigureInfo:
-    num: str  # e.g. "1.12"
-    title: str  # caption title part (may be empty)
-    rel_id: str  # relationship id like "rId7"
-
-
-def _p_text(p_elm) -> str:
-    # collect all text nodes
-    ts = p_elm.xpath(".//w:t")
-    return "".join(t.text or "" for t in ts).strip()
-
-
-def _p_embeds(p_elm) -> List[str]:
-    return p_elm.xpath(".//a:blip/@r:embed")
-
-
 def extract_figures_from_docx(doc: Document) -> Dict[str, FigureInfo]:
     """
     Returns mapping: figure_number -> FigureInfo.
     """
-    figures: Dict[str, FigureInfo] = {}
-
-    # Traverse all paragraphs in body, including those inside tables, in document order.
-    body = doc.element.body
-    p_elms = body.xpath(".//w:p")
+    return scan_document(doc).figures
 
-    last_embed: Optional[str] = None
 
-    for p in p_elms:
-        embeds = _p_embeds(p)
-        text = _p_text(p)
+def scan_document(doc: Document) -> FigureTable:
+    """
+    Figures of the body and of every header, footer and note (tools/docx_figures.py).
+    """
+    with span("extract_figures"):
+        table = scan_figures(doc)
+    count("figures", len(table.figures))
+    return table
 
-        # If this paragraph has an image, remember the last one (common: image paragraph then caption paragraph)
-        if embeds:
-            last_embed = embeds[-1]
 
-        m = CAPTION_RE.match(text)
-        if not m:
-            continue
+def figure_blob(doc: Document, info: FigureInfo) -> bytes:
+    return story_rels(doc, info.story)[info.rel_id].target_part.blob
 
-        fig_num = f"{m.group(1)}.{m.group(2)}"
-        fig_title = (m.group(3) or "").strip()
 
-        # Prefer embed in same paragraph if present; else fallback to last seen embed.
-        rel_id = embeds[-1] if embeds else last_embed
-        if not rel_id:
-            continue
+def figure_image_path(
+    doc: Document, info: FigureInfo, out_dir: Path = STORE_DIR, blob: Optional[bytes] = None
+) -> Optional[Path]:
+    """
+    Store path for the figure image (<sha256 prefix of its bytes>.<ext> inside out_dir), or
+    None if the relationship does not point at an image part.
+    """
+    rel = story_rels(doc, info.story).get(info.rel_id)
+    if not rel or rel.is_external:
+        return None
 
-        # Keep first occurrence (some docs repeat captions in TOC)
-        if fig_num not in figures:
-            figures[fig_num] = FigureInfo(num=fig_num, title=fig_title, rel_id=rel_id)
+    # part.partname like '/word/media/image1.png'
+    name = str(rel.target_part.partname).split("/")[-1]
+    ext = name.split(".")[-1].lower() if "." in name else "png"
 
-    return figures
+    if blob is None:
+        blob = rel.target_part.blob
+    return out_dir / f"{hashlib.sha256(blob).hexdigest()[:HASH_LEN]}.{ext}"
 
 
-def save_images(doc: Document, figures: Dict[str, FigureInfo]) -> Dict[str, Path]:
+def save_figure_image(doc: Document, info: FigureInfo, out_path: Path, blob: Optional[bytes] = None) -> bool:
     """
-    Saves images for each figure and returns mapping figure_number -> saved path (relative to public).
+    Write the image into the store unless it is already there (same name = same source bytes).
+    The file appears atomically, so a half-written image is never taken for a stored one.
+    Returns True if the file was written.
     """
-    OUT_DIR.mkdir(parents=True, exist_ok=True)
+    if out_path.exists():
+        count("images_reused")
+        return False
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    if blob is None:
+        blob = figure_blob(doc, info)
+    tmp = out_path.with_name(f"{out_path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(blob)
+    os.replace(tmp, out_path)
+    count("images_saved")
+    count("image_bytes", len(blob))
+    return True
+
+
+def figure_entry(src: str, info: Optional[FigureInfo]) -> dict:
+    if info is None:
+        return {"src": src, "title": ""}
+    entry = {"src": src, "title": info.title, "placement": info.placement, "confidence": info.confidence}
+    if info.flags:
+        entry["flags"] = list(info.flags)
+    if info.story != BODY:
+        entry["story"] = info.story
+    return entry
+
+
+def save_figure_manifest(
+    manifest: Path,
+    figures: Dict[str, FigureInfo],
+    img_map: Dict[str, Path],
+    public_root: Path = Path("public"),
+    table: Optional[FigureTable] = None,
+) -> bool:
+    """
+    Record figure number -> store file (and the reverse) in `manifest`, with how sure the
+    caption match is; with the scanner's table, also captions without an image ("missing")
+    and images without a caption ("uncaptioned"). The file is only rewritten when its content
+    changed. Returns True if it was written.
+    """
+    data = figure_manifest_data(figures, img_map, public_root, table)
+    return write_text_if_changed(manifest, json.dumps(data, ensure_ascii=False, indent=2) + "\n")
 
-    out_map: Dict[str, Path] = {}
 
-    for fig_num, info in sorted(figures.items(), key=lambda kv: tuple(int(x) for x in kv[0].split("."))):
-        rel = doc.part.rels.get(info.rel_id)
-        if not rel:
-            continue
+def figure_manifest_data(
+    figures: Dict[str, FigureInfo],
+    img_map: Dict[str, Path],
+    public_root: Path = Path("public"),
+    table: Optional[FigureTable] = None,
+) -> Dict[str, object]:
+    """
+    Contents of figures.json (see save_figure_manifest()).
+    """
+    entries: Dict[str, dict] = {}
+    files: Dict[str, List[str]] = {}
+    for num, out_path in sorted(img_map.items(), key=lambda kv: figure_sort_key(kv[0])):
+        src = web_path(out_path, public_root)
+        entries[num] = figure_entry(src, figures.get(num))
+        files.setdefault(src, []).append(num)
+    data: Dict[str, object] = {"figures": entries, "files": files}
+    if table is not None:
+        data["missing"] = [{"num": num, "story": story, "paragraph": i} for num, story, i in table.missing]
+        data["uncaptioned"] = [
+            {"story": ref.story, "paragraph": ref.paragraph, "rel": ref.rel_id, "kind": ref.kind} for ref in table.uncaptioned
+        ]
+    return data
+
+
+def figure_sort_key(num: str) -> Tuple[int, ...]:
+    return tuple(int(x) for x in num.split("."))
+
+
+def figures_to_check(figures: Dict[str, FigureInfo]) -> List[str]:
+    """
+    One line per figure whose caption match is not certain, for the console.
+    """
+    out: List[str] = []
+    for num, info in sorted(figures.items(), key=lambda kv: figure_sort_key(kv[0])):
+        if info.confidence != "high" or info.flags:
+            notes = ", ".join((info.confidence, f"picture {info.placement}") + info.flags)
+            out.append(f"  Рис. {num}: {notes}")
+    return out
+
+
+def report_figures(table: FigureTable, manifest: Path) -> None:
+    check = figures_to_check(table.figures)
+    if check:
+        print(f"Figures to check ({len(check)}):")
+        print("\n".join(check))
+    if table.missing or table.uncaptioned:
+        print(
+            f"Captions without an image: {len(table.missing)}, images without a caption: "
+            f"{len(table.uncaptioned)} (see {manifest.as_posix()})"
+        )
+
+
+def web_path(out_path: Path, public_root: Path = Path("public")) -> str:
+    """
+    URL path of a file under the web root, e.g. public/images/x.png -> /images/x.png.
+    """
+    try:
+        return "/" + out_path.relative_to(public_root).as_posix()
+    except ValueError:
+        return "/" + out_path.as_posix().replace("public/", "")
+
 
-        part = rel.target_part
-        # part.partname like '/word/media/image1.png'
-        name = str(part.partname).split("/")[-1]
-        ext = name.split(".")[-1].lower() if "." in name else "png"
+def save_images(doc: Document, figures: Dict[str, FigureInfo], table: Optional[FigureTable] = None) -> Dict[str, Path]:
+    """
+    Saves images for each figure into the store and returns mapping figure_number -> store path.
+    """
+    out_map: Dict[str, Path] = {}
 
-        safe_num = fig_num.replace(".", "_")
-        out_name = f"ris_{safe_num}.{ext}"
-        out_path = OUT_DIR / out_name
+    with span("save_images"):
+        for fig_num, info in sorted(figures.items(), key=lambda kv: figure_sort_key(kv[0])):
+            out_path = figure_image_path(doc, info)
+            if out_path is None:
+                continue
 
-        out_path.write_bytes(part.blob)
-        out_map[fig_num] = out_path
+            save_figure_image(doc, info, out_path)
+            out_map[fig_num] = out_path
 
+    save_figure_manifest(OUT_DIR / FIGURES_MANIFEST, figures, out_map, table=table)
     return out_map
 
 
@@ -129,73 +226,135 @@ def md_image_line(fig_num: str, img_web_path: str, caption_title: str) -> str:
     return f"![{alt}]({img_web_path})"
 
 
-def insert_into_md(md_path: Path, fig_num: str, img_web_path: str, caption_title: str) -> bool:
+# Caption line as emitted into markdown (plain or bold), e.g. "**Рис. 1.12.** Схема ..."
+CAPTION_LINE_RE = re.compile(r"^\s*(?:\*\*)?Рис\.\s*(\d+\.\d+)\b", re.IGNORECASE)
+
+
+def build_caption_index(texts: Dict[Path, str]) -> Dict[str, List[Tuple[Path, int]]]:
     """
-    Insert image markdown line above the caption line containing 'Рис. {fig_num}'.
+    One pass over every markdown text: figure_number -> [(file, line index)] of the first
+    caption line for that figure in each file.
     """
-    text = md_path.read_text(encoding="utf-8")
-    lines = text.splitlines()
-
-    # Skip if this image already referenced anywhere
-    if img_web_path in text:
-        return False
+    index: Dict[str, List[Tuple[Path, int]]] = {}
+    for md_path, text in texts.items():
+        seen: set = set()
+        for i, line in enumerate(text.splitlines()):
+            m = CAPTION_LINE_RE.match(line)
+            if not m or m.group(1) in seen:
+                continue
+            seen.add(m.group(1))
+            index.setdefault(m.group(1), []).append((md_path, i))
+    return index
 
-    caption_pat = re.compile(rf"^\s*(\*\*)?Рис\.\s*{re.escape(fig_num)}\b", re.IGNORECASE)
 
-    changed = False
+def apply_insertions(text: str, inserts: List[Tuple[int, str]]) -> Tuple[str, int]:
+    """
+    Insert image lines above caption lines. inserts: (caption line index, image markdown line).
+    Returns (new_text, number_of_insertions).
+    """
+    lines = text.splitlines()
+    by_line = dict(sorted(inserts))
     out: List[str] = []
-    inserted = False
+    count = 0
 
     for i, line in enumerate(lines):
-        if not inserted and caption_pat.search(line):
-            # Avoid inserting if previous lines already have an image line
-            prev_window = "\n".join(lines[max(0, i - 3) : i])
-            if "![" not in prev_window:
-                out.append(md_image_line(fig_num, img_web_path, caption_title))
-                out.append("")  # blank line for markdown readability
-                inserted = True
-                changed = True
+        img_line = by_line.get(i)
+        # Avoid inserting if previous lines already have an image line
+        if img_line is not None and "![" not in "\n".join(out[-3:]):
+            out.append(img_line)
+            out.append("")  # blank line for markdown readability
+            count += 1
         out.append(line)
 
-    if changed:
-        md_path.write_text("\n".join(out) + ("\n" if text.endswith("\n") else ""), encoding="utf-8")
-    return changed
+    if not count:
+        return text, 0
+    return "\n".join(out) + ("\n" if text.endswith("\n") else ""), count
+
+
+def insert_figures(
+    md_files: Iterable[Path], figures: Dict[str, FigureInfo], img_map: Dict[str, Path], variants: bool = True
+) -> int:
+    """
+    Insert image links for all figures into md_files. Each file is read once and written
+    at most once. Returns the number of inserted image links. variants=False: the images
+    were not optimized, so the links list no WebP/AVIF or resized copies.
+    """
+    with span("insert_figures"):
+        return _insert_figures(md_files, figures, img_map, variants)
+
+
+def _insert_figures(
+    md_files: Iterable[Path], figures: Dict[str, FigureInfo], img_map: Dict[str, Path], variants: bool
+) -> int:
+    texts = {md: md.read_text(encoding="utf-8") for md in md_files}
+    index = build_caption_index(texts)
+
+    per_file: Dict[Path, List[Tuple[int, str]]] = {}
+    for fig_num, hits in index.items():
+        info = figures.get(fig_num)
+        out_path = img_map.get(fig_num)
+        if info is None or out_path is None:
+            continue
+        img_web_path = web_path(out_path)
+        img_url = image_url(img_web_path, image_size(out_path.read_bytes()), variants=variants)
+        for md_path, line_no in hits:
+            # Skip if this image already referenced anywhere in the file
+            if img_web_path in texts[md_path]:
+                continue
+            per_file.setdefault(md_path, []).append(
+                (line_no, md_image_line(fig_num, img_url, info.title))
+            )
+
+    total = 0
+    for md_path, inserts in per_file.items():
+        new_text, inserted = apply_insertions(texts[md_path], inserts)
+        if inserted:
+            # atomic: also replaces a hard-linked src/ mirror instead of editing both through it
+            write_text_if_changed(md_path, new_text)
+            total += inserted
+    count("links_inserted", total)
+    return total
 
 
 def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--no-optimize", action="store_true", help="keep images exactly as embedded (tools/image_optimize.py)")
+    add_profile_argument(ap, Path(".build/profile/extract_docx_images.trace.json"))
+    args = ap.parse_args()
+
     if not DOCX_PATH.exists():
         raise SystemExit(f"DOCX not found: {DOCX_PATH}")
 
-    doc = Document(str(DOCX_PATH))
-    figures = extract_figures_from_docx(doc)
+    start_profile(args.profile)
+    with span("open_document"):
+        doc = Document(str(DOCX_PATH))
+    table = scan_document(doc)
+    figures = table.figures
     if not figures:
         print("No figures found (captions like 'Рис. X.Y').")
+        finish_profile(args.profile)
         return
 
-    img_map = save_images(doc, figures)
-    print(f"Extracted images: {len(img_map)} into {OUT_DIR.as_posix()}")
+    img_map = save_images(doc, figures, table)
+    print(f"Extracted images: {len(img_map)} ({len(set(img_map.values()))} distinct) into {STORE_DIR.as_posix()}")
+    report_figures(table, OUT_DIR / FIGURES_MANIFEST)
+    if not args.no_optimize:
+        optimized = optimize_images(sorted(set(img_map.values())))
+        print(f"Optimized images: {sum(bool(v) for v in optimized.values())}")
 
     total_inserted = 0
     for md_dir in MD_DIRS:
         if not md_dir.exists():
             continue
-        md_files = list(md_dir.glob("*.md"))
-        inserted_here = 0
-        for fig_num, info in figures.items():
-            out_path = img_map.get(fig_num)
-            if not out_path:
-                continue
-            img_web_path = "/" + out_path.as_posix().replace("public/", "")
-            for md in md_files:
-                if insert_into_md(md, fig_num, img_web_path, info.title):
-                    inserted_here += 1
+        inserted_here = insert_figures(md_dir.glob("*.md"), figures, img_map, variants=not args.no_optimize)
         print(f"Inserted into {md_dir.as_posix()}: {inserted_here} changes")
         total_inserted += inserted_here
 
+    if total_inserted and refresh_packs() is not None:
+        print("Content packs refreshed")
     print(f"Done. Total markdown edits: {total_inserted}")
+    finish_profile(args.profile)
 
 
 if __name__ == "__main__":
     main()
-
-
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Formula rules: recognize formula paragraphs and replace them with KaTeX blocks.
+
+Rules live in a JSON file (tools/formula_rules.json by default, --formula-rules for another
+manual), in priority order:
+  {"version": 1, "rules": [{"name", "lhs"?, "pattern", "latex", "caption",
+                             "where"?: [markdown lines], "purpose"?}, ...]}
+"pattern" must match the whole paragraph (case-insensitive, spaces already collapsed).
+"lhs" is the left-hand side as written ("V(G)", "N"); rules without it are tried on every
+candidate paragraph.
+
+Matching cost does not grow with the number of rules:
+- prefilter: a paragraph longer than MAX_FORMULA_LEN or without a relation sign (=, ≈, <, ...)
+  is not a formula, so ordinary prose exits after one short scan;
+- dispatch: the text before the first relation sign, without spaces and backslashes, picks
+  the rules with that "lhs" from a dict;
+- those rules (plus the ones without "lhs") are compiled into one alternation with a named
+  group per rule; the first matching group in priority order wins.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+
+FORMULA_RULES = Path(__file__).with_name("formula_rules.json")
+MAX_FORMULA_LEN = 300
+RELATION_RE = re.compile(r"[=≈~<>≤≥≠]")
+LHS_JUNK_RE = re.compile(r"[\s\\]+")
+
+# (latex_block, caption, where_lines, purpose)
+FormulaMatch = Tuple[str, str, List[str], Optional[str]]
+
+
+@dataclass(frozen=True)
+class FormulaRule:
+    name: str
+    pattern: str
+    latex: str
+    caption: str
+    where: List[str] = field(default_factory=list)
+    purpose: Optional[str] = None
+    lhs: Optional[str] = None
+
+    def result(self) -> FormulaMatch:
+        return self.latex, self.caption, list(self.where), self.purpose
+
+
+def lhs_key(text: str) -> str:
+    return LHS_JUNK_RE.sub("", text).lower()
+
+
+class FormulaRules:
+    """
+    A rule set compiled for matching (see the module docstring).
+    """
+
+    def __init__(self, rules: List[FormulaRule]) -> None:
+        self.rules = rules
+        by_lhs: Dict[str, List[int]] = {}
+        generic: List[int] = []
+        for i, rule in enumerate(rules):
+            if rule.lhs:
+                by_lhs.setdefault(lhs_key(rule.lhs), []).append(i)
+            else:
+                generic.append(i)
+        self._generic = self._combine(generic)
+        self._by_lhs = {key: self._combine(sorted(idx + generic)) for key, idx in by_lhs.items()}
+        self.digest = hashlib.sha1(
+            json.dumps([rule.__dict__ for rule in rules], ensure_ascii=False, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+
+    def _combine(self, indexes: List[int]) -> Optional["re.Pattern[str]"]:
+        if not indexes:
+            return None
+        return re.compile("|".join(f"(?P<r{i}>{self.rules[i].pattern})" for i in indexes), re.IGNORECASE)
+
+    def match(self, text: str) -> Optional[FormulaMatch]:
+        if len(text) > MAX_FORMULA_LEN:
+            return None
+        rel = RELATION_RE.search(text)
+        if rel is None:
+            return None
+        regex = self._by_lhs.get(lhs_key(text[: rel.start()]), self._generic)
+        m = regex.fullmatch(text) if regex is not None else None
+        if m is None:
+            return None
+        # Alternatives are tried in priority order; the rule's group is the outermost, so it
+        # is the last one closed (lastgroup) whatever groups the pattern has inside.
+        return self.rules[int(m.lastgroup[1:])].result()
+
+
+def load_rules(path: Path = FORMULA_RULES) -> FormulaRules:
+    """
+    Read and compile a rule file. Raises ValueError naming the rule if it is malformed.
+    """
+    data = json.loads(path.read_text(encoding="utf-8"))
+    rules: List[FormulaRule] = []
+    for i, item in enumerate(data.get("rules", [])):
+        name = item.get("name") or f"#{i}"
+        try:
+            rule = FormulaRule(
+                name=name,
+                pattern=item["pattern"],
+                latex=item["latex"],
+                caption=item["caption"],
+                where=list(item.get("where", [])),
+                purpose=item.get("purpose"),
+                lhs=item.get("lhs"),
+            )
+            re.compile(rule.pattern)
+        except (KeyError, re.error) as e:
+            raise ValueError(f"{path}: formula rule {name}: {e}") from e
+        rules.append(rule)
+    return FormulaRules(rules)
+
+
+@lru_cache(maxsize=None)
+def default_rules() -> FormulaRules:
+    return load_rules(FORMULA_RULES)
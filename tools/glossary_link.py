@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Link glossary terms (src/data/glossary.ts) from the chapter text.
+
+All terms are compiled into one Aho-Corasick automaton over word stems (the same
+normalization and stemming as tools/search_index.py), so inflected forms match without
+listing them: "модулем", "модулей" hit the term "Модуль", "сцепления модулей" hits
+"Сцепление модулей (coupling)". Text is matched in one pass over its words whatever the
+glossary size; building the automaton is linear in the total length of the terms.
+
+docx_to_md.py runs every paragraph and list item produced by runs_to_md() through a
+per-section SectionLinker: the first occurrence of each term in a section becomes
+[text](/glossary#<term>); headings, formulas, figure/table captions, existing links, images
+and URLs are never linked. Where several terms overlap, the leftmost, then longest, wins.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import quote
+
+from search_index import TOKEN_RE, normalize, stem
+
+
+GLOSSARY_TS = Path(__file__).resolve().parent.parent / "src" / "data" / "glossary.ts"  # this repo's glossary
+GLOSSARY_ROUTE = "/glossary"
+
+TERM_RE = re.compile(r"""\bterm:\s*(['"])((?:\\.|(?!\1).)*)\1""")
+# "Ассоциация (в UML)" -> "Ассоциация": the qualifier is not part of the running text.
+QUALIFIER_RE = re.compile(r"\s*\([^)]*\)\s*$")
+# Spans of a markdown line that must not be linked (or matched across).
+PROTECTED_RE = re.compile(
+    r"!?\[(?:\\.|[^\]\\])*\]\([^)]*\)"  # images and links
+    r"|\$\$.*?\$\$|\$[^$\n]*\$"  # math
+    r"|https?://\S+|www\.\S+"  # autolink literals
+)
+CAPTION_RE = re.compile(r"^\s*(?:\*\*)?(?:Рис|Таблица|Табл)\.?\s*\d", re.IGNORECASE)
+
+
+def load_terms(path: Path = GLOSSARY_TS) -> List[str]:
+    """
+    Glossary terms in file order. A glossary that cannot be read raises OSError: a missing
+    file must not quietly turn into a build without links.
+    """
+    source = path.read_text(encoding="utf-8")
+    return [re.sub(r"\\(.)", r"\1", m.group(2)) for m in TERM_RE.finditer(source)]
+
+
+def term_href(term: str) -> str:
+    return f"{GLOSSARY_ROUTE}#{quote(term, safe='')}"
+
+
+class GlossaryMatcher:
+    """
+    Aho-Corasick automaton whose alphabet is word stems.
+    """
+
+    def __init__(self, terms: List[str]) -> None:
+        self.terms = terms
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        # longest term ending in each state: (term index, length in words)
+        self.out: List[Optional[Tuple[int, int]]] = [None]
+        self._stems: Dict[str, str] = {}
+        for index, term in enumerate(terms):
+            words = [self.stem(w) for w in TOKEN_RE.findall(QUALIFIER_RE.sub("", term))]
+            if words:
+                self._add(words, index)
+        self._link()
+        self.digest = hashlib.sha1("\0".join(terms).encode("utf-8")).hexdigest()
+
+    def stem(self, word: str) -> str:
+        s = self._stems.get(word)
+        if s is None:
+            s = self._stems[word] = stem(normalize(word))
+        return s
+
+    def _add(self, words: List[str], index: int) -> None:
+        state = 0
+        for w in words:
+            nxt = self.goto[state].get(w)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[state][w] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append(None)
+            state = nxt
+        if self.out[state] is None:  # two terms with the same stems: the first one wins
+            self.out[state] = (index, len(words))
+
+    def _link(self) -> None:
+        # Breadth-first: a state's fail link points to the longest proper suffix that is a state.
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for w, nxt in self.goto[state].items():
+                f = self.fail[state]
+                while f and w not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(w, 0)
+                if self.out[nxt] is None:
+                    self.out[nxt] = self.out[self.fail[nxt]]
+                queue.append(nxt)
+
+    def matches(self, text: str) -> List[Tuple[int, int, int]]:
+        """
+        (start, end, term index) of term occurrences in text outside protected spans,
+        leftmost first, non-overlapping (longest at the same start).
+        """
+        found: List[Tuple[int, int, int]] = []
+        for chunk_start, chunk_end in _unprotected(text):
+            state = 0  # never match across a link, formula or URL
+            words: List[Tuple[int, int]] = []  # (start, end) of this chunk's words
+            for m in TOKEN_RE.finditer(text, chunk_start, chunk_end):
+                words.append((m.start(), m.end()))
+                w = self.stem(m.group(0))
+                while state and w not in self.goto[state]:
+                    state = self.fail[state]
+                state = self.goto[state].get(w, 0)
+                hit = self.out[state]
+                if hit is not None:
+                    index, length = hit
+                    found.append((words[-length][0], words[-1][1], index))
+        found.sort(key=lambda f: (f[0], -f[1]))
+        out: List[Tuple[int, int, int]] = []
+        end = -1
+        for start, stop, index in found:
+            if start >= end:
+                out.append((start, stop, index))
+                end = stop
+        return out
+
+    def section(self) -> "SectionLinker":
+        return SectionLinker(self)
+
+
+class SectionLinker:
+    """
+    Links the first occurrence of each term within one section.
+    """
+
+    def __init__(self, matcher: GlossaryMatcher) -> None:
+        self.matcher = matcher
+        self.linked: Set[int] = set()
+
+    def link(self, line: str) -> str:
+        if CAPTION_RE.match(line):
+            return line
+        parts: List[str] = []
+        pos = 0
+        for start, end, index in self.matcher.matches(line):
+            if index in self.linked:
+                continue
+            label = line[start:end]
+            if "*" in label or "\\" in label:  # would cross emphasis or an escape
+                continue
+            self.linked.add(index)
+            parts.append(line[pos:start])
+            parts.append(f"[{label}]({term_href(self.matcher.terms[index])})")
+            pos = end
+        if not parts:
+            return line
+        parts.append(line[pos:])
+        return "".join(parts)
+
+
+def _unprotected(text: str) -> List[Tuple[int, int]]:
+    chunks: List[Tuple[int, int]] = []
+    pos = 0
+    for m in PROTECTED_RE.finditer(text):
+        if m.start() > pos:
+            chunks.append((pos, m.start()))
+        pos = m.end()
+    if pos < len(text):
+        chunks.append((pos, len(text)))
+    return chunks
+
+
+def load_glossary(path: Path = GLOSSARY_TS) -> Optional[GlossaryMatcher]:
+    """
+    Matcher for the terms of a glossary.ts file (None if it has none); raises OSError if the
+    file cannot be read.
+    """
+    terms = load_terms(path)
+    return GlossaryMatcher(terms) if terms else None
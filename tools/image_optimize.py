@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Figure image optimization: intrinsic dimensions, recompression, modern formats, responsive widths.
+
+For every saved figure (public/images/store/<hash>.<ext>, see
+tools/extract_docx_images_and_insert.py):
+- the original is re-encoded losslessly (PNG: optimize) or near-losslessly (JPEG: same
+  quantization tables, optimized Huffman, progressive) and replaced only if that is smaller;
+- AVIF/WebP variants are written next to it: <hash>.webp at full size plus <hash>-480w.webp,
+  <hash>-960w.webp, ... for every responsive width below the original width.
+
+Images are independent, so optimize_images() runs them on a thread pool (Pillow releases the
+GIL while encoding). An image Pillow cannot decode or encode is reported and kept as is; it
+never fails the build. Pillow is optional: without it images are left as extracted and only
+the dimensions are known (read from the file header by image_size()).
+
+Dimensions and the variant list are carried in the image URL fragment, e.g.
+  ![Рис. 1.5](/images/store/3f1c9a0be27d45e8a6b1.png#w=1200&h=900&srcset=480,960&fmt=avif,webp)
+The fragment is plain CommonMark, and src/utils/markdown.tsx turns it into a <picture> with
+width/height set (no reflow when the image loads) and srcset for every format.
+"""
+
+from __future__ import annotations
+
+import argparse
+import struct
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from profiling import count, span
+
+try:  # optional: recompression and variants need Pillow
+    from PIL import Image, features
+except ImportError:  # pragma: no cover
+    Image = None  # type: ignore[assignment]
+    features = None  # type: ignore[assignment]
+
+
+IMAGE_STORE = Path("public/images/store")
+RESPONSIVE_WIDTHS = (480, 960, 1440)
+MODERN_FORMATS = ("avif", "webp")  # in order of preference (first matching <source> wins)
+QUALITY = {"avif": 60, "webp": 82}
+
+# Formats whose originals are recompressed (others, e.g. GIF or EMF, are left alone).
+RECOMPRESS = {"png": {"optimize": True}, "jpg": {"quality": "keep", "optimize": True, "progressive": True}}
+RECOMPRESS["jpeg"] = RECOMPRESS["jpg"]
+# Formats whose variants are made: those image_size() reads (only their links list variants).
+# Word documents also embed EMF, WMF and TIFF, which Pillow often cannot decode: kept as embedded.
+DECODE = {"png", "jpg", "jpeg", "gif", "bmp", "webp"}
+
+
+def image_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """
+    (width, height) from a PNG, JPEG, GIF, BMP or WebP header, without decoding the image.
+    """
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+        return struct.unpack(">II", data[16:24])
+    if data[:6] in (b"GIF87a", b"GIF89a") and len(data) >= 10:
+        return struct.unpack("<HH", data[6:10])
+    if data[:2] == b"BM" and len(data) >= 26:
+        w, h = struct.unpack("<ii", data[18:26])
+        return w, abs(h)
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP" and len(data) >= 30:
+        chunk = data[12:16]
+        if chunk == b"VP8 ":
+            w, h = struct.unpack("<HH", data[26:30])
+            return w & 0x3FFF, h & 0x3FFF
+        if chunk == b"VP8L":
+            b = data[21:25]
+            w = 1 + (((b[1] & 0x3F) << 8) | b[0])
+            h = 1 + (((b[3] & 0xF) << 10) | (b[2] << 2) | ((b[1] & 0xC0) >> 6))
+            return w, h
+        if chunk == b"VP8X":
+            w = 1 + int.from_bytes(data[24:27], "little")
+            h = 1 + int.from_bytes(data[27:30], "little")
+            return w, h
+        return None
+    if data[:2] == b"\xff\xd8":
+        i = 2
+        while i + 9 < len(data):
+            if data[i] != 0xFF:
+                i += 1
+                continue
+            marker = data[i + 1]
+            if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7 or marker == 0xFF:
+                i += 1 if marker == 0xFF else 2
+                continue
+            seg_len = struct.unpack(">H", data[i + 2 : i + 4])[0]
+            # SOF0..SOF15, except DHT (C4), JPG (C8) and DAC (CC)
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                h, w = struct.unpack(">HH", data[i + 5 : i + 9])
+                return w, h
+            i += 2 + seg_len
+    return None
+
+
+@lru_cache(maxsize=None)
+def available_formats() -> Tuple[str, ...]:
+    """
+    Modern formats this Pillow can encode (empty without Pillow).
+    """
+    if Image is None:
+        return ()
+    return tuple(fmt for fmt in MODERN_FORMATS if features.check(fmt))
+
+
+def responsive_widths(width: int) -> List[int]:
+    return [w for w in RESPONSIVE_WIDTHS if w < width]
+
+
+def variant_path(path: Path, fmt: str, width: Optional[int] = None) -> Path:
+    suffix = f"-{width}w" if width else ""
+    return path.with_name(f"{path.stem}{suffix}.{fmt}")
+
+
+def image_url(web_path: str, size: Optional[Tuple[int, int]], variants: bool = True) -> str:
+    """
+    Web path with the dimensions/variants fragment read by the app's markdown renderer.
+    variants=False: the image is not optimized (no modern-format or resized copies to list).
+    """
+    if size is None:
+        return web_path
+    width, height = size
+    frag = f"w={width}&h={height}"
+    formats = available_formats() if variants else ()
+    if formats:
+        widths = responsive_widths(width)
+        if widths:
+            frag += "&srcset=" + ",".join(str(w) for w in widths)
+        frag += "&fmt=" + ",".join(formats)
+    return f"{web_path}#{frag}"
+
+
+def _recompress(img, path: Path, data: bytes) -> bool:
+    opts = RECOMPRESS.get(path.suffix.lower().lstrip("."))
+    if opts is None:
+        return False
+    tmp = path.with_name(path.name + ".tmp")
+    try:
+        img.save(tmp, format=img.format, **opts)
+        if tmp.stat().st_size < len(data):
+            count("image_bytes_saved", len(data) - tmp.stat().st_size)
+            tmp.replace(path)
+            return True
+    except (OSError, ValueError):
+        pass  # encoder rejected this image: keep the original
+    finally:
+        tmp.unlink(missing_ok=True)
+    return False
+
+
+def optimize_image(path: Path) -> List[Path]:
+    """
+    Recompress `path` in place and write its modern-format variants.
+    Returns the files written (variants that are already newer than the source are kept).
+    A format outside DECODE is left alone; an image Pillow fails on is reported on stderr and
+    kept as extracted.
+    """
+    if Image is None or path.suffix.lower().lstrip(".") not in DECODE:
+        return []
+    written: List[Path] = []
+    try:
+        _optimize(path, written)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:  # UnidentifiedImageError is an OSError
+        count("image_optimize_failed")
+        print(f"Image not optimized, kept as extracted: {path} ({e})", file=sys.stderr)
+    count("image_variants", len(written))
+    return written
+
+
+def _optimize(path: Path, written: List[Path]) -> None:
+    mtime = path.stat().st_mtime
+    with Image.open(path) as img:  # reads the header only; pixels are decoded by load()
+        width = img.width
+        targets = [(fmt, w) for fmt in available_formats() for w in [None, *responsive_widths(width)]]
+        outs = [variant_path(path, fmt, w) for fmt, w in targets]
+        if outs and all(out.exists() and out.stat().st_mtime >= mtime for out in outs):
+            return
+
+        data = path.read_bytes()
+        img.load()
+        if _recompress(img, path, data):
+            written.append(path)
+
+        frame = img if img.mode in ("RGB", "RGBA") else img.convert("RGBA")
+        for fmt, w in targets:
+            out = variant_path(path, fmt, w)
+            resized = frame if w is None else frame.resize((w, max(1, round(img.height * w / width))), Image.LANCZOS)
+            resized.save(out, format=fmt.upper(), quality=QUALITY[fmt])
+            written.append(out)
+
+
+def optimize_images(paths: Iterable[Path], max_workers: int = 4) -> Dict[Path, List[Path]]:
+    """
+    optimize_image() for every path on a thread pool. path -> files written.
+    """
+    paths = list(paths)
+    if Image is None:
+        return {p: [] for p in paths}
+    with span("optimize_images", images=len(paths)), ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return dict(zip(paths, pool.map(optimize_image, paths)))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Optimize extracted figure images in place.")
+    ap.add_argument("images", nargs="*", type=Path, help="image files (default: PNG/JPEG in public/images/store/)")
+    ap.add_argument("-j", "--jobs", type=int, default=4)
+    args = ap.parse_args()
+
+    if Image is None:
+        raise SystemExit("Pillow is not installed (pip install Pillow)")
+    paths = args.images or sorted(
+        p for p in IMAGE_STORE.glob("*.*") if p.suffix.lower().lstrip(".") in RECOMPRESS
+    )
+    results = optimize_images(paths, args.jobs)
+    print(f"Images: {len(results)}, files written: {sum(len(v) for v in results.values())}")
+
+
+if __name__ == "__main__":
+    main()
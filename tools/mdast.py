@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Markdown -> mdast JSON for the markdown this converter emits.
+
+The app renders sections with react-markdown + remark-gfm + remark-math; parsing is most of
+the time-to-content on slow devices. With --mdast the build also writes the tree remark
+would produce (public/content/ast/<section>.json, and inside the content packs), and
+src/utils/markdown.tsx renders it directly (mdast -> hast -> rehype-katex/highlight -> React).
+
+This is not a general CommonMark parser. It covers what docx_to_md.py and
+extract_docx_images_and_insert.py generate:
+- blocks: ATX headings, paragraphs (consecutive lines, soft breaks), "- " / "1. " list items
+  nested by indentation (CommonMark rule: a child must be indented to the parent's content
+  column), GFM tables, <table> HTML blocks (tools/docx_tables.py), <div> anchor blocks
+  (tools/xref_index.py), blank lines;
+- inline: strong/emphasis from * runs (flanking rules), $...$ / $$...$$ math, images, links,
+  backslash escapes, GFM autolink literals (http://, https://, www.).
+Node shapes follow mdast-util-from-markdown / mdast-util-gfm / mdast-util-math (positions are
+omitted, they are optional in mdast).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import re
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+Node = dict
+
+AST_DIR = Path("public/content/ast")
+
+HEADING_RE = re.compile(r"^ {0,3}(#{1,6})(?:[ \t]+(.*?))?(?:[ \t]+#+)?[ \t]*$")
+LIST_ITEM_RE = re.compile(r"^( *)(?:([-*+])|(\d{1,9})([.)]))(?:[ \t]+(.*))?$")
+TABLE_DELIM_RE = re.compile(r"^\s*\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?\s*$")
+LINK_RE = re.compile(r"\[((?:\\.|[^\]\\])*)\]\(\s*(<[^>]*>|[^\s)]*)(?:\s+\"((?:\\.|[^\"\\])*)\")?\s*\)")
+IMAGE_RE = re.compile(r"!\[((?:\\.|[^\]\\])*)\]\(\s*(<[^>]*>|[^\s)]*)(?:\s+\"((?:\\.|[^\"\\])*)\")?\s*\)")
+HTML_BLOCK_RE = re.compile(r"^ {0,3}</?(?:table|div)\b", re.IGNORECASE)
+AUTOLINK_RE = re.compile(r"(?:https?://|www\.)[^\s<]*", re.IGNORECASE)
+ESCAPABLE = set("!\"#$%&'()*+,-./:;<=>?@[\\]^_`{|}~")
+AUTOLINK_TRAILING = "?!.,:*_~"
+
+
+# -- nodes ---------------------------------------------------------------------------------
+
+
+def text(value: str) -> Node:
+    return {"type": "text", "value": value}
+
+
+def inline_math(value: str) -> Node:
+    # Same data fields as mdast-util-math's fromMarkdown, used by mdast-util-to-hast.
+    return {
+        "type": "inlineMath",
+        "value": value,
+        "data": {
+            "hName": "code",
+            "hProperties": {"className": ["language-math", "math-inline"]},
+            "hChildren": [{"type": "text", "value": value}],
+        },
+    }
+
+
+# -- inline --------------------------------------------------------------------------------
+
+
+def _is_punct(ch: str) -> bool:
+    return bool(ch) and not ch.isalnum() and not ch.isspace()
+
+
+def _flanking(before: str, after: str) -> Tuple[bool, bool]:
+    """
+    (left-flanking, right-flanking) of a delimiter run ("" = start/end of text).
+    """
+    b_space = not before or before.isspace()
+    a_space = not after or after.isspace()
+    left = not a_space and (not _is_punct(after) or b_space or _is_punct(before))
+    right = not b_space and (not _is_punct(before) or a_space or _is_punct(after))
+    return left, right
+
+
+def _autolinks(value: str) -> List[Node]:
+    """
+    Split plain text into text and GFM autolink literal link nodes.
+    """
+    out: List[Node] = []
+    pos = 0
+    for m in AUTOLINK_RE.finditer(value):
+        start = m.start()
+        if start > 0 and (value[start - 1].isalnum() or value[start - 1] in "/."):
+            continue
+        url = m.group(0)
+        while url and url[-1] in AUTOLINK_TRAILING:
+            url = url[:-1]
+        while url.endswith(")") and url.count(")") > url.count("("):
+            url = url[:-1]
+        scheme = url.lower().startswith(("http://", "https://"))
+        rest = url.split("://", 1)[1] if scheme else url
+        if not rest or (not scheme and "." not in rest[4:]):
+            continue
+        if start > pos:
+            out.append(text(value[pos:start]))
+        href = url if scheme else "http://" + url
+        out.append({"type": "link", "title": None, "url": href, "children": [text(url)]})
+        pos = start + len(url)
+    if pos < len(value):
+        out.append(text(value[pos:]))
+    return out
+
+
+def _merge_text(nodes: List[Node]) -> List[Node]:
+    out: List[Node] = []
+    for n in nodes:
+        if n["type"] == "text" and out and out[-1]["type"] == "text":
+            out[-1] = text(out[-1]["value"] + n["value"])
+        elif n["type"] != "text" or n["value"]:
+            out.append(n)
+    return out
+
+
+def _unescape(s: str) -> str:
+    return re.sub(r"\\([!-/:-@\[-`{-~])", r"\1", s)
+
+
+def parse_inline(src: str) -> List[Node]:
+    """
+    Phrasing content of a paragraph, heading or table cell.
+    """
+    # 1) Tokenize into literal text, atomic nodes (math, images) and * delimiter runs.
+    items: List[object] = []  # str | Node | ["*", count, can_open, can_close]
+    buf: List[str] = []
+    i, n = 0, len(src)
+
+    def flush() -> None:
+        if buf:
+            items.append("".join(buf))
+            buf.clear()
+
+    while i < n:
+        ch = src[i]
+        if ch == "\\" and i + 1 < n and src[i + 1] in ESCAPABLE:
+            buf.append(src[i + 1])
+            i += 2
+            continue
+        if ch == "$":
+            j = i
+            while j < n and src[j] == "$":
+                j += 1
+            fence = src[i:j]
+            close = src.find(fence, j)
+            while close != -1 and (close + len(fence) < n and src[close + len(fence)] == "$"):
+                close = src.find(fence, close + len(fence) + 1)
+            if close != -1 and close > j:
+                flush()
+                value = src[j:close]
+                if value.startswith(" ") and value.endswith(" ") and value.strip():
+                    value = value[1:-1]
+                items.append(inline_math(value))
+                i = close + len(fence)
+                continue
+            buf.append(fence)
+            i = j
+            continue
+        if ch == "!" and src.startswith("![", i):
+            m = IMAGE_RE.match(src, i)
+            if m:
+                flush()
+                url = m.group(2)
+                if url.startswith("<") and url.endswith(">"):
+                    url = url[1:-1]
+                title = _unescape(m.group(3)) if m.group(3) is not None else None
+                items.append({"type": "image", "title": title, "url": _unescape(url), "alt": _unescape(m.group(1))})
+                i = m.end()
+                continue
+        if ch == "[":
+            m = LINK_RE.match(src, i)
+            if m:
+                flush()
+                url = m.group(2)
+                if url.startswith("<") and url.endswith(">"):
+                    url = url[1:-1]
+                title = _unescape(m.group(3)) if m.group(3) is not None else None
+                items.append({"type": "link", "title": title, "url": _unescape(url), "children": parse_inline(m.group(1))})
+                i = m.end()
+                continue
+        if ch == "*":
+            j = i
+            while j < n and src[j] == "*":
+                j += 1
+            before = src[i - 1] if i > 0 else ""
+            after = src[j] if j < n else ""
+            left, right = _flanking(before, after)
+            flush()
+            items.append(["*", j - i, left, right])
+            i = j
+            continue
+        buf.append(ch)
+        i += 1
+    flush()
+
+    # 2) Match delimiter runs (CommonMark "process emphasis", for * only).
+    def build(seq: List[object]) -> List[Node]:
+        out: List[Node] = []
+        for it in seq:
+            if isinstance(it, str):
+                out.extend(_autolinks(it))
+            elif isinstance(it, list):
+                out.append(text("*" * it[1]))
+            else:
+                out.append(it)  # type: ignore[arg-type]
+        return out
+
+    def process(seq: List[object]) -> List[Node]:
+        stack: List[int] = []  # indexes of potential openers in seq
+        idx = 0
+        while idx < len(seq):
+            it = seq[idx]
+            if isinstance(it, list) and it[3]:  # can close
+                opener = None
+                for k in range(len(stack) - 1, -1, -1):
+                    op = seq[stack[k]]
+                    # "rule of 3": both can open and close -> sum of lengths not a multiple of 3
+                    if (op[2] and op[3]) or (it[2] and it[3]):  # type: ignore[index]
+                        if (op[1] + it[1]) % 3 == 0 and not (op[1] % 3 == 0 and it[1] % 3 == 0):  # type: ignore[index]
+                            continue
+                    opener = k
+                    break
+                if opener is not None:
+                    o_idx = stack[opener]
+                    op = seq[o_idx]
+                    use = 2 if op[1] >= 2 and it[1] >= 2 else 1  # type: ignore[index]
+                    inner = seq[o_idx + 1 : idx]
+                    node: Node = {"type": "strong" if use == 2 else "emphasis", "children": _merge_text(build(inner))}
+                    op[1] -= use  # type: ignore[index]
+                    it[1] -= use
+                    new_seq = seq[: o_idx + (1 if op[1] else 0)] + [node] + ([it] if it[1] else []) + seq[idx + 1 :]  # type: ignore[index]
+                    del stack[opener:]
+                    if op[1]:  # type: ignore[index]
+                        stack.append(o_idx)
+                    seq = new_seq
+                    idx = o_idx + (1 if op[1] else 0) + 1  # type: ignore[index]
+                    if it[1]:
+                        continue  # the rest of the closer may close another opener
+                    continue
+            if isinstance(it, list) and it[2]:
+                stack.append(idx)
+            idx += 1
+        return _merge_text(build(seq))
+
+    return process(items)
+
+
+def _escape_html(s: str) -> str:
+    return s.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;")
+
+
+def phrasing_to_html(nodes: List[Node]) -> str:
+    """
+    HTML for phrasing content (what mdast-util-to-hast + rehype-stringify would give).
+    """
+    out: List[str] = []
+    for n in nodes:
+        t = n["type"]
+        if t == "text":
+            out.append(_escape_html(n["value"]))
+        elif t in ("strong", "emphasis"):
+            tag = "strong" if t == "strong" else "em"
+            out.append(f"<{tag}>{phrasing_to_html(n['children'])}</{tag}>")
+        elif t == "inlineMath":
+            out.append(f'<code class="language-math math-inline">{_escape_html(n["value"])}</code>')
+        elif t == "link":
+            title = f' title="{_escape_html(n["title"])}"' if n.get("title") else ""
+            out.append(f'<a href="{_escape_html(n["url"])}"{title}>{phrasing_to_html(n["children"])}</a>')
+        elif t == "image":
+            title = f' title="{_escape_html(n["title"])}"' if n.get("title") else ""
+            out.append(f'<img src="{_escape_html(n["url"])}" alt="{_escape_html(n["alt"])}"{title}>')
+    return "".join(out)
+
+
+def markdown_to_html_inline(markdown: str) -> str:
+    return phrasing_to_html(parse_inline(markdown))
+
+
+# -- blocks --------------------------------------------------------------------------------
+
+
+def _split_row(line: str) -> List[str]:
+    s = line.strip()
+    if s.startswith("|"):
+        s = s[1:]
+    if s.endswith("|") and not s.endswith("\\|"):
+        s = s[:-1]
+    cells: List[str] = []
+    cur: List[str] = []
+    i = 0
+    while i < len(s):
+        if s[i] == "\\" and i + 1 < len(s) and s[i + 1] == "|":
+            cur.append("|")  # GFM: \| inside a cell is a literal pipe
+            i += 2
+            continue
+        if s[i] == "|":
+            cells.append("".join(cur).strip())
+            cur = []
+        else:
+            cur.append(s[i])
+        i += 1
+    cells.append("".join(cur).strip())
+    return cells
+
+
+def _table(lines: List[str]) -> Node:
+    header = _split_row(lines[0])
+    align: List[Optional[str]] = []
+    for d in _split_row(lines[1]):
+        left, right = d.startswith(":"), d.endswith(":")
+        align.append("center" if left and right else "left" if left else "right" if right else None)
+    width = len(header)
+    rows: List[Node] = []
+    for line in [lines[0]] + lines[2:]:
+        cells = (_split_row(line) + [""] * width)[:width]
+        rows.append({"type": "tableRow", "children": [{"type": "tableCell", "children": parse_inline(c)} for c in cells]})
+    return {"type": "table", "align": align[:width], "children": rows}
+
+
+def _paragraph(lines: List[str]) -> Node:
+    return {"type": "paragraph", "children": parse_inline("\n".join(ln.strip() for ln in lines))}
+
+
+class _OpenList:
+    def __init__(self, node: Node, ordered: bool, marker: str, indent: int) -> None:
+        self.node = node
+        self.ordered = ordered
+        self.marker = marker
+        self.content = indent  # content column of the last item
+
+
+def markdown_to_mdast(markdown: str) -> Node:
+    """
+    mdast Root for a generated section.
+    """
+    children: List[Node] = []
+    lists: List[_OpenList] = []  # open lists, outermost first
+    para: List[str] = []
+    blank = False
+
+    def container() -> List[Node]:
+        return lists[-1].node["children"][-1]["children"] if lists else children
+
+    def close_para() -> None:
+        if para:
+            container().append(_paragraph(para))
+            para.clear()
+
+    lines = markdown.split("\n")
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if not line.strip():
+            close_para()
+            blank = True
+            i += 1
+            continue
+
+        m = LIST_ITEM_RE.match(line)
+        if m and (not para or m.group(5)):
+            close_para()
+            indent = len(m.group(1))
+            ordered = m.group(3) is not None
+            marker = m.group(4) if ordered else m.group(2)
+            # A line indented to the current item's content column starts a nested list.
+            # Otherwise it is a sibling item of the innermost open list whose parent item it is
+            # still indented into, if that list is of the same kind; other lists are closed.
+            lst: Optional[_OpenList] = None
+            while lists and indent < lists[-1].content:
+                parent_content = lists[-2].content if len(lists) > 1 else 0
+                if indent >= parent_content and lists[-1].ordered == ordered and lists[-1].marker == marker:
+                    lst = lists[-1]
+                    break
+                lists.pop()
+            if lst is None:
+                node = {
+                    "type": "list",
+                    "ordered": ordered,
+                    "start": int(m.group(3)) if ordered else None,
+                    "spread": False,
+                    "children": [],
+                }
+                container().append(node)
+                lst = _OpenList(node, ordered, marker, indent)
+                lists.append(lst)
+            elif blank:
+                lst.node["spread"] = True  # blank line between items: a loose list
+            lst.content = indent + len(m.group(3) or m.group(2)) + (1 if ordered else 0) + 1
+            lst.node["children"].append({"type": "listItem", "spread": False, "checked": None, "children": []})
+            if m.group(5):
+                para.append(m.group(5))
+            blank = False
+            i += 1
+            continue
+
+        indent = len(line) - len(line.lstrip(" "))
+        if lists and blank and indent < lists[-1].content:
+            lists.clear()  # a blank line and an unindented line end all open lists
+        blank = False
+
+        if HTML_BLOCK_RE.match(line):
+            # CommonMark HTML block (kind 6): runs to the next blank line, may interrupt a paragraph.
+            close_para()
+            lists.clear()
+            j = i
+            while j < len(lines) and lines[j].strip():
+                j += 1
+            children.append({"type": "html", "value": "\n".join(lines[i:j])})
+            i = j
+            continue
+
+        h = HEADING_RE.match(line)
+        if h:
+            close_para()
+            lists.clear()
+            children.append({"type": "heading", "depth": len(h.group(1)), "children": parse_inline(h.group(2) or "")})
+            i += 1
+            continue
+
+        if line.lstrip().startswith("|") and i + 1 < len(lines) and TABLE_DELIM_RE.match(lines[i + 1]) and not para:
+            lists.clear()
+            j = i + 2
+            while j < len(lines) and lines[j].strip().startswith("|"):
+                j += 1
+            children.append(_table(lines[i:j]))
+            i = j
+            continue
+
+        if not para and lists and indent < lists[-1].content:
+            lists.clear()
+        para.append(line)
+        i += 1
+
+    close_para()
+    return {"type": "root", "children": children}
+
+
+def ast_file_name(markdown_file: str) -> str:
+    """
+    "chapters/1-2.md" -> "1-2.json" (file name inside AST_DIR).
+    """
+    return Path(markdown_file).with_suffix(".json").name
+
+
+def encode_ast(tree: Node) -> str:
+    return json.dumps(tree, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Print the mdast JSON of a generated markdown file.")
+    ap.add_argument("markdown", type=Path)
+    args = ap.parse_args()
+    print(json.dumps(markdown_to_mdast(args.markdown.read_text(encoding="utf-8")), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Output layer for generated files: atomic, write-if-changed, mirrored and tracked.
+
+- write_bytes_if_changed() / write_text_if_changed() compare with the file on disk (size
+  first, then bytes) and only write when the content differs. The new content goes to a
+  temp file next to the target that is then renamed over it, so the dev server never
+  serves a half-written file, even if the build dies mid-run. An unchanged file keeps its
+  mtime and causes no file-watcher event.
+- OutputTree records every file one build generates. mirror() gives a second path the same
+  content as a hard link, or as a single copy where links are not possible (another
+  filesystem). finish() removes the files of the previous build that were not generated
+  this time, using the list saved in a manifest (.build/outputs.json), so no directory is
+  scanned; then it saves the new list. Only the first build without a manifest scans the
+  directories registered with adopt().
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import List, Optional, Set
+
+from profiling import count
+
+
+OUTPUTS_MANIFEST = Path(".build/outputs.json")
+
+
+def _temp_path(path: Path) -> Path:
+    return path.with_name(f".{path.name}.{os.getpid()}.tmp")
+
+
+def write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = _temp_path(path)
+    try:
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def same_content(path: Path, data: bytes) -> bool:
+    try:
+        if path.stat().st_size != len(data):
+            return False
+        return path.read_bytes() == data
+    except OSError:
+        return False
+
+
+def write_bytes_if_changed(path: Path, data: bytes) -> bool:
+    """
+    Atomically replace path with data unless it already holds exactly that.
+    Returns True if the file was written.
+    """
+    if same_content(path, data):
+        count("files_skipped")
+        return False
+    write_atomic(path, data)
+    count("files_written")
+    count("bytes_written", len(data))
+    return True
+
+
+def write_text_if_changed(path: Path, text: str) -> bool:
+    return write_bytes_if_changed(path, text.encode("utf-8"))
+
+
+def mirror_file(source: Path, target: Path) -> bool:
+    """
+    Make target a hard link to source (a copy if linking fails). Returns True if target
+    changed; a target that is already the same file or has the same bytes is left alone.
+    """
+    try:
+        if os.path.samefile(source, target):
+            return False
+    except OSError:
+        pass
+    data = source.read_bytes()
+    if same_content(target, data):
+        count("files_skipped")
+        return False
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = _temp_path(target)
+    tmp.unlink(missing_ok=True)
+    try:
+        os.link(source, tmp)
+        count("files_linked")
+    except OSError:
+        shutil.copyfile(source, tmp)
+        count("files_written")
+        count("bytes_written", len(data))
+    os.replace(tmp, target)
+    return True
+
+
+class OutputTree:
+    """
+    The files one build generates (see the module docstring).
+    """
+
+    def __init__(self, manifest: Path = OUTPUTS_MANIFEST) -> None:
+        self.manifest = manifest
+        self.files: Set[Path] = set()
+        self.previous: Optional[Set[Path]] = self._load()
+        self._adopted: Set[Path] = set()
+
+    def _load(self) -> Optional[Set[Path]]:
+        try:
+            data = json.loads(self.manifest.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        files = data.get("files")
+        return {Path(f) for f in files} if isinstance(files, list) else None
+
+    def adopt(self, directory: Path, pattern: str) -> None:
+        """
+        Without a manifest (first build with this layer), treat the files matching pattern
+        in directory as generated by the previous build, so stale ones are still removed.
+        """
+        if self.previous is None and directory.is_dir():
+            self._adopted.update(p for p in directory.glob(pattern) if p.is_file())
+
+    def keep(self, path: Path) -> None:
+        """
+        path is generated by this build but was not rewritten (e.g. an unchanged section).
+        """
+        self.files.add(path)
+
+    def write_bytes(self, path: Path, data: bytes) -> bool:
+        self.files.add(path)
+        return write_bytes_if_changed(path, data)
+
+    def write_text(self, path: Path, text: str) -> bool:
+        return self.write_bytes(path, text.encode("utf-8"))
+
+    def mirror(self, source: Path, target: Path) -> bool:
+        self.files.add(target)
+        return mirror_file(source, target)
+
+    def finish(self) -> List[Path]:
+        """
+        Remove the previous build's files that this build did not generate and save the
+        list of generated files. Returns the removed files.
+        """
+        previous = self.previous if self.previous is not None else self._adopted
+        removed: List[Path] = []
+        for path in sorted(previous - self.files):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                continue
+            removed.append(path)
+            count("files_removed")
+        data = {"files": sorted(p.as_posix() for p in self.files)}
+        write_bytes_if_changed(self.manifest, (json.dumps(data, ensure_ascii=False, indent=2) + "\n").encode("utf-8"))
+        self.previous = set(self.files)
+        return removed
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Opt-in instrumentation for the conversion tools (--profile).
+
+Three kinds of measurements, all collected on the module-level PROFILER:
+- spans: `with span("write_outputs"):` around a stage; every span becomes a complete event
+  in the Chrome trace (open the file in chrome://tracing or https://ui.perfetto.dev),
+  one lane per thread;
+- timers: `@timed("style_name")` on hot helpers called per paragraph; only the total time
+  and call count are kept (inclusive: table_to_md includes the runs_to_md calls it makes),
+  so the trace does not get one event per paragraph;
+- counters: `count("paragraphs")`, `count("bytes_written", n)`.
+
+When profiling is off (the default) span() returns a shared no-op context manager and
+count()/timed helpers return after a single flag check, so the tools run at full speed.
+"""
+
+from __future__ import annotations
+
+import argparse
+import functools
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, TypeVar
+
+F = TypeVar("F", bound=Callable)
+
+
+class _NullSpan:
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    def __init__(self, profiler: "Profiler", name: str, args: Dict[str, object]) -> None:
+        self._profiler = profiler
+        self._name = name
+        self._args = args
+        self._t0 = 0.0
+
+    def __enter__(self) -> "_Span":
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._profiler._add_span(self._name, self._t0, time.perf_counter(), self._args)
+
+
+class Profiler:
+    def __init__(self) -> None:
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter()
+        self._events: List[dict] = []
+        self._threads: Dict[int, str] = {}
+        self.counters: Dict[str, int] = {}
+        self.timers: Dict[str, List[float]] = {}  # name -> [seconds, calls]
+
+    def enable(self) -> None:
+        self.enabled = True
+        self._t0 = time.perf_counter()
+
+    def span(self, name: str, **args: object):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, args)
+
+    def count(self, name: str, n: int = 1) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def timed(self, name: str) -> Callable[[F], F]:
+        """
+        Decorator accumulating total time and calls of a function under `name`.
+        """
+
+        def deco(fn: F) -> F:
+            @functools.wraps(fn)
+            def wrapper(*a, **kw):
+                if not self.enabled:
+                    return fn(*a, **kw)
+                t0 = time.perf_counter()
+                try:
+                    return fn(*a, **kw)
+                finally:
+                    self._add_time(name, time.perf_counter() - t0)
+
+            return wrapper  # type: ignore[return-value]
+
+        return deco
+
+    def _add_time(self, name: str, seconds: float) -> None:
+        with self._lock:
+            total = self.timers.setdefault(name, [0.0, 0])
+            total[0] += seconds
+            total[1] += 1
+
+    def _add_span(self, name: str, t0: float, t1: float, args: Dict[str, object]) -> None:
+        thread = threading.current_thread()
+        event = {
+            "name": name,
+            "cat": "span",
+            "ph": "X",
+            "ts": (t0 - self._t0) * 1e6,
+            "dur": (t1 - t0) * 1e6,
+            "pid": os.getpid(),
+            "tid": thread.ident,
+        }
+        if args:
+            event["args"] = {k: str(v) for k, v in args.items()}
+        with self._lock:
+            self._events.append(event)
+            self._threads.setdefault(thread.ident or 0, thread.name)
+
+    def trace(self) -> dict:
+        """
+        Chrome trace-event JSON (object form). Counters are emitted as one counter event at
+        the end of the run; counters and timers are also under "otherData".
+        """
+        pid = os.getpid()
+        end_us = (time.perf_counter() - self._t0) * 1e6
+        with self._lock:
+            events = [
+                {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": tname}}
+                for tid, tname in self._threads.items()
+            ]
+            events.extend(self._events)
+            for name, value in sorted(self.counters.items()):
+                events.append({"name": name, "ph": "C", "ts": end_us, "pid": pid, "args": {name: value}})
+            return {
+                "traceEvents": events,
+                "displayTimeUnit": "ms",
+                "otherData": {
+                    "counters": dict(self.counters),
+                    "timers": {k: {"seconds": v[0], "calls": v[1]} for k, v in self.timers.items()},
+                },
+            }
+
+    def write_trace(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.trace(), ensure_ascii=False) + "\n", encoding="utf-8")
+
+    def summary(self) -> str:
+        with self._lock:
+            spans: Dict[str, List[float]] = {}
+            for ev in self._events:
+                total = spans.setdefault(ev["name"], [0.0, 0])
+                total[0] += ev["dur"] / 1e6
+                total[1] += 1
+            timers = {k: list(v) for k, v in self.timers.items()}
+            counters = dict(self.counters)
+
+        lines = [f"Profile (wall {time.perf_counter() - self._t0:.2f}s)"]
+        for title, table in (("spans", spans), ("timers (inclusive)", timers)):
+            if not table:
+                continue
+            lines.append(f"  {title}:")
+            for name, (seconds, calls) in sorted(table.items(), key=lambda kv: -kv[1][0]):
+                lines.append(f"    {name:28s} {int(calls):8d} calls {seconds * 1000:10.1f} ms")
+        if counters:
+            lines.append("  counters:")
+            for name, value in sorted(counters.items()):
+                lines.append(f"    {name:28s} {value:12,d}")
+        return "\n".join(lines)
+
+
+PROFILER = Profiler()
+span = PROFILER.span
+count = PROFILER.count
+timed = PROFILER.timed
+
+
+def add_profile_argument(ap: argparse.ArgumentParser, default_path: Path) -> None:
+    ap.add_argument(
+        "--profile",
+        nargs="?",
+        type=Path,
+        const=default_path,
+        default=None,
+        metavar="TRACE_JSON",
+        help=f"record stage timings and counters; write a Chrome trace (default: {default_path.as_posix()})",
+    )
+
+
+def start_profile(path: Optional[Path]) -> None:
+    if path is not None:
+        PROFILER.enable()
+
+
+def finish_profile(path: Optional[Path]) -> None:
+    """
+    Print the text summary and write the trace, if --profile was given.
+    """
+    if path is None:
+        return
+    print("")
+    print(PROFILER.summary())
+    PROFILER.write_trace(path)
+    print(f"Trace: {path.as_posix()} (chrome://tracing or ui.perfetto.dev)")
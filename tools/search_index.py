@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Full-text search index over the generated sections, sharded by term prefix.
+
+docx_to_md.py feeds every section's markdown to SearchIndexBuilder while writing outputs;
+the app (src/utils/search.ts) loads the small root dictionary once and then only the shards
+whose prefixes occur in the query, instead of downloading and tokenizing every section.
+
+Terms are normalized for Russian: lowercase, ё -> е, and light suffix stripping (the longest
+ending from ENDINGS is removed if at least MIN_STEM characters remain), so "модуля",
+"модулем", "модули" all become "модул". The ending list is written into the root dictionary
+and the app stems queries with it, so both sides always agree.
+
+Layout (public/content/search/):
+  index.json        {"version", "minStem", "prefixLen", "endings": [...], "stopWords": [...],
+                     "docs": [[chapterId, sectionId, title, tokenCount], ...],
+                     "shards": {prefix: [file, termCount], ...}}
+  <hex>.json        {"version", "prefix", "terms": {term: [[doc, p0, d1, d2, ...], ...]}}
+Postings list, per document, the doc number (index into "docs") followed by the term's
+token positions, delta-encoded (p0, p1 - p0, ...). The shard file name is the UTF-8 hex of
+its prefix (the first PREFIX_LEN characters of the term).
+
+Building is one pass over the tokens of each section (dict appends), then one sort per shard.
+"""
+
+from __future__ import annotations
+
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from content_pack import encode
+from output_tree import OutputTree, write_bytes_if_changed
+from profiling import count, span
+
+
+SEARCH_DIR = Path("public/content/search")
+SEARCH_VERSION = 1
+ROOT_FILE = "index.json"
+PREFIX_LEN = 2
+MIN_STEM = 3
+
+# Inflectional endings of nouns and adjectives (verbs are left alone: their endings collide
+# with noun stems, e.g. "пакет"). Tried longest first.
+ENDINGS = sorted(
+    """
+    иями ями ами иях ях ах ией ием ем ям ам ой ей ом ов ев ью ия ие ий ию ии
+    ого его ому ему ыми ими ых их ым им ая яя ое ее ые ый ую юю
+    а я о е ы и у ю ь й
+    """.split(),
+    key=len,
+    reverse=True,
+)
+
+STOP_WORDS = frozenset(
+    "и в во на с со по для не что это как из к ко о об а от до при или же но то бы ли "
+    "у за под над без так все его ее их он она оно они мы вы я этот эта эти также".split()
+)
+
+TOKEN_RE = re.compile(r"[0-9a-zа-яё]+(?:-[0-9a-zа-яё]+)*", re.IGNORECASE)
+CYRILLIC_RE = re.compile(r"[а-я]")
+# Markdown that is not searchable text: images, link targets, inline/block math, autolinked URLs.
+NON_TEXT_RE = re.compile(
+    r"!\[[^\]]*\]\([^)]*\)|\]\([^)]*\)|\$\$.*?\$\$|\$[^$\n]*\$|https?://\S+"
+    r"|</?[a-z][^>]*>|&(?:[a-z]+|#\d+);",  # HTML tables (tools/docx_tables.py)
+    re.DOTALL,
+)
+
+
+def normalize(word: str) -> str:
+    return word.lower().replace("ё", "е")
+
+
+def stem(word: str) -> str:
+    """
+    Light stemming of a normalized word; non-Cyrillic words are kept as they are.
+    """
+    if not CYRILLIC_RE.search(word):
+        return word
+    for ending in ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM:
+            return word[: -len(ending)]
+    return word
+
+
+def tokenize(markdown: str) -> List[str]:
+    """
+    Normalized words of a section, in order (positions are indexes into this list).
+    """
+    return [normalize(m.group(0)) for m in TOKEN_RE.finditer(NON_TEXT_RE.sub(" ", markdown))]
+
+
+def shard_file(prefix: str) -> str:
+    return prefix.encode("utf-8").hex() + ".json"
+
+
+class SearchIndexBuilder:
+    """
+    Accumulates postings section by section; write() emits the root dictionary and shards.
+    """
+
+    def __init__(self, stems: Optional[Dict[str, str]] = None) -> None:
+        self.docs: List[list] = []
+        # term -> postings, each [doc, p0, d1, ...] (see the module docstring)
+        self.terms: Dict[str, List[List[int]]] = {}
+        # word -> term, memoized (words repeat a lot); may be shared between builds
+        self._stems: Dict[str, str] = stems if stems is not None else {}
+
+    def term(self, word: str) -> Optional[str]:
+        t = self._stems.get(word)
+        if t is None:
+            t = "" if word in STOP_WORDS else stem(word)
+            self._stems[word] = t
+        return t or None
+
+    def add_section(self, chapter_id: str, section_id: str, title: str, markdown: str) -> None:
+        doc = len(self.docs)
+        words = tokenize(markdown)
+        self.docs.append([chapter_id, section_id, title, len(words)])
+        last: Dict[str, int] = {}  # term -> last position in this doc
+        for pos, word in enumerate(words):
+            t = self.term(word)
+            if t is None:
+                continue
+            postings = self.terms.setdefault(t, [])
+            prev = last.get(t)
+            if prev is None:
+                postings.append([doc, pos])
+            else:
+                postings[-1].append(pos - prev)
+            last[t] = pos
+
+    def shards(self) -> Dict[str, Dict[str, List[List[int]]]]:
+        out: Dict[str, Dict[str, List[List[int]]]] = {}
+        for t in sorted(self.terms):
+            out.setdefault(t[:PREFIX_LEN], {})[t] = self.terms[t]
+        return out
+
+    def write(self, out_dir: Path = SEARCH_DIR, tree: Optional[OutputTree] = None) -> List[Path]:
+        """
+        Write index.json and the shards (only files whose bytes changed); remove shards
+        no longer referenced (left to `tree` when the build tracks its outputs). Returns
+        the files rewritten.
+        """
+        write = tree.write_bytes if tree is not None else write_bytes_if_changed
+        with span("write_search_index", terms=len(self.terms)):
+            out_dir.mkdir(parents=True, exist_ok=True)
+            written: List[Path] = []
+            table: Dict[str, Tuple[str, int]] = {}
+            for prefix, terms in self.shards().items():
+                name = shard_file(prefix)
+                data = {"version": SEARCH_VERSION, "prefix": prefix, "terms": terms}
+                if write(out_dir / name, encode(data)):
+                    written.append(out_dir / name)
+                table[prefix] = (name, len(terms))
+            count("search_terms", len(self.terms))
+
+            root = {
+                "version": SEARCH_VERSION,
+                "minStem": MIN_STEM,
+                "prefixLen": PREFIX_LEN,
+                "endings": ENDINGS,
+                "stopWords": sorted(STOP_WORDS),
+                "docs": self.docs,
+                "shards": {p: list(v) for p, v in table.items()},
+            }
+            if write(out_dir / ROOT_FILE, encode(root)):
+                written.append(out_dir / ROOT_FILE)
+            if tree is not None:
+                return written
+
+            keep = {name for name, _ in table.values()} | {ROOT_FILE}
+            for f in out_dir.glob("*.json"):
+                if f.name not in keep:
+                    f.unlink()
+                    count("files_removed")
+            return written
+
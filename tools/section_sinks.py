@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Section sinks besides the output tree (docx_to_md.DirectorySink).
+
+convert_document(sink=...) hands every section to the sink as soon as it is converted and
+then drops its markdown, so a book converts with only one section's text (plus each
+section's id, title, file name and part offsets) in memory, and output appears while the
+walk is still going:
+
+    sink = ZipSink(Path("manual.zip"))
+    chapters = convert_document(doc, sink=sink)
+    sink.close(chapters)
+
+- ZipSink: content/chapters/*.md (parts too), content/xref.json and chapters.ts in a zip
+  archive, the layout tools/convert_service.py returns;
+- StreamSink: the book as one markdown document on a text stream (e.g. stdout), section by
+  section;
+- CallbackSink: any callable taking (chapter, section, markdown).
+
+docx_to_md.py --zip FILE / --stdout use the first two.
+"""
+
+from __future__ import annotations
+
+import zipfile
+from pathlib import Path
+from typing import IO, Callable, List, Set, Union
+
+from docx_to_md import Chapter, Section, SectionSink, chapters_ts_source, split_parts
+from xref_index import XrefIndexBuilder
+
+
+class ZipSink(SectionSink):
+    """
+    Sections into a zip archive (a path, or a binary file object left open at close()).
+    A markdown file name given twice is refused (ValueError): a zip keeps both entries.
+    """
+
+    def __init__(self, target: Union[Path, IO[bytes]], prefix: str = "content/") -> None:
+        self.zip = zipfile.ZipFile(target, "w", zipfile.ZIP_DEFLATED)
+        self.prefix = prefix
+        self.files: List[str] = []
+        self._names: Set[str] = set()
+        self.xref = XrefIndexBuilder()
+
+    def add(self, chapter: Chapter, sec: Section, markdown: str) -> None:
+        self.xref.add_section(chapter.id, sec.id, markdown, sec.breaks)
+        for markdown_file, text in [(sec.markdown_file, markdown), *split_parts(sec, markdown)]:
+            if markdown_file in self._names:
+                raise ValueError(f"{markdown_file} is already in the archive")
+            self._names.add(markdown_file)
+            self.zip.writestr(self.prefix + markdown_file, text)
+            self.files.append(markdown_file)
+
+    def close(self, chapters: List[Chapter]) -> List[str]:
+        self.zip.writestr(self.prefix + "xref.json", self.xref.encode())
+        self.zip.writestr("chapters.ts", chapters_ts_source(chapters))
+        self.zip.close()
+        return self.files
+
+
+class StreamSink(SectionSink):
+    """
+    Every section's markdown written to a text stream and flushed, one after another.
+    """
+
+    def __init__(self, stream: IO[str]) -> None:
+        self.stream = stream
+        self.files: List[str] = []
+
+    def add(self, chapter: Chapter, sec: Section, markdown: str) -> None:
+        if self.files:
+            self.stream.write("\n")
+        self.stream.write(markdown)
+        self.stream.flush()
+        self.files.append(sec.markdown_file)
+
+    def close(self, chapters: List[Chapter]) -> List[str]:
+        return self.files
+
+
+class CallbackSink(SectionSink):
+    """
+    Calls fn(chapter, section, markdown) for every section.
+    """
+
+    def __init__(self, fn: Callable[[Chapter, Section, str], None]) -> None:
+        self.fn = fn
+
+    def add(self, chapter: Chapter, sec: Section, markdown: str) -> None:
+        self.fn(chapter, sec, markdown)
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Watch mode: rebuild the content whenever the DOCX, the glossary or the formula rules change.
+
+Running tools/build_content.py by hand after every save pays for the interpreter start,
+the imports, the glossary automaton and the formula rules each time. This process pays for
+them once and then polls the watched files (stat only, every --interval seconds):
+- a change is acted on once the file has stopped changing for one interval (Word and
+  LibreOffice write the file in several steps);
+- the rebuild is build_content.build() with a BuildCache: the numbering map and style
+  resolver are reused while numbering.xml/styles.xml are unchanged, the glossary and rules
+  are reloaded only when their own file changed, and images already optimized are not
+  looked at again;
+- the build is incremental as usual (per-section digests), and only files whose bytes
+  changed are rewritten, so the dev server sees just the edited sections (vite.config.ts
+  reloads the page when public/content/ changes);
+- a failed build (a half-saved file, a broken rule file) is reported and the next change is
+  waited for.
+
+Changes to the converter's own code need a restart.
+
+Run from the repo root:
+    python tools/watch_content.py
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+import traceback
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from build_content import BuildCache, build, file_signature
+from docx_to_md import (
+    DEFAULT_PATHS,
+    DOCX_PATH,
+    Chapter,
+    OutputPaths,
+    Pagination,
+    add_pagination_arguments,
+    pagination_from_args,
+)
+from formula_rules import FORMULA_RULES
+from glossary_link import GLOSSARY_TS
+
+
+WATCH_INTERVAL = 0.2  # seconds between polls
+
+Signatures = Dict[Path, Optional[Tuple[int, int]]]
+
+
+def signatures(paths: List[Path]) -> Signatures:
+    return {p: file_signature(p) for p in paths}
+
+
+def wait_for_change(paths: List[Path], seen: Signatures, interval: float) -> Signatures:
+    """
+    Block until a watched file differs from `seen` and then stays the same for one interval.
+    Returns the new signatures.
+    """
+    while True:
+        time.sleep(interval)
+        current = signatures(paths)
+        if current == seen:
+            continue
+        while True:
+            time.sleep(interval)
+            settled = signatures(paths)
+            if settled == current:
+                return settled
+            current = settled
+
+
+def rebuild(docx_path: Path, paths: OutputPaths, cache: BuildCache, **options) -> None:
+    t0 = time.perf_counter()
+    res = build(docx_path, paths, cache=cache, **options)
+    chapters: List[Chapter] = res["convert"]  # type: ignore[assignment]
+    written: List[str] = res["write_markdown"]  # type: ignore[assignment]
+    rendered = sum(sec.rendered for ch in chapters for sec in ch.sections)
+    stamp = time.strftime("%H:%M:%S")
+    print(f"[{stamp}] re-rendered {rendered} section(s), wrote {len(written)} in {time.perf_counter() - t0:.2f}s")
+    for rel in written:
+        print(f"  rebuilt: {rel}")
+
+
+def watch(
+    docx_path: Path = DOCX_PATH,
+    paths: OutputPaths = DEFAULT_PATHS,
+    interval: float = WATCH_INTERVAL,
+    stream: bool = False,
+    optimize: bool = True,
+    mdast: bool = False,
+    glossary: Optional[Path] = GLOSSARY_TS,
+    formula_rules: Optional[Path] = None,
+    pagination: Optional[Pagination] = None,
+) -> None:
+    """
+    Build once, then rebuild on every change until interrupted.
+    """
+    watched = [docx_path, formula_rules or FORMULA_RULES]
+    if glossary:
+        watched.append(glossary)
+    cache = BuildCache()
+    options = dict(
+        stream=stream,
+        optimize=optimize,
+        mdast=mdast,
+        glossary=glossary,
+        formula_rules=formula_rules,
+        pagination=pagination,
+    )
+
+    print("Watching: " + ", ".join(str(p) for p in watched))
+    seen = signatures(watched)
+    while True:
+        if seen[docx_path] is None:
+            print(f"DOCX not found: {docx_path} (waiting for it)")
+        else:
+            try:
+                rebuild(docx_path, paths, cache, **options)
+            except Exception:  # keep watching: the next save may fix it
+                traceback.print_exc()
+                print("Build failed; waiting for the next change.")
+        seen = wait_for_change(watched, seen, interval)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Rebuild the content whenever the DOCX, glossary or formula rules change.")
+    ap.add_argument("--interval", type=float, default=WATCH_INTERVAL, help="seconds between polls (default: %(default)s)")
+    ap.add_argument("--stream", action="store_true", help="low-memory streaming reader (tools/docx_stream.py)")
+    ap.add_argument("--no-optimize", action="store_true", help="keep images exactly as embedded (tools/image_optimize.py)")
+    ap.add_argument("--mdast", action="store_true", help="also write each section's parsed tree (tools/mdast.py)")
+    ap.add_argument("--no-glossary", action="store_true", help="do not link glossary terms (tools/glossary_link.py)")
+    ap.add_argument("--formula-rules", type=Path, help="formula rule file (default: tools/formula_rules.json)")
+    add_pagination_arguments(ap)
+    args = ap.parse_args()
+
+    try:
+        watch(
+            DOCX_PATH,
+            interval=args.interval,
+            stream=args.stream,
+            optimize=not args.no_optimize,
+            mdast=args.mdast,
+            glossary=None if args.no_glossary else GLOSSARY_TS,
+            formula_rules=args.formula_rules,
+            pagination=pagination_from_args(args),
+        )
+    except KeyboardInterrupt:
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cross-references: anchors for figures, tables and numbered formulas, links to them, and a
+global index the app resolves the links and hover previews with.
+
+While a section is rendered (docx_to_md.render_section), a figure (a "Рис. 2.5. ..." caption
+starting or inside a paragraph, or in the alt text of the image line the figure hook inserted,
+for captions set in a table cell), a table caption (a "1.1. ..." heading or paragraph right
+above a table) and a numbered formula (a paragraph ending in "(1.2)") each get an anchor line
+above them,
+<div id="fig-2-5"></div> (tbl-1-1, eq-1-2), and references in paragraphs and list items
+("рис. 2.5", "рисунке 2.7", "табл. 1.1", "неравенством (1.2)", "рис. 3.1 и 3.2") become links
+to the anchor: [рис. 2.5](#fig-2-5). A link names only the anchor, so rendering a section never
+depends on another one (forward references need no second pass, incremental builds stay per
+section); the app looks the anchor up in the index.
+
+XrefIndexBuilder reads the anchors back from each section's markdown as the sink receives it
+(rendered or reused alike) and writes public/content/xref.json:
+  {"version", "items": {"fig-2-5": {"kind": "figure", "number": "2.5", "caption",
+                                    "chapterId", "sectionId", "part", "thumbnail"?}, ...},
+   "unresolved": {"tbl-2-1": sectionId, ...}}
+part is the 1-based part of a split section that holds the anchor; a figure's thumbnail is
+{"src", "width", "height"}: the smallest WebP variant of its image (tools/image_optimize.py),
+else the image itself. The first anchor of a number wins. "unresolved" lists links whose
+anchor is nowhere in the book ("табл. 2.1" in a manual without that table) with the first
+section linking to each; the build reports them (report_xref()).
+"""
+
+from __future__ import annotations
+
+import bisect
+import json
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from glossary_link import PROTECTED_RE
+from output_tree import OutputTree, write_text_if_changed
+
+XREF_INDEX = Path("public/content/xref.json")
+XREF_VERSION = 1
+XREF_DIGEST = f"xref:{XREF_VERSION}"  # part of the section salt: anchor/link rules changed
+
+ANCHOR_PREFIX = {"figure": "fig", "table": "tbl", "formula": "eq"}
+KIND_BY_PREFIX = {prefix: kind for kind, prefix in ANCHOR_PREFIX.items()}
+
+NUMBER = r"\d+\.\d+(?!\.?\d)"
+FIGURE_CAPTION_RE = re.compile(rf"^\s*Рис\.\s*({NUMBER})\.?(?:\s|$)", re.IGNORECASE)
+TABLE_CAPTION_RE = re.compile(rf"^\s*(?:Таблица\s+|Табл\.\s*)?({NUMBER})\.?\s+\S", re.IGNORECASE)
+FORMULA_NUMBER_RE = re.compile(rf"\(({NUMBER})\)\s*$")
+# A caption inside running text or alt text: "Рис." capitalized and the number followed by a
+# dot; Word layout may glue it into a word ("суще**Рис. 3.10. Состояния**ствования").
+FIGURE_MENTION_RE = re.compile(rf"(?<![\d.])Рис\.\s*({NUMBER})\.")
+ANCHOR_RE = re.compile(r'^<div id="(fig|tbl|eq)-([\d-]+)"></div>$')
+
+# "рис. 2.5", "рисунке 2.7", "табл. 1.1", "Таблица 4.2", and following numbers: "рис. 3.1 и 3.2".
+# Capitalized abbreviations are left alone: "Рис. 2.9." inside a paragraph is a caption.
+REF_RE = re.compile(
+    rf"(?<![\w.])(?P<word>рис\.|[Рр]исун[а-я]*|табл\.|[Тт]аблиц[а-я]*)(?P<sp>\s?)(?P<nums>{NUMBER}(?:(?:,\s*|\s+и\s+|\s*[-–—]\s*){NUMBER})*)"
+)
+# "(1.2)" after a word naming a formula: "соотношение (1.2)", "неравенством (1.2)".
+FORMULA_REF_RE = re.compile(
+    rf"(?<!\w)(?P<word>(?:соотношени|неравенств|равенств|формул|выражени|уравнени)[а-я]*\s+)\((?P<num>{NUMBER})\)",
+    re.IGNORECASE,
+)
+NUMBER_RE = re.compile(NUMBER)
+IMAGE_LINE_RE = re.compile(r"^!\[(Рис\.\s*(\d+\.\d+)[^\]]*)\]\(([^)\s]*)\)")
+LINK_TARGET_RE = re.compile(r"\]\(#((?:fig|tbl|eq)-[\d-]+)\)")
+MARKUP_RE = re.compile(r"\\(.)|[*_]+|^#+\s+")
+
+
+def anchor_id(kind: str, number: str) -> str:
+    return f"{ANCHOR_PREFIX[kind]}-{number.replace('.', '-')}"
+
+
+def anchor_line(anchor: str) -> str:
+    """
+    The anchor as a markdown line: an HTML block (followed by a blank line) that the app
+    expands into an empty element (src/utils/markdown.tsx).
+    """
+    return f'<div id="{anchor}"></div>'
+
+
+def block_anchor(text: str, before_table: bool) -> Optional[str]:
+    """
+    Anchor of a paragraph (its plain text) that captions a figure, captions the table right
+    after it, or is a numbered formula; None for any other paragraph.
+    """
+    m = FIGURE_CAPTION_RE.match(text)
+    if m:
+        return anchor_id("figure", m.group(1))
+    if before_table:
+        m = TABLE_CAPTION_RE.match(text)
+        if m:
+            return anchor_id("table", m.group(1))
+    m = FORMULA_NUMBER_RE.search(text)
+    if m:
+        return anchor_id("formula", m.group(1))
+    return None
+
+
+def figure_anchors(text: str) -> List[str]:
+    """
+    Anchors of the figure captions inside a paragraph ("... его внешний Рис. 2.9. Структура
+    облик") or an image's alt text ("Рис. 1.13. ... Рис. 1.14. ..." under one picture).
+    """
+    return [anchor_id("figure", n) for n in FIGURE_MENTION_RE.findall(text)]
+
+
+def image_anchors(image_line: str) -> List[str]:
+    """
+    Anchors of the figures an image line ("![Рис. 2.5. ...](...)") shows.
+    """
+    m = IMAGE_LINE_RE.match(image_line)
+    if not m:
+        return []
+    return [anchor_id("figure", m.group(2)), *figure_anchors(m.group(1))]
+
+
+def figure_caption(number: str, text: str) -> Optional[str]:
+    """
+    "Рис. <number>. title" cut out of a line that holds it among other text.
+    """
+    m = re.search(rf"Рис\.\s*{re.escape(number)}\.(?:(?!Рис\.)[^*|\n])*", text)
+    return m.group(0).strip() if m else None
+
+
+def _link_refs(text: str) -> str:
+    def ref(m: re.Match) -> str:
+        kind = "figure" if m.group("word").lower().startswith("рис") else "table"
+        nums = m.group("nums")
+        out: List[str] = []
+        pos = 0
+        for i, n in enumerate(NUMBER_RE.finditer(nums)):
+            out.append(nums[pos : n.start()])
+            label = f"{m.group('word')}{m.group('sp')}{n.group(0)}" if i == 0 else n.group(0)
+            out.append(f"[{label}](#{anchor_id(kind, n.group(0))})")
+            pos = n.end()
+        return "".join(out)
+
+    text = REF_RE.sub(ref, text)
+    return FORMULA_REF_RE.sub(lambda m: f"{m.group('word')}[({m.group('num')})](#{anchor_id('formula', m.group('num'))})", text)
+
+
+def link_references(line: str) -> str:
+    """
+    A markdown line with its figure, table and formula references linked to their anchors
+    (links, images, math and URLs already in the line are left alone).
+    """
+    out: List[str] = []
+    pos = 0
+    for m in PROTECTED_RE.finditer(line):
+        out.append(_link_refs(line[pos : m.start()]))
+        out.append(m.group(0))
+        pos = m.end()
+    out.append(_link_refs(line[pos:]))
+    return "".join(out)
+
+
+def plain_text(markdown_line: str) -> str:
+    return MARKUP_RE.sub(lambda m: m.group(1) or "", markdown_line).strip()
+
+
+def thumbnail(url: str) -> Dict[str, object]:
+    """
+    Smallest copy of a figure image from its link (see image_optimize.image_url()).
+    """
+    src, _, frag = url.partition("#")
+    params = dict(p.partition("=")[::2] for p in frag.split("&") if p)
+    width = int(params.get("w") or 0)
+    height = int(params.get("h") or 0)
+    formats = [f for f in params.get("fmt", "").split(",") if f]
+    widths = [int(w) for w in params.get("srcset", "").split(",") if w]
+    thumb: Dict[str, object] = {"src": src}
+    if formats:
+        fmt = "webp" if "webp" in formats else formats[0]
+        base = src.rsplit(".", 1)[0]
+        if widths:
+            small = min(widths)
+            thumb["src"] = f"{base}-{small}w.{fmt}"
+            if width and height:
+                width, height = small, round(height * small / width)
+        else:
+            thumb["src"] = f"{base}.{fmt}"
+    if width and height:
+        thumb["width"], thumb["height"] = width, height
+    return thumb
+
+
+class XrefIndexBuilder:
+    """
+    Collects the anchors of every section, in book order; write() emits xref.json.
+    """
+
+    def __init__(self) -> None:
+        self.items: Dict[str, Dict[str, object]] = {}
+        self.links: Dict[str, str] = {}  # anchor linked to -> first section linking to it
+
+    def add_section(self, chapter_id: str, section_id: str, markdown: str, breaks: Optional[List[int]] = None) -> None:
+        lines = markdown.split("\n")
+        images: Dict[str, Tuple[str, str]] = {}  # figure number -> (alt text, url)
+        for line in lines:
+            m = IMAGE_LINE_RE.match(line)
+            if m:
+                for number in [m.group(2), *FIGURE_MENTION_RE.findall(m.group(1))]:
+                    images.setdefault(number, (figure_caption(number, m.group(1)) or m.group(1), m.group(3)))
+            for target in LINK_TARGET_RE.findall(line):
+                self.links.setdefault(target, section_id)
+        offset = 0
+        for i, line in enumerate(lines):
+            m = ANCHOR_RE.match(line)
+            here, offset = offset, offset + len(line) + 1
+            if not m or f"{m.group(1)}-{m.group(2)}" in self.items:
+                continue
+            kind = KIND_BY_PREFIX[m.group(1)]
+            number = m.group(2).replace("-", ".")
+            # The caption: a figure's image alt text (the caption paragraph may be a table
+            # cell), else the next text line; for a figure, just its caption out of the first
+            # line holding it (an anchor for a caption inside a list sits above the list).
+            following = [ln for ln in lines[i + 1 :] if ln and not IMAGE_LINE_RE.match(ln) and not ANCHOR_RE.match(ln)]
+            if kind == "figure" and number in images:
+                caption = images[number][0]
+            elif kind == "figure":
+                found = (figure_caption(number, ln) for ln in following)
+                caption = next((c for c in found if c), following[0] if following else "")
+            else:
+                caption = following[0] if following else ""
+            item: Dict[str, object] = {
+                "kind": kind,
+                "number": number,
+                "caption": plain_text(caption),
+                "chapterId": chapter_id,
+                "sectionId": section_id,
+                "part": bisect.bisect_right(breaks or [], here) + 1,
+            }
+            if kind == "figure" and number in images:
+                item["thumbnail"] = thumbnail(images[number][1])
+            self.items[f"{m.group(1)}-{m.group(2)}"] = item
+
+    def unresolved(self) -> Dict[str, str]:
+        """
+        Linked anchors that no section has -> the first section linking to one; the app shows
+        those references as plain text.
+        """
+        return {target: sec for target, sec in sorted(self.links.items()) if target not in self.items}
+
+    def data(self) -> Dict[str, object]:
+        return {"version": XREF_VERSION, "items": self.items, "unresolved": self.unresolved()}
+
+    def encode(self) -> str:
+        return json.dumps(self.data(), ensure_ascii=False, separators=(",", ":")) + "\n"
+
+    def write(self, path: Path = XREF_INDEX, tree: Optional[OutputTree] = None) -> bool:
+        """
+        Write the index (only if its content changed); True if the file was rewritten.
+        """
+        if tree is not None:
+            return tree.write_text(path, self.encode())
+        return write_text_if_changed(path, self.encode())
+
+
+def report_xref(path: Path = XREF_INDEX) -> None:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return
+    unresolved = data.get("unresolved") or {}
+    print(f"Cross-references: {len(data.get('items') or {})} anchors, links without an anchor: {len(unresolved)}")
+    for target, section in unresolved.items():
+        print(f"  {target} (first linked in {section})")
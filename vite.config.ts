@@ -1,9 +1,27 @@
-import { defineConfig } from 'vite'
+import { defineConfig, normalizePath, type Plugin } from 'vite'
 import react from '@vitejs/plugin-react'
 
+// Контент из Word (tools/watch_content.py) пишется в public/content/: это не модули, и сам Vite
+// на их изменение не реагирует. После серии записей одной пересборки — одна перезагрузка страницы.
+function contentReload(): Plugin {
+  return {
+    name: 'content-reload',
+    apply: 'serve',
+    configureServer(server) {
+      const contentDir = `${normalizePath(server.config.publicDir)}/content/`
+      let timer: ReturnType<typeof setTimeout> | undefined
+      server.watcher.on('all', (_event, file) => {
+        if (!normalizePath(file).startsWith(contentDir)) return
+        clearTimeout(timer)
+        timer = setTimeout(() => server.ws.send({ type: 'full-reload' }), 100)
+      })
+    },
+  }
+}
+
 // https://vitejs.dev/config/
 export default defineConfig({
-  plugins: [react()],
+  plugins: [react(), contentReload()],
   server: {
     port: 3000,
     host: true, // Слушать на всех интерфейсах (IPv4 и IPv6)
@@ -12,4 +30,3 @@ export default defineConfig({
   // Настраиваем обработку markdown файлов
   assetsInclude: ['**/*.md'],
 })
-